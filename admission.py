@@ -0,0 +1,48 @@
+import threading
+import time
+
+# 图片发送的准入控制：每个进程最多同时发送 limit 个图片文件，其余请求按到达顺序排队等待。
+# 排队请求数达到 max_waiting 或等待超过 timeout 秒时立即拒绝（由调用方返回 503 和 Retry-After），
+# 不让大量图片请求占满 NAS 的磁盘 I/O。页面、JSON 与点赞请求不经过这里，相当于始终空闲的优先通道。
+# 名额在响应关闭时（文件发送完成或客户端断开）才归还。
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason  # full：排队已满；timeout：等待超时
+
+
+class AdmissionGate:
+    def __init__(self, limit: int, max_waiting: int, timeout: float):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        self.active = 0  # 正在发送的请求数
+        self.waiting = 0  # 排队中的请求数
+
+    def acquire(self) -> float:
+        # 返回排队等待的秒数；排队已满或等待超时抛出 Rejected，此时没有占用名额
+        start = time.perf_counter()
+        with self.condition:
+            # 有人排队时新请求不插队
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                return 0.0
+            if self.waiting >= self.max_waiting:
+                raise Rejected('full')
+            self.waiting += 1
+            try:
+                admitted = self.condition.wait_for(lambda: self.active < self.limit, self.timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                raise Rejected('timeout')
+            self.active += 1
+        return time.perf_counter() - start
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
@@ -0,0 +1 @@
+# 性能基准：合成数据生成器与热点路径微基准
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from web import WebApp
+from benchmarks.dataset import generate_dataset, iter_image_paths, materialize_images, write_dataset
+from benchmarks.loadtest import percentile
+
+
+def run_stress(web_app: WebApp, image_urls, like_paths, threads: int, duration: float) -> dict:
+    # threads 个读线程持续请求图片，同时一个写线程不停点赞/取消点赞（每次都触发保存）
+    stop = threading.Event()
+    latencies = [[] for _ in range(threads)]
+    likes = [0]
+
+    def reader(slot):
+        client = web_app.app.test_client()
+        n = slot
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.get(image_urls[n % len(image_urls)])
+            response.get_data()
+            response.close()
+            latencies[slot].append((time.perf_counter() - start) * 1000)
+            n += threads
+
+    def writer():
+        client = web_app.app.test_client()
+        n = 0
+        while not stop.is_set():
+            client.post('/like_image', json={'path': like_paths[n % len(like_paths)],
+                                             'action': 'like' if n % 2 == 0 else 'unlike'})
+            likes[0] += 1
+            n += 1
+
+    workers = [threading.Thread(target=reader, args=(i,)) for i in range(threads)]
+    workers.append(threading.Thread(target=writer))
+    saves_before = web_app.save_seconds.get()
+    for t in workers:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in workers:
+        t.join()
+
+    values = sorted(v for slot in latencies for v in slot)
+    return {
+        'threads': threads,
+        'reads': len(values),
+        'reads_per_s': round(len(values) / duration, 1),
+        'read_p50_ms': round(percentile(values, 0.5), 3),
+        'read_p99_ms': round(percentile(values, 0.99), 3),
+        'likes': likes[0],
+        'saves': web_app.save_seconds.get() - saves_before
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read throughput under concurrent likes and saves.')
+    parser.add_argument('--images', type=int, default=50000, help='Synthetic dataset size.')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8], help='Reader thread counts.')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds per thread count.')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this file.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        json_path = os.path.join(workdir, 'stress.json')
+        data = generate_dataset(os.path.join(workdir, 'img'), categories=max(args.images // 100, 1),
+                                images=args.images)
+        write_dataset(data, json_path)
+        paths = list(iter_image_paths(data))[:500]
+        materialize_images(paths, size=16 * 1024)
+        del data
+
+        web_app = WebApp(argparse.Namespace(per_page=20, input_json=[json_path], replace=None))
+        index = web_app.get_image_index(json_path)
+        infos = [index.path_map[os.path.normpath(path)] for path in paths]
+        image_urls = [f"/image/{quote(info['category'])}/{quote(info['filename'])}" for info in infos]
+
+        results = []
+        for threads in args.threads:
+            result = run_stress(web_app, image_urls, paths, threads, args.duration)
+            results.append(result)
+            print(f"{threads:>3} 读线程: {result['reads_per_s']:>9} reads/s  p99 {result['read_p99_ms']:>8}ms  "
+                  f"同时点赞 {result['likes']} 次，保存 {result['saves']} 次")
+        web_app.save_queue.join()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.parse import quote
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from web import WebApp
+from benchmarks.dataset import generate_dataset, iter_image_paths, materialize_images, write_dataset
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+def make_web_app(json_path: str, per_page: int = 100) -> WebApp:
+    args = argparse.Namespace(
+        per_page=per_page,
+        host='127.0.0.1',
+        port=0,
+        input_json=[json_path],
+        replace=None,
+        warmup_workers=0
+    )
+    web_app = WebApp(args)
+    web_app.app.testing = True
+    # 停止后台保存线程，点赞的落盘开销由 save_json 单独测量
+    web_app.save_thread_running = False
+    web_app.save_consumer_thread.join()
+    return web_app
+
+
+def measure(func, setup=None, repeat: int = 5, memory: bool = True) -> dict:
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    result = {
+        'repeat': repeat,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'max_ms': round(max(timings), 3)
+    }
+    if memory:
+        # 内存单独跑一轮，避免 tracemalloc 拖慢计时
+        if setup:
+            setup()
+        tracemalloc.start()
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_kb'] = round(peak / 1024, 1)
+        result['retained_kb'] = round(current / 1024, 1)
+    return result
+
+
+def bench_size(size: int, workdir: str, repeat: int, memory: bool, sample: int) -> dict:
+    root = os.path.join(workdir, f"img_{size}")
+    json_path = os.path.join(workdir, f"bench_{size}.json")
+    data = generate_dataset(root, bases=2, depth=2, categories=max(size // 100, 1), images=size)
+    write_dataset(data, json_path)
+    sample_paths = []
+    for path in iter_image_paths(data):
+        if len(sample_paths) >= sample:
+            break
+        sample_paths.append(path)
+    materialize_images(sample_paths)
+    del data
+
+    web_app = make_web_app(json_path)
+    client = web_app.app.test_client()
+
+    def clear_cache():
+        web_app.cached_raw_data.clear()
+        web_app.index_cache.clear()
+
+    def load_image_data():
+        with web_app.app.test_request_context():
+            web_app.load_image_data()
+
+    results = {'load_image_data_cold': measure(load_image_data, clear_cache, repeat, memory)}
+    load_image_data()
+    results['load_image_data_warm'] = measure(load_image_data, None, repeat, memory)
+
+    index = web_app.index_cache[json_path]
+    category = sorted(index.category_map.keys())[len(index.category_map) // 2]
+    sample_infos = [index.path_map[os.path.normpath(path)] for path in sample_paths]
+    counter = {'n': 0}
+
+    def like_image():
+        path = sample_paths[counter['n'] % len(sample_paths)]
+        counter['n'] += 1
+        client.post('/like_image', json={'path': path, 'action': 'like' if counter['n'] % 2 else 'unlike'})
+
+    def clear_save_queue():
+        while not web_app.save_queue.empty():
+            web_app.save_queue.get_nowait()
+            web_app.save_queue.task_done()
+
+    results['like_image'] = measure(like_image, clear_save_queue, repeat * 10, memory)
+    clear_save_queue()
+
+    save_path = os.path.join(workdir, f"save_{size}.json")
+    results['save_json'] = measure(
+        lambda: web_app.write_json_file(save_path, web_app.cached_raw_data[json_path]), None, repeat, memory)
+
+    def serve_image():
+        img_info = sample_infos[counter['n'] % len(sample_infos)]
+        counter['n'] += 1
+        response = client.get(f"/image/{quote(img_info['category'])}/{quote(img_info['filename'])}")
+        response.get_data()
+        response.close()
+
+    results['serve_image'] = measure(serve_image, None, repeat * 10, memory)
+
+    views = {
+        'render_category_view_all': '/all?page=2',
+        'render_category_view_category': f"/category/{quote(category)}?page=1",
+        'render_category_view_favorites': '/category/_favorites?page=1&seed=1',
+        'render_category_view_unfavorites': '/category/_unfavorites?page=1&seed=1'
+    }
+    for name, url in views.items():
+        results[name] = measure(lambda url=url: client.get(url).get_data(), None, repeat, memory)
+
+    return results
+
+
+def compare(current: dict, baseline: dict):
+    # 按同名基准对比中位数耗时
+    base_map = {(r['size'], r['benchmark']): r for r in baseline.get('results', [])}
+    print(f"{'size':>9} {'benchmark':<36} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for r in current['results']:
+        old = base_map.get((r['size'], r['benchmark']))
+        if not old:
+            continue
+        ratio = r['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+        print(f"{r['size']:>9} {r['benchmark']:<36} {old['median_ms']:>10.3f}ms {r['median_ms']:>10.3f}ms {ratio:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the WebApp hot paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Dataset sizes (images).')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed repetitions per benchmark.')
+    parser.add_argument('--sample', type=int, default=100, help='Number of real image files to create.')
+    parser.add_argument('--no_memory', action='store_true', help='Skip tracemalloc memory measurement.')
+    parser.add_argument('--output', type=str, default='bench_results.json', help='Result JSON file.')
+    parser.add_argument('--compare', type=str, default=None, help='Baseline result JSON to compare against.')
+    parser.add_argument('--workdir', type=str, default=None, help='Directory for generated datasets.')
+    args = parser.parse_args()
+
+    output = {
+        'meta': {
+            'timestamp': datetime.now().astimezone().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'repeat': args.repeat
+        },
+        'results': []
+    }
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        for size in args.sizes:
+            print(f"运行基准: {size} 张图片")
+            for name, result in bench_size(size, workdir, args.repeat, not args.no_memory, args.sample).items():
+                output['results'].append(dict(size=size, benchmark=name, **result))
+                print(f"  {name:<36} median {result['median_ms']:>10.3f}ms")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=4)
+    print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(output, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 默认配置下不应加载的模块：GUI 与 HTTP 客户端，以及默认关闭的功能（SQLite、性能分析、旁路文件等）
+HEAVY_MODULES = ('tkinter', 'requests', 'webbrowser', 'sqlite3', 'cProfile', 'pstats',
+                 'sqlite_store', 'profiler', 'sidecar', 'variants', 'sprites', 'overlays', 'dimensions')
+
+# 无界面启动：只构建应用，不启动服务
+HEADLESS_SNIPPET = """
+import sys
+sys.argv = ['display.py', '--input_json', {json_path!r}, '--no_browser', '--warmup_workers', '0']
+from display import ImageGalleryApp
+ImageGalleryApp()
+heavy = [m for m in {modules!r} if m in sys.modules]
+print(','.join(heavy))
+"""
+
+
+def time_python(code: str, repeat: int):
+    timings = []
+    output = ''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+        output = result.stdout.strip()
+    return {
+        'repeat': repeat,
+        'min_ms': round(min(timings), 2),
+        'median_ms': round(statistics.median(timings), 2),
+        'max_ms': round(max(timings), 2)
+    }, output
+
+
+def import_profile(module: str, top: int = 15):
+    # 解析 -X importtime 输出，按累计耗时列出最慢的模块
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules.append({'module': name.strip(), 'cumulative_us': int(cumulative_us), 'self_us': int(self_us)})
+    modules.sort(key=lambda item: item['cumulative_us'], reverse=True)
+    return {'modules_imported': len(modules), 'slowest': modules[:top]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup latency benchmark for the headless path.')
+    parser.add_argument('--repeat', type=int, default=10, help='Runs per measurement.')
+    parser.add_argument('--output', type=str, default='bench_startup.json', help='Result JSON file.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'empty.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {}}, f)
+
+        baseline, _ = time_python('pass', args.repeat)
+        import_display, _ = time_python('import display', args.repeat)
+        headless, heavy = time_python(HEADLESS_SNIPPET.format(json_path=json_path, modules=HEAVY_MODULES), args.repeat)
+
+    output = {
+        'meta': {
+            'timestamp': datetime.now().astimezone().isoformat(),
+            'python': sys.version.split()[0]
+        },
+        'results': {
+            'interpreter': baseline,
+            'import_display': import_display,
+            'headless_startup': headless,
+            'heavy_modules_loaded': [m for m in heavy.split(',') if m],
+            'import_profile': import_profile('display')
+        }
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=4)
+
+    print(f"解释器启动     median {baseline['median_ms']}ms")
+    print(f"import display median {import_display['median_ms']}ms")
+    print(f"无界面启动     median {headless['median_ms']}ms")
+    print(f"已加载的重量级模块: {output['results']['heavy_modules_loaded'] or '无'}")
+    print(f"结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import random
+from typing import Dict, List
+
+
+def category_paths(categories: int, depth: int, start: int = 0) -> List[List[str]]:
+    # 生成 categories 个叶子目录，每个目录位于 depth 层嵌套之下
+    paths = []
+    for i in range(start, start + categories):
+        parts = [f"d{level}_{(i >> (level * 3)) % 8}" for level in range(depth - 1, 0, -1)]
+        parts.append(f"cat{i:05d}")
+        paths.append(parts)
+    return paths
+
+
+def generate_dataset(root: str, bases: int = 2, depth: int = 2, categories: int = 100,
+                     images: int = 10000, score_size: int = 1, landmark_size: int = 0,
+                     like_ratio: float = 0.1, seed: int = 0) -> Dict:
+    # 生成与 --input_json 相同结构的合成数据，图片平均分布到各基准目录下的各分类中
+    rng = random.Random(seed)
+    img_tree = {}
+    leaf_dirs = []
+    per_base = max(categories // bases, 1)
+    for b in range(bases):
+        base = os.path.join(root, f"base{b}")
+        base_node = img_tree.setdefault(base, {})
+        for parts in category_paths(per_base, max(depth, 1), b * per_base):
+            node = base_node
+            for part in parts:
+                node = node.setdefault(part, {})
+            leaf_dirs.append(node)
+
+    for i in range(images):
+        node = leaf_dirs[i % len(leaf_dirs)]
+        node[f"img{i:07d}.jpg"] = {
+            'face_scores': [round(rng.random(), 4) for _ in range(max(score_size, 1))],
+            'face_landmark_scores_68': [round(rng.random(), 4) for _ in range(landmark_size)],
+            'like': rng.random() < like_ratio
+        }
+
+    return {'img': img_tree, 'date_updated': '2025-01-01T00:00:00+00:00'}
+
+
+def iter_image_paths(data: Dict):
+    # 按原始结构遍历所有图片的绝对路径
+    def walk(node, current):
+        for key, value in node.items():
+            if isinstance(value, dict):
+                if 'face_scores' in value:
+                    yield os.path.join(current, key)
+                else:
+                    yield from walk(value, os.path.join(current, key))
+
+    for base, node in data.get('img', {}).items():
+        yield from walk(node, base)
+
+
+def materialize_images(paths: List[str], size: int = 20 * 1024, seed: int = 0):
+    # 只为抽样路径写入占位图片文件，避免大数据集在磁盘上生成百万文件
+    rng = random.Random(seed)
+    payload = bytes(rng.getrandbits(8) for _ in range(size))
+    for path in paths:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(payload)
+
+
+def write_dataset(data: Dict, json_path: str):
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic img tree for benchmarks.')
+    parser.add_argument('output', type=str, help='Output JSON file path.')
+    parser.add_argument('--root', type=str, default=None, help='Directory used as the base of image paths.')
+    parser.add_argument('--bases', type=int, default=2, help='Number of base directories.')
+    parser.add_argument('--depth', type=int, default=2, help='Directory depth of each category.')
+    parser.add_argument('--categories', type=int, default=100, help='Number of categories.')
+    parser.add_argument('--images', type=int, default=10000, help='Number of images.')
+    parser.add_argument('--score_size', type=int, default=1, help='Length of face_scores per image.')
+    parser.add_argument('--landmark_size', type=int, default=0, help='Length of landmark scores per image.')
+    parser.add_argument('--like_ratio', type=float, default=0.1, help='Fraction of liked images.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--materialize', type=int, default=0,
+                        help='Write placeholder files for the first N images.')
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root or os.path.join(os.path.dirname(os.path.abspath(args.output)), 'img'))
+    data = generate_dataset(root, args.bases, args.depth, args.categories, args.images,
+                            args.score_size, args.landmark_size, args.like_ratio, args.seed)
+    write_dataset(data, args.output)
+    if args.materialize:
+        paths = []
+        for path in iter_image_paths(data):
+            if len(paths) >= args.materialize:
+                break
+            paths.append(path)
+        materialize_images(paths, seed=args.seed)
+    print(f"写入 {args.images} 张图片到 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import argparse
+import html
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote
+
+from werkzeug.serving import make_server
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from web import WebApp
+from benchmarks.dataset import generate_dataset, iter_image_paths, materialize_images, write_dataset
+
+IMAGE_URL_PATTERN = re.compile(r'src="(/image/[^"]+)"')
+DATA_PATH_PATTERN = re.compile(r'data-path="([^"]+)"')
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # 最近秩法
+    rank = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class LoadStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)  # {路由: [毫秒, ...]}
+        self.errors = defaultdict(int)
+
+    def record(self, route: str, elapsed_ms: float, ok: bool):
+        with self.lock:
+            self.latencies[route].append(elapsed_ms)
+            if not ok:
+                self.errors[route] += 1
+
+    def report(self, duration: float) -> dict:
+        routes = {}
+        total = 0
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            total += len(values)
+            routes[route] = {
+                'requests': len(values),
+                'errors': self.errors[route],
+                'throughput_rps': round(len(values) / duration, 2),
+                'p50_ms': round(percentile(values, 0.50), 2),
+                'p95_ms': round(percentile(values, 0.95), 2),
+                'p99_ms': round(percentile(values, 0.99), 2)
+            }
+        return {'duration_s': round(duration, 2), 'requests': total,
+                'throughput_rps': round(total / duration, 2), 'routes': routes}
+
+
+class SimulatedUser(threading.Thread):
+    # 模拟一个浏览用户：翻分类页、加载图片、打开随机收藏、按概率点赞/取消点赞
+    def __init__(self, user_id, port, categories, stats, deadline, like_rate, images_per_page, seed):
+        super().__init__(daemon=True)
+        self.port = port
+        self.categories = categories
+        self.stats = stats
+        self.deadline = deadline
+        self.like_rate = like_rate
+        self.images_per_page = images_per_page
+        self.rng = random.Random(seed * 1000 + user_id)
+        self.conn = None
+
+    def request(self, route: str, method: str, url: str, body: bytes = None, headers: dict = None) -> str:
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, url, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            data = response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            data, ok = b'', False
+        self.stats.record(route, (time.perf_counter() - start) * 1000, ok)
+        return data.decode('utf-8', errors='replace') if route != 'image' else ''
+
+    def browse_page(self, route: str, url: str):
+        page = self.request(route, 'GET', url)
+        image_urls = IMAGE_URL_PATTERN.findall(page)
+        for image_url in image_urls[:self.images_per_page]:
+            self.request('image', 'GET', html.unescape(image_url))
+        paths = [html.unescape(p) for p in DATA_PATH_PATTERN.findall(page)]
+        if paths and self.rng.random() < self.like_rate:
+            body = json.dumps({'path': self.rng.choice(paths),
+                               'action': self.rng.choice(('like', 'unlike'))}).encode('utf-8')
+            self.request('like_image', 'POST', '/like_image', body, {'Content-Type': 'application/json'})
+
+    def run(self):
+        while time.time() < self.deadline:
+            action = self.rng.random()
+            if action < 0.6:
+                category = self.rng.choice(self.categories)
+                self.browse_page('category', f"/category/{quote(category)}?page={self.rng.randint(1, 3)}")
+            elif action < 0.8:
+                self.browse_page('favorites', f"/category/_favorites?page=1&seed={self.rng.randint(0, 999999)}")
+            elif action < 0.9:
+                self.browse_page('all', f"/all?page={self.rng.randint(1, 20)}")
+            else:
+                self.request('categories', 'GET', f"/?page={self.rng.randint(1, 3)}")
+        if self.conn is not None:
+            self.conn.close()
+
+
+def run_load_test(workdir: str, images: int, categories: int, users: int, duration: float,
+                  like_rate: float, per_page: int, images_per_page: int, seed: int = 0) -> dict:
+    root = os.path.join(workdir, 'img')
+    json_path = os.path.join(workdir, 'loadtest.json')
+    data = generate_dataset(root, bases=2, depth=2, categories=categories, images=images, seed=seed)
+    write_dataset(data, json_path)
+    materialize_images(list(iter_image_paths(data)), size=4 * 1024, seed=seed)
+
+    args = argparse.Namespace(per_page=per_page, host='127.0.0.1', port=0, input_json=[json_path],
+                              replace=None, warmup_workers=1)
+    web_app = WebApp(args)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, web_app.app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    port = server.server_port
+
+    # 等待预热完成
+    while web_app.warmup_state.get(json_path) in ('pending', 'loading'):
+        time.sleep(0.05)
+    category_names = sorted(web_app.index_cache[json_path].category_map.keys())
+
+    stats = LoadStats()
+    start = time.time()
+    deadline = start + duration
+    threads = [SimulatedUser(i, port, category_names, stats, deadline, like_rate, images_per_page, seed)
+               for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    server.shutdown()
+    web_app.save_thread_running = False
+    report = stats.report(elapsed)
+    report['config'] = {'images': images, 'categories': categories, 'users': users,
+                        'like_rate': like_rate, 'per_page': per_page, 'images_per_page': images_per_page}
+    return report
+
+
+def print_report(report: dict):
+    print(f"总请求 {report['requests']}，耗时 {report['duration_s']}s，吞吐 {report['throughput_rps']} req/s")
+    print(f"{'route':<12} {'requests':>9} {'errors':>7} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for route, r in report['routes'].items():
+        print(f"{route:<12} {r['requests']:>9} {r['errors']:>7} {r['throughput_rps']:>9} "
+              f"{r['p50_ms']:>7}ms {r['p95_ms']:>7}ms {r['p99_ms']:>7}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local load test for browse and like traffic.')
+    parser.add_argument('--images', type=int, default=20000, help='Synthetic dataset size.')
+    parser.add_argument('--categories', type=int, default=200, help='Number of categories.')
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 16], help='Concurrent user counts to test.')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per user count.')
+    parser.add_argument('--like_rate', type=float, default=0.2, help='Probability of a like/unlike per page view.')
+    parser.add_argument('--per_page', type=int, default=20, help='Items per page.')
+    parser.add_argument('--images_per_page', type=int, default=8, help='Images fetched per page view.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--output', type=str, default=None, help='Write reports as JSON to this file.')
+    args = parser.parse_args()
+
+    reports = []
+    for users in args.users:
+        with tempfile.TemporaryDirectory() as workdir:
+            print(f"\n== {users} 个并发用户 ==")
+            report = run_load_test(workdir, args.images, args.categories, users, args.duration,
+                                   args.like_rate, args.per_page, args.images_per_page, args.seed)
+            print_report(report)
+            reports.append(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == '__main__':
+    main()
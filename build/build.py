@@ -14,6 +14,9 @@ print(f"version: {version}")
 with open('version.txt', 'w') as f:
     f.write(version)
 
+# 预压缩静态文件，打包后随原文件一起发送
+os.system('python ../compression.py')
+
 # 执行 pyinstaller 打包命令
 os.system('pyinstaller display.spec')
 
@@ -0,0 +1,47 @@
+import json
+import os
+import struct
+from typing import Iterable, Iterator, Optional, Tuple
+
+# 整页图片打包：一次 GET /bundle 请求按顺序返回一页中所有图片的文件内容，开发服务器没有 HTTP/2 多路复用时，
+# 避免每张图片一次请求。响应由连续的帧组成，每帧为：
+#   4 字节大端序的帧头长度
+#   + UTF-8 JSON 帧头 {"i": 序号, "name": "分类/文件名", "status": 200/404, "type": MIME 类型, "size": 字节数}
+#   + size 字节的文件内容
+# 文件按块从磁盘（或变体缓存）读出后立即发送，整个响应不在内存中拼接。
+
+BUNDLE_MIMETYPE = 'application/x-img-display-bundle'
+CHUNK_SIZE = 64 * 1024
+
+
+def frame_header(index: int, status: int, mimetype: Optional[str], size: int, name: str = None) -> bytes:
+    header = json.dumps({'i': index, 'name': name, 'status': status, 'type': mimetype, 'size': size},
+                        separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return struct.pack('>I', len(header)) + header
+
+
+def iter_frames(entries: Iterable[Tuple[int, Optional[str], Optional[str], Optional[str]]],
+                bytes_sent=None) -> Iterator[bytes]:
+    # entries 为 (序号, 文件路径或 None, MIME 类型, 名称)，按需生成；bytes_sent 为可选的计数器
+    for index, path, mimetype, name in entries:
+        try:
+            f = open(path, 'rb') if path is not None else None
+        except OSError:
+            f = None
+        if f is None:
+            yield frame_header(index, 404, None, 0, name)
+            continue
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            yield frame_header(index, 200, mimetype, size, name)
+            remaining = size
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    # 文件在发送过程中被截短，补零保持帧边界
+                    yield b'\0' * remaining
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        if bytes_sent is not None:
+            bytes_sent.inc(size)
@@ -0,0 +1,91 @@
+from typing import Dict, List, Mapping, Optional, Tuple
+
+# 目录树索引：ImageIndex 把每个目录展平为一个分类名（相对路径），很深的目录树会产生成千上万个分类。
+# 这里把分类名按 "/" 重新组织为树，每个节点保存本目录和整个子树的图片数，
+# 子树的点赞数在需要时由各分类的点赞数汇总。子树视图按图片数跳过整个子树分页，不拼接后代的图片列表。
+
+
+class TreeNode:
+    __slots__ = ('name', 'path', 'children', 'images', 'subtree_images')
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path  # 节点对应的分类名，根节点为空字符串
+        self.children = {}  # {名称: TreeNode}，构建完成后按名称排序
+        self.images = 0  # 本目录（同名分类）中的图片数
+        self.subtree_images = 0
+
+
+class CategoryTree:
+    def __init__(self, image_counts: Mapping[str, int]):
+        # image_counts 为 {分类名: 图片数}
+        self.root = TreeNode('', '')
+        self.nodes = {'': self.root}  # {节点路径: TreeNode}
+        for category, count in image_counts.items():
+            node = self.root
+            node.subtree_images += count
+            for part in category.split('/'):
+                path = f"{node.path}/{part}" if node.path else part
+                child = node.children.get(part)
+                if child is None:
+                    child = node.children[part] = self.nodes[path] = TreeNode(part, path)
+                child.subtree_images += count
+                node = child
+            node.images += count
+        for node in self.nodes.values():
+            node.children = dict(sorted(node.children.items()))
+
+    def node(self, path: str) -> Optional[TreeNode]:
+        return self.nodes.get(path.strip('/'))
+
+    def subtree_totals(self, category_counts: Mapping[str, int]) -> Dict[str, int]:
+        # 把 {分类名: 数量} 汇总到每个祖先节点，只经过数量不为零的分类
+        totals = {}
+        for category, count in category_counts.items():
+            if not count or category not in self.nodes:
+                continue
+            path = category
+            while True:
+                totals[path] = totals.get(path, 0) + count
+                if not path:
+                    break
+                path = path.rpartition('/')[0]
+        return totals
+
+    def slices(self, path: str, offset: int, limit: int) -> List[Tuple[str, int, int]]:
+        # 子树中第 offset 张起的 limit 张图片所在的 [(分类名, 起始, 结束)]，按目录先序、名称排序。
+        # 图片数不超过剩余偏移量的子树整体跳过
+        node = self.node(path)
+        result = []
+        if node is None:
+            return result
+
+        def visit(current):
+            nonlocal offset, limit
+            if limit <= 0:
+                return
+            if offset >= current.subtree_images:
+                offset -= current.subtree_images
+                return
+            if offset < current.images:
+                stop = min(current.images, offset + limit)
+                result.append((current.path, offset, stop))
+                limit -= stop - offset
+                offset = 0
+            else:
+                offset -= current.images
+            for child in current.children.values():
+                visit(child)
+
+        visit(node)
+        return result
+
+    def describe(self, node: TreeNode, likes: Optional[Dict[str, int]] = None) -> Dict:
+        return {
+            'name': node.name,
+            'path': node.path,
+            'images': node.subtree_images,
+            'own_images': node.images,
+            'likes': likes.get(node.path, 0) if likes is not None else None,
+            'has_children': bool(node.children)
+        }
@@ -0,0 +1,177 @@
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# 响应压缩：HTML/JSON 响应按 Accept-Encoding 使用 brotli 或 gzip 压缩，小于阈值的不压缩。
+# /d/<json_id> 下的页面以 (地址, 索引版本, 编码) 为键缓存压缩结果，版本未变时不再渲染和压缩。
+# 静态文件在构建时预压缩为 .br/.gz，以带内容哈希的地址发送并允许永久缓存。
+# brotli 为可选依赖，未安装时只使用 gzip。
+
+COMPRESSIBLE_TYPES = ('text/html', 'application/json')
+STATIC_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.json', '.txt')
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def load_brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def available_encodings() -> List[str]:
+    # 按优先顺序排列
+    return ['br', 'gzip'] if load_brotli() is not None else ['gzip']
+
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    # 动态响应使用较快的压缩级别，构建时预压缩使用最高级别
+    if encoding == 'br':
+        return load_brotli().compress(data, quality=11 if best else 5)
+    return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+
+
+def buffer_chunks(chunks: Iterable[str], first: int = 4096, size: int = 32768) -> Iterator[bytes]:
+    # 把模板流的小片段合并成块：第一块较小以便页头尽快发出，之后按 size 字节发送
+    buffer, buffered, limit = [], 0, first
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= limit:
+            yield b''.join(buffer)
+            buffer, buffered, limit = [], 0, size
+    if buffer:
+        yield b''.join(buffer)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    # 流式压缩，每块后同步刷新，浏览器收到即可解压显示
+    if encoding == 'br':
+        compressor = load_brotli().Compressor(quality=5)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+class CompressedCache:
+    # {(地址, ETag, 编码): (压缩后内容, Content-Type)}，按字节数上限以最近最少使用顺序逐出
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Tuple[bytes, str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, body: bytes, content_type: str):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old[0])
+            self.entries[key] = (body, content_type)
+            self.total_bytes += len(body)
+            while self.total_bytes > self.max_bytes:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+
+class StaticAssets:
+    # 静态文件的内容哈希，文件修改后（调试时）自动重新计算
+    def __init__(self, static_dir: str):
+        self.static_dir = static_dir
+        self.hashes = {}  # {文件名: (大小, mtime, 哈希)}
+        self.lock = threading.Lock()
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.static_dir, *filename.split('/'))
+
+    def digest(self, filename: str) -> str:
+        try:
+            stat = os.stat(self.path(filename))
+        except OSError:
+            return 'missing'
+        with self.lock:
+            cached = self.hashes.get(filename)
+        if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        with open(self.path(filename), 'rb') as f:
+            value = hashlib.sha1(f.read()).hexdigest()[:12]
+        with self.lock:
+            self.hashes[filename] = (stat.st_size, stat.st_mtime_ns, value)
+        return value
+
+    def precompressed(self, filename: str, encodings: List[str]) -> Tuple[str, str]:
+        # 返回 (预压缩文件名, 编码)；预压缩文件比原文件旧时忽略
+        try:
+            source_mtime = os.stat(self.path(filename)).st_mtime_ns
+        except OSError:
+            return None, None
+        for encoding in encodings:
+            encoded = filename + ENCODING_SUFFIXES[encoding]
+            try:
+                if os.stat(self.path(encoded)).st_mtime_ns >= source_mtime:
+                    return encoded, encoding
+            except OSError:
+                continue
+        return None, None
+
+
+def precompress_static(static_dir: str) -> Dict[str, int]:
+    # 为静态文件生成 .br/.gz，只保留比原文件小的结果
+    written = {}
+    for root, _, files in os.walk(static_dir):
+        for name in files:
+            if not name.endswith(STATIC_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            for encoding in available_encodings():
+                target = path + ENCODING_SUFFIXES[encoding]
+                body = compress(data, encoding, best=True)
+                if len(body) >= len(data):
+                    if os.path.exists(target):
+                        os.remove(target)
+                    continue
+                with open(target, 'wb') as f:
+                    f.write(body)
+                written[os.path.relpath(target, static_dir).replace(os.sep, '/')] = len(body)
+    return written
+
+
+def guess_mimetype(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompress static assets with brotli and gzip.')
+    parser.add_argument('--static_dir', type=str,
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        help='Directory containing css/ and js/.')
+    args = parser.parse_args()
+    for name, size in sorted(precompress_static(args.static_dir).items()):
+        print(f"{name}: {size} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,167 +1,12 @@
 import argparse
-import os
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-from version import __version__
 import sys
 
-class ConfigGUI:
-    def __init__(self, args):
-        self.args = args
-        self.config_root = tk.Tk()
-        self.config_root.title(f"配置参数 - 版本: {__version__}")
-        self.main_frame = ttk.Frame(self.config_root)
-        self.main_frame.pack(padx=20, pady=20, fill=tk.BOTH, expand=True)
-        self.replace_entries = []
-        self.create_widgets()
-
-    def create_widgets(self):
-        # 文件选择部分
-        ttk.Label(self.main_frame, text="JSON文件路径:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
-        
-        # 使用 Listbox 显示多文件路径
-        self.file_listbox = tk.Listbox(self.main_frame, width=50, height=3, selectmode=tk.EXTENDED)
-        self.file_listbox.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
-        
-        # 文件操作按钮框架
-        file_btn_frame = ttk.Frame(self.main_frame)
-        file_btn_frame.grid(row=0, column=2, padx=5, sticky=tk.W)
-        
-        ttk.Button(file_btn_frame, text="添加...", command=self.add_files).pack(pady=2)
-        ttk.Button(file_btn_frame, text="移除", command=self.remove_files).pack(pady=2)
-
-        # 参数配置部分
-        settings_frame = ttk.LabelFrame(self.main_frame, text="服务器配置")
-        settings_frame.grid(row=1, column=0, columnspan=3, pady=10, sticky=tk.EW)
-
-        # 每页数量
-        ttk.Label(settings_frame, text="每页数量:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
-        self.per_page_entry = ttk.Entry(settings_frame)
-        self.per_page_entry.insert(0, str(self.args.per_page))
-        self.per_page_entry.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
-
-        # 调试模式
-        self.debug_var = tk.BooleanVar(master=self.config_root, value=self.args.debug)
-        ttk.Checkbutton(settings_frame, text="调试模式", variable=self.debug_var).grid(row=0, column=2, columnspan=2, padx=5, pady=5, sticky=tk.W)
-
-        # 主机地址
-        ttk.Label(settings_frame, text="主机地址:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
-        self.host_entry = ttk.Entry(settings_frame)
-        self.host_entry.insert(0, self.args.host)
-        self.host_entry.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
-
-        # 端口号
-        ttk.Label(settings_frame, text="端口号:").grid(row=1, column=2, padx=5, pady=5, sticky=tk.W)
-        self.port_entry = ttk.Entry(settings_frame)
-        self.port_entry.insert(0, str(self.args.port))
-        self.port_entry.grid(row=1, column=3, padx=5, pady=5, sticky=tk.W)
-
-        # 是否自动打开浏览器
-        self.no_browser_var = tk.BooleanVar(master=self.config_root, value=self.args.no_browser)
-        ttk.Checkbutton(settings_frame, text="不自动打开浏览器", variable=self.no_browser_var).grid(row=1, column=4, columnspan=2, pady=5, sticky=tk.W)
-
-        # 替换字符串部分
-        self.replace_frame = ttk.LabelFrame(self.main_frame, text="字符串替换")
-        self.replace_frame.grid(row=3, column=0, columnspan=3, pady=10, sticky=tk.EW)
-
-        ttk.Button(self.replace_frame, text="添加替换项", command=self.add_replace_entry).pack(pady=5)
-
-        # 确认按钮
-        btn_frame = ttk.Frame(self.main_frame)
-        btn_frame.grid(row=4, column=0, columnspan=3, pady=10)
-        ttk.Button(btn_frame, text="启动服务", command=self.submit_params).pack(side=tk.LEFT, padx=5)
-        ttk.Button(btn_frame, text="退出", command=self.config_root.destroy).pack(side=tk.RIGHT, padx=5)
-
-        # 窗口居中（根据内容自动调整大小）
-        self.config_root.update_idletasks()
-        width = self.config_root.winfo_reqwidth()
-        height = self.config_root.winfo_reqheight()
-        x = (self.config_root.winfo_screenwidth() - width) // 2
-        y = (self.config_root.winfo_screenheight() - height) // 2
-        self.config_root.geometry(f'{width}x{height}+{x}+{y}')
-
-    def add_files(self):
-        file_paths = filedialog.askopenfilenames(
-            title="选择JSON文件",
-            filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")]
-        )
-        if file_paths:
-            for path in file_paths:
-                if path not in self.file_listbox.get(0, tk.END):
-                    self.file_listbox.insert(tk.END, path)
-
-    def remove_files(self):
-        selected = self.file_listbox.curselection()
-        for index in reversed(selected):
-            self.file_listbox.delete(index)
-
-    def add_replace_entry(self):
-        entry_frame = ttk.Frame(self.replace_frame)
-        entry_frame.pack(fill=tk.X, pady=2)  # 填充水平方向
-
-        inner_frame = ttk.Frame(entry_frame)
-        inner_frame.pack(expand=True)  # 在entry_frame中居中
-
-        entry1 = ttk.Entry(inner_frame, width=20)
-        entry1.pack(side=tk.LEFT, padx=5)
-        entry2 = ttk.Entry(inner_frame, width=20)
-        entry2.pack(side=tk.LEFT, padx=5)
-        self.replace_entries.append((entry1, entry2))
-
-        # 更新窗口大小并保持居中
-        self.config_root.update_idletasks()
-        width = self.config_root.winfo_reqwidth()
-        height = self.config_root.winfo_reqheight()
-        x = (self.config_root.winfo_screenwidth() - width) // 2
-        y = (self.config_root.winfo_screenheight() - height) // 2
-        self.config_root.geometry(f"{width}x{height}+{x}+{y}")
-
-    def submit_params(self):
-        # 验证文件路径
-        file_paths = self.file_listbox.get(0, tk.END)
-        if not file_paths:
-            messagebox.showerror("错误", "必须选择至少一个JSON文件")
-            return
-        for path in file_paths:
-            if not os.path.isfile(path):
-                messagebox.showerror("错误", f"文件路径无效: {path}")
-                return
-
-        # 验证数值参数
-        try:
-            self.args.per_page = int(self.per_page_entry.get())
-            if self.args.per_page <= 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("错误", "每页数量必须是正整数")
-            return
-
-        self.args.host = self.host_entry.get().strip()
-        if not self.args.host:
-            messagebox.showerror("错误", "主机地址不能为空")
-            return
-
-        try:
-            self.args.port = int(self.port_entry.get())
-            if not (0 <= self.args.port <= 65535):
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("错误", "端口号必须是0-65535之间的整数")
-            return
-
-        self.args.debug = self.debug_var.get()
-        self.args.no_browser = self.no_browser_var.get()
-        self.args.input_json = list(file_paths)  # 存储为列表
-
-        # 处理替换字符串
-        self.args.replace = []
-        for entry1, entry2 in self.replace_entries:
-            old_str = entry1.get().strip()
-            new_str = entry2.get().strip()
-            if old_str and new_str:
-                self.args.replace.append([old_str, new_str])
-
-        self.config_root.destroy()
+def __getattr__(name):
+    # GUI 相关模块只在需要时导入，无界面启动（指定 --input_json）时不加载 tkinter
+    if name == 'ConfigGUI':
+        from config_gui import ConfigGUI
+        return ConfigGUI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description='Display image information using Flask app.')
@@ -174,6 +19,71 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('--replace', type=str, nargs=2, action='append',
                         help='Temporarily replace strings in input_json, e.g., "/abc" "/def"')
     parser.add_argument('--no_browser', action='store_true', help='Do not open the browser automatically.')
+    parser.add_argument('--warmup_workers', type=int, default=4,
+                        help='Threads used to preload all input JSON files at startup (0 disables warm-up).')
+    parser.add_argument('--cache_mb', type=float, default=0,
+                        help='Memory budget in MB for cached JSON files and indexes (0 = unlimited).')
+    parser.add_argument('--sidecar_dir', type=str, default=None,
+                        help='Trusted directory for pickle sidecars of evicted JSON files (fast reload).')
+    parser.add_argument('--profile_dir', type=str, default=None,
+                        help='Enable request profiling and write cProfile files to this directory.')
+    parser.add_argument('--profile_threshold_ms', type=float, default=500,
+                        help='Save profiles of requests slower than this many milliseconds.')
+    parser.add_argument('--profile_secret', type=str, default=None,
+                        help='Always profile requests whose X-Profile-Secret header matches this value.')
+    parser.add_argument('--profile_keep', type=int, default=50, help='Number of profile files to keep.')
+    parser.add_argument('--profile_sample_rate', type=float, default=0.01,
+                        help='Fraction of requests without the secret header that are profiled (1 = all).')
+    parser.add_argument('--sqlite_db', type=str, default=None,
+                        help='Import input JSON files into this SQLite database and store likes there.')
+    parser.add_argument('--crawl_interval', type=float, default=0,
+                        help='Seconds between incremental refreshes of loaded JSON files from disk (0 disables).')
+    parser.add_argument('--crawl_workers', type=int, default=8, help='Threads used to scan image directories.')
+    parser.add_argument('--validate_interval', type=float, default=0,
+                        help='Seconds between background checks that indexed image files exist (0 disables).')
+    parser.add_argument('--validate_workers', type=int, default=8, help='Threads used to check image files.')
+    parser.add_argument('--hide_missing', action='store_true', help='Hide images whose files are missing on disk.')
+    parser.add_argument('--variant_cache_dir', type=str, default=None,
+                        help='Serve AVIF/WebP variants to browsers that accept them, cached in this directory '
+                             '(requires Pillow).')
+    parser.add_argument('--variant_cache_mb', type=float, default=512,
+                        help='Disk budget in MB for cached image variants (0 = unlimited).')
+    parser.add_argument('--variant_workers', type=int, default=2, help='Threads used to transcode image variants.')
+    parser.add_argument('--cache_max_age', type=int, default=0,
+                        help='max-age in seconds for pages and images under /d/<json_id>/ '
+                             '(0 = cacheable but revalidated with ETag on every use).')
+    parser.add_argument('--compress_min_bytes', type=int, default=1024,
+                        help='Compress HTML/JSON responses at least this large with brotli/gzip (-1 = off).')
+    parser.add_argument('--compress_cache_mb', type=float, default=32,
+                        help='Memory budget in MB for compressed pages cached per index version.')
+    parser.add_argument('--stream_min_images', type=int, default=0,
+                        help='Stream-render image pages with at least this many images (0 = never).')
+    parser.add_argument('--sprite_cache_dir', type=str, default=None,
+                        help='Compose category thumbnails into one cached sprite per page (requires Pillow).')
+    parser.add_argument('--sprite_cache_mb', type=float, default=128,
+                        help='Disk budget in MB for cached category sprites (0 = unlimited).')
+    parser.add_argument('--sprite_tile', type=int, default=250, help='Edge length in pixels of each sprite tile.')
+    parser.add_argument('--variant_formats', type=str, nargs='+', default=['avif', 'webp'],
+                        choices=['avif', 'webp'], help='Variant formats in order of preference.')
+    parser.add_argument('--overlay_dir', type=str, default=None,
+                        help='Store likes of identified users in per-user overlay files in this directory '
+                             'instead of the shared JSON.')
+    parser.add_argument('--user_header', type=str, default=None,
+                        help='Request header set by an authenticating reverse proxy that names the user '
+                             '(default: users enter their name, kept in a cookie).')
+    parser.add_argument('--probe_workers', type=int, default=0,
+                        help='Threads that read image headers in the background so pages carry width/height '
+                             '(default: 0, disabled).')
+    parser.add_argument('--probe_wait_ms', type=float, default=50,
+                        help='How long a page waits for the dimensions of its own images (default: 50).')
+    parser.add_argument('--bundle_images', action='store_true',
+                        help='Load all images of a page with one streamed /bundle request instead of one request each.')
+    parser.add_argument('--max_image_sends', type=int, default=0,
+                        help='Image files sent at the same time; further image requests queue (default: 0, unlimited).')
+    parser.add_argument('--image_queue_depth', type=int, default=64,
+                        help='Queued image requests beyond which new ones get 503 with Retry-After (default: 64).')
+    parser.add_argument('--image_queue_timeout', type=float, default=10,
+                        help='Seconds an image request may wait for a send slot before 503 (default: 10).')
     return parser.parse_args()
 
 def get_config() -> argparse.Namespace:
@@ -181,6 +91,7 @@ def get_config() -> argparse.Namespace:
 
     if args.input_json is None:
         try:
+            from config_gui import ConfigGUI
             gui = ConfigGUI(args)
             gui.config_root.mainloop()
 
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Tuple
+
+# 目录爬虫：用线程池并行 os.scandir 基准路径，发现新增、删除和修改的图片并合并进JSON。
+# 增量刷新时目录 mtime 未变化的目录不再列出（只 stat 目录本身），
+# 因此未变化的大目录树只需 O(目录数) 次系统调用。
+# 注意：原地改写文件内容不会改变目录 mtime，需要 full=True 才能发现。
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+
+def is_image(name: str) -> bool:
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def crawl_state_path(json_path: str) -> str:
+    return f"{json_path}.crawl.json"
+
+
+def load_crawl_state(json_path: str) -> Dict:
+    try:
+        with open(crawl_state_path(json_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_crawl_state(json_path: str, state: Dict):
+    path = crawl_state_path(json_path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def scan_directory(path: str) -> Dict:
+    # 先取目录 mtime 再列出内容，扫描期间发生的变化会在下次刷新时被发现
+    entry_state = {'mtime_ns': os.stat(path).st_mtime_ns, 'files': {}, 'dirs': []}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    entry_state['dirs'].append(entry.name)
+                elif entry.is_file():
+                    # 记录所有文件，JSON中扩展名不在列表内的图片不会被误判为缺失
+                    stat = entry.stat()
+                    entry_state['files'][entry.name] = [stat.st_size, stat.st_mtime_ns]
+            except OSError:
+                continue
+    entry_state['dirs'].sort()
+    return entry_state
+
+
+class DirectoryCrawler:
+    def __init__(self, workers: int = 8):
+        self.workers = max(workers, 1)
+
+    def visit(self, base_abs: str, rel_dir: str, previous: Dict, full: bool):
+        path = os.path.join(base_abs, *rel_dir.split('/')) if rel_dir else base_abs
+        try:
+            if not full and previous is not None and os.stat(path).st_mtime_ns == previous['mtime_ns']:
+                return rel_dir, previous, False
+            return rel_dir, scan_directory(path), True
+        except OSError:
+            return rel_dir, None, True
+
+    def crawl(self, base_abs: str, previous: Dict, full: bool = False) -> Tuple[Dict, List[str]]:
+        # 返回 (新状态 {相对目录: 目录状态}, 重新列出的目录)；
+        # 基准路径本身不可访问（如磁盘未挂载）时返回 (None, [])，不把其中的图片当作已删除
+        if not os.path.isdir(base_abs):
+            return None, []
+        state = {}
+        rescanned = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self.visit, base_abs, '', previous.get(''), full)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rel_dir, entry_state, changed = future.result()
+                    if entry_state is None:
+                        continue
+                    state[rel_dir] = entry_state
+                    if changed:
+                        rescanned.append(rel_dir)
+                    for name in entry_state['dirs']:
+                        child = f"{rel_dir}/{name}" if rel_dir else name
+                        pending.add(executor.submit(self.visit, base_abs, child, previous.get(child), full))
+        return state, rescanned
+
+
+def find_node(base_node: Dict, rel_dir: str, create: bool = False):
+    node = base_node
+    for part in rel_dir.split('/') if rel_dir else []:
+        child = node.get(part)
+        if child is None and create:
+            child = node[part] = {}
+        elif not isinstance(child, dict) or 'face_scores' in child:
+            return None
+        node = child
+    return node
+
+
+def merge_changes(base_node: Dict, previous: Dict, state: Dict, rescanned: List[str], counts: Dict):
+    # 把一个基准路径的扫描结果合并进JSON子树：
+    # 新图片以 unscored 标记加入；消失的图片若由爬虫加入则删除，否则标记 missing；
+    # 大小或 mtime 变化的图片标记 unscored 等待重新评分
+    for rel_dir in rescanned:
+        files = state[rel_dir]['files']
+        old_files = previous.get(rel_dir, {}).get('files', {})
+        node = find_node(base_node, rel_dir, create=any(is_image(name) for name in files))
+        if node is None:
+            continue
+        for name, value in list(node.items()):
+            if not isinstance(value, dict) or 'face_scores' not in value:
+                continue
+            if name not in files:
+                remove_image(node, name, counts)
+            elif value.pop('missing', False):
+                counts['restored'] += 1
+            elif name in old_files and old_files[name] != files[name] and not value.get('unscored'):
+                value['unscored'] = True
+                counts['modified'] += 1
+        for name in files:
+            if name not in node and is_image(name):
+                node[name] = {'face_scores': [], 'face_landmark_scores_68': [], 'unscored': True}
+                counts['added'] += 1
+    for rel_dir in previous:
+        if rel_dir in state:
+            continue
+        node = find_node(base_node, rel_dir)
+        if node is None:
+            continue
+        for name, value in list(node.items()):
+            if isinstance(value, dict) and 'face_scores' in value:
+                remove_image(node, name, counts)
+
+
+def remove_image(node: Dict, name: str, counts: Dict):
+    value = node[name]
+    if value.get('unscored') and not value.get('face_scores'):
+        del node[name]
+        counts['removed'] += 1
+    elif not value.get('missing'):
+        value['missing'] = True
+        counts['missing'] += 1
+
+
+def scan_bases(img_data: Dict, crawl_state: Dict, crawler: DirectoryCrawler, full: bool = False) -> Dict:
+    # 扫描不修改数据，调用方可以在 data_lock 外进行，再持锁调用 apply_scans 合并
+    scans = {}
+    for base in list(img_data):
+        base_abs = os.path.abspath(os.path.normpath(base))
+        scans[base] = crawler.crawl(base_abs, crawl_state.get(base_abs, {}), full)
+    return scans
+
+
+def apply_scans(img_data: Dict, crawl_state: Dict, scans: Dict) -> Tuple[Dict, Dict]:
+    counts = {'added': 0, 'removed': 0, 'missing': 0, 'restored': 0, 'modified': 0, 'dirs_rescanned': 0}
+    new_state = {}
+    for base, (state, rescanned) in scans.items():
+        base_abs = os.path.abspath(os.path.normpath(base))
+        if state is None:
+            new_state[base_abs] = crawl_state.get(base_abs, {})
+            continue
+        base_node = img_data.get(base)
+        if isinstance(base_node, dict):
+            merge_changes(base_node, crawl_state.get(base_abs, {}), state, rescanned, counts)
+        new_state[base_abs] = state
+        counts['dirs_rescanned'] += len(rescanned)
+    return new_state, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh input JSON files from the image directories on disk.')
+    parser.add_argument('--input_json', type=str, nargs='+', required=True, help='JSON files to refresh in place.')
+    parser.add_argument('--replace', type=str, nargs=2, action='append',
+                        help='Temporarily replace strings in input_json, e.g., "/abc" "/def"')
+    parser.add_argument('--workers', type=int, default=8, help='Directory scanning threads.')
+    parser.add_argument('--full', action='store_true',
+                        help='List every directory instead of skipping ones whose mtime is unchanged.')
+    args = parser.parse_args()
+
+    replace_rules = args.replace or []
+    crawler = DirectoryCrawler(args.workers)
+    for json_path in args.input_json:
+        # 与 WebApp 相同的替换方式：扫描使用替换后的路径，写回时还原
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data_str = json.dumps(json.load(f))
+        for old, new in replace_rules:
+            data_str = data_str.replace(old, new)
+        raw_data = json.loads(data_str)
+        crawl_state = load_crawl_state(json_path)
+        img_data = raw_data.setdefault('img', {})
+        new_state, counts = apply_scans(img_data, crawl_state, scan_bases(img_data, crawl_state, crawler, args.full))
+        data_str = json.dumps(raw_data)
+        for old, new in reversed(replace_rules):
+            data_str = data_str.replace(new, old)
+        tmp_path = f"{json_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(json.loads(data_str), ensure_ascii=False, indent=4))
+        os.replace(tmp_path, json_path)
+        save_crawl_state(json_path, new_state)
+        print(f"{json_path}: {counts}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import itertools
+import os
+import struct
+import threading
+from collections import defaultdict
+from queue import PriorityQueue
+from typing import Dict, List, Optional, Tuple
+
+# 图片尺寸探测：只读取文件头（JPEG SOF、PNG IHDR、GIF 逻辑屏幕描述符、WebP VP8/VP8L/VP8X），
+# 不解码图片。探测在后台线程中进行，结果写入索引的 img_info（width/height，以及 probed=(mtime_ns, 大小)），
+# 模板据此输出 <img width height>，懒加载时页面布局不再跳动。
+# 当前页缺少尺寸的图片优先探测，整个索引的探测排在其后；文件的 mtime 或大小变化后重新探测。
+
+PAGE_PRIORITY = 0
+INDEX_PRIORITY = 1
+CHUNK_SIZE = 256
+# JPEG 中带尺寸的帧起始标记（SOF0-SOF15，不含 DHT/JPG/DAC）
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def exif_orientation(data: bytes) -> int:
+    # data 为 APP1 段内容；只读取第一个 IFD 中的 Orientation 标签
+    if not data.startswith(b'Exif\0\0'):
+        return 1
+    tiff = data[6:]
+    order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if order is None:
+        return 1
+    try:
+        offset = struct.unpack(f'{order}I', tiff[4:8])[0]
+        count = struct.unpack(f'{order}H', tiff[offset:offset + 2])[0]
+        for i in range(count):
+            entry = offset + 2 + i * 12
+            tag = struct.unpack(f'{order}H', tiff[entry:entry + 2])[0]
+            if tag == 0x0112:
+                return struct.unpack(f'{order}H', tiff[entry + 8:entry + 10])[0]
+    except struct.error:
+        pass
+    return 1
+
+
+def jpeg_size(f) -> Optional[Tuple[int, int]]:
+    # 逐段跳过，直到帧起始标记；浏览器按 EXIF 方向显示，方向 5-8 时交换宽高
+    f.seek(2)
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            continue
+        if marker in (0xD9, 0xDA):
+            return None
+        length = struct.unpack('>H', f.read(2))[0]
+        if marker in SOF_MARKERS:
+            height, width = struct.unpack('>xHH', f.read(5))
+            return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+        if marker == 0xE1 and orientation == 1:
+            orientation = exif_orientation(f.read(length - 2))
+        else:
+            f.seek(length - 2, 1)
+
+
+def header_size(head: bytes) -> Optional[Tuple[int, int]]:
+    # PNG/GIF/WebP 的尺寸都在文件开头 30 字节内
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', head[6:10])
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        chunk = head[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', head[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L':
+            b0, b1, b2, b3 = head[21:25]
+            return 1 + (((b1 & 0x3F) << 8) | b0), 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+        if chunk == b'VP8X':
+            return 1 + int.from_bytes(head[24:27], 'little'), 1 + int.from_bytes(head[27:30], 'little')
+    return None
+
+
+def read_dimensions(path: str) -> Optional[Tuple[int, int]]:
+    # 返回显示时的 (宽, 高)，无法识别的格式或损坏的文件返回 None
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(32)
+            size = jpeg_size(f) if head[:2] == b'\xff\xd8' else header_size(head)
+    except (OSError, struct.error, ValueError):
+        return None
+    if size is None or size[0] <= 0 or size[1] <= 0:
+        return None
+    return size
+
+
+def carry_over(index, previous) -> int:
+    # 重建索引后沿用旧索引中的探测结果，后台探测时再按 mtime 和大小确认
+    copied = 0
+    old_map = previous.path_map
+    for path, img_info in index.path_map.items():
+        old = old_map.get(path)
+        if old is not None and 'probed' in old and 'width' not in img_info:
+            img_info['probed'] = old['probed']
+            img_info['height'] = old.get('height')
+            img_info['width'] = old.get('width')
+            copied += 1
+    return copied
+
+
+class DimensionProber:
+    # 固定数量的工作线程从优先队列中取出图片批次；页面请求的批次优先，并可等待完成
+    def __init__(self, workers: int, probes=None):
+        self.queue = PriorityQueue()
+        self.sequence = itertools.count()  # 同优先级按提交顺序处理
+        self.probes = probes  # 可选的计数器，按结果（probed/unchanged/failed）计数
+        self.generations = defaultdict(int)  # {文件: 改变了宽高的批次数}，该文件页面的 ETag 包含该值
+        self.generation_lock = threading.Lock()
+        for i in range(max(workers, 1)):
+            threading.Thread(target=self.run, name=f'probe_{i}', daemon=True).start()
+
+    def pending(self) -> int:
+        return self.queue.qsize()
+
+    def generation(self, key: str) -> int:
+        return self.generations.get(key, 0)
+
+    def schedule(self, index, previous=None, key: str = None):
+        # 后台探测整个索引，previous 为重建前的索引，key 为索引所属的文件
+        if previous is not None:
+            carry_over(index, previous)
+        images = list(index.path_map.values())
+        for start in range(0, len(images), CHUNK_SIZE):
+            self.queue.put((INDEX_PRIORITY, next(self.sequence), images[start:start + CHUNK_SIZE], None, key))
+
+    def fill(self, images: List[Dict], timeout: float = 0, key: str = None) -> bool:
+        # 为当前页缺少尺寸的图片插队探测，最多等待 timeout 秒；返回是否全部完成
+        missing = [img for img in images if 'width' not in img and not img.get('missing')]
+        if not missing:
+            return True
+        done = threading.Event()
+        self.queue.put((PAGE_PRIORITY, next(self.sequence), missing, done, key))
+        return timeout > 0 and done.wait(timeout)
+
+    def run(self):
+        while True:
+            _, _, images, done, key = self.queue.get()
+            changed = False
+            for img_info in images:
+                size = (img_info.get('width'), img_info.get('height'))
+                try:
+                    result = self.probe(img_info)
+                except Exception:
+                    result = 'failed'
+                # 只有页面上输出的宽高变化才算改变；探测失败或重新探测得到相同尺寸时页面不变
+                changed = changed or (img_info.get('width'), img_info.get('height')) != size
+                if self.probes is not None:
+                    self.probes.inc(result=result)
+            if changed and key is not None:
+                # 尺寸写入后才换代，该文件之前缓存的页面随之失效
+                with self.generation_lock:
+                    self.generations[key] += 1
+            if done is not None:
+                done.set()
+            self.queue.task_done()
+
+    @staticmethod
+    def probe(img_info: Dict) -> str:
+        # 先写 height 再写 width，模板以 width 判断尺寸是否可用
+        try:
+            stat = os.stat(img_info['path'])
+        except OSError:
+            img_info['width'] = None
+            return 'failed'
+        probed = (stat.st_mtime_ns, stat.st_size)
+        if img_info.get('probed') == probed and 'width' in img_info:
+            return 'unchanged'
+        size = read_dimensions(img_info['path'])
+        width, height = size if size is not None else (None, None)
+        img_info['probed'] = probed
+        img_info['height'] = height
+        img_info['width'] = width
+        return 'probed' if size is not None else 'failed'
@@ -1,9 +1,7 @@
-import webbrowser
 import threading
-import requests
 from web import WebApp
 from config import get_config
-from version import __version__
+from version import get_version
 
 class ImageGalleryApp:
     def __init__(self):
@@ -15,6 +13,7 @@ class ImageGalleryApp:
         while True:
             if input().lower() == 'q':
                 try:
+                    import requests  # 仅在退出时使用，避免启动时加载
                     requests.post(f'http://127.0.0.1:{self.args.port}/shutdown')
                 except Exception as e:
                     self.web_app.app.logger.error(f"Shutdown failed: {str(e)}")
@@ -23,12 +22,13 @@ class ImageGalleryApp:
 
     def run(self):
         if not self.args.no_browser:  # 只有在没有指定 --no_browser 时才打开浏览器
+            import webbrowser
             threading.Timer(1, lambda: webbrowser.open(f'http://127.0.0.1:{self.args.port}')).start()
         input_thread = threading.Thread(target=self.input_listener, daemon=True)
         input_thread.start()
         self.web_app.app.run(host=self.args.host, port=self.args.port, debug=self.args.debug, use_reloader=False)
 
 if __name__ == '__main__':
-    print(f"Version: {__version__}")
+    print(f"Version: {get_version()}")
     app = ImageGalleryApp()
     app.run()
\ No newline at end of file
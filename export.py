@@ -0,0 +1,146 @@
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Set
+
+from image_index import ImageIndex
+
+# 导出：把任意视图（收藏、未收藏、某个分类、全部）按分数筛选后逐条输出为 NDJSON 或 CSV。
+# 全部基于生成器，导出几十万条记录时不构建列表，也不持有 data_lock
+# （索引按引用发布，迭代期间点赞只改变单条记录的 like 字段）。
+
+EXPORT_FIELDS = ('path', 'category', 'filename', 'like', 'faces', 'face_score_max', 'face_score_mean',
+                 'landmark_score_mean', 'unscored', 'missing')
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def iter_view(category_map: Mapping, view: Optional[str] = None, liked: Optional[Set[str]] = None) -> Iterator[Dict]:
+    # 与页面相同的视图与顺序：收藏/未收藏按分类加载顺序，全部按分类名排序。
+    # liked 为当前用户点赞覆盖层中的路径集合时，收藏状态以其为准
+    if view in ('_favorites', '_unfavorites'):
+        wanted = view == '_favorites'
+        for category in list(category_map):
+            for img in category_map.get(category, ()):
+                is_liked = img['path'] in liked if liked is not None else bool(img.get('like'))
+                if is_liked == wanted:
+                    yield img if liked is None else dict(img, like=is_liked)
+        return
+    if view:
+        images = category_map.get(view, ())
+    else:
+        images = (img for category in sorted(category_map) for img in category_map.get(category, ()))
+    for img in images:
+        yield img if liked is None else dict(img, like=img['path'] in liked)
+
+
+def mean(values) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def export_record(img: Dict) -> Dict:
+    face_scores = img.get('face_scores') or []
+    return {
+        'path': img['path'],
+        'category': img['category'],
+        'filename': img['filename'],
+        'like': bool(img.get('like')),
+        'faces': len(face_scores),
+        'face_score_max': max(face_scores) if face_scores else None,
+        'face_score_mean': mean(face_scores),
+        'landmark_score_mean': mean(img.get('landmark_scores') or []),
+        'unscored': bool(img.get('unscored')),
+        'missing': bool(img.get('missing'))
+    }
+
+
+def iter_records(images: Iterable[Dict], min_score: float = None, max_score: float = None) -> Iterator[Dict]:
+    # 分数筛选使用每张图片中最高的人脸分数，未评分图片在指定筛选时被排除
+    for img in images:
+        record = export_record(img)
+        if min_score is not None or max_score is not None:
+            score = record['face_score_max']
+            if score is None or (min_score is not None and score < min_score) \
+                    or (max_score is not None and score > max_score):
+                continue
+        yield record
+
+
+def ndjson_lines(records: Iterable[Dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_lines(records: Iterable[Dict]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, lineterminator='\n')
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_lines(records: Iterable[Dict], fmt: str) -> Iterator[str]:
+    return csv_lines(records) if fmt == 'csv' else ndjson_lines(records)
+
+
+def batch_lines(lines: Iterable[str], size: int = 65536) -> Iterator[bytes]:
+    # 每行单独发送开销太大，按大小合并成块
+    buffer, buffered = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a view of an input JSON file as NDJSON or CSV.')
+    parser.add_argument('--input_json', type=str, required=True, help='JSON file to export from.')
+    parser.add_argument('--replace', type=str, nargs=2, action='append',
+                        help='Temporarily replace strings in input_json, e.g., "/abc" "/def"')
+    parser.add_argument('--view', type=str, default=None,
+                        help='_favorites, _unfavorites or a category name (default: all images).')
+    parser.add_argument('--format', type=str, choices=tuple(EXPORT_FORMATS), default='ndjson', help='Output format.')
+    parser.add_argument('--min_score', type=float, default=None, help='Only images whose best face score >= this.')
+    parser.add_argument('--max_score', type=float, default=None, help='Only images whose best face score <= this.')
+    parser.add_argument('--output', type=str, default=None, help='Output file (default: stdout).')
+    args = parser.parse_args()
+
+    # 与 WebApp 相同的替换方式，导出的路径与页面中一致
+    with open(args.input_json, 'r', encoding='utf-8') as f:
+        data_str = json.dumps(json.load(f))
+    for old, new in args.replace or []:
+        data_str = data_str.replace(old, new)
+    index = ImageIndex(json.loads(data_str))
+    del data_str
+
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    records = iter_records(iter_view(index.category_map, args.view), args.min_score, args.max_score)
+    output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        for line in export_lines(counted(records), args.format):
+            output.write(line)
+    finally:
+        if args.output:
+            output.close()
+    print(f"exported {count} records", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
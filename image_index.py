@@ -0,0 +1,88 @@
+import os
+from collections import defaultdict
+
+# 内存估算常数（CPython 3.11 下用 tracemalloc 在合成数据上测得）
+RAW_NODE_BYTES = 416  # 每个图片节点在原始JSON数据中的开销
+INDEX_ENTRY_BYTES = 490  # 每张图片在索引中的开销
+SCORE_BYTES = 32  # 每个分数值（列表槽位 + float 对象）
+
+
+def is_listed(node) -> bool:
+    # 有人脸分数的图片，以及爬虫新发现、尚未评分的图片会显示在页面中
+    return bool(node.get('face_scores')) or bool(node.get('unscored'))
+
+
+def snapshot_tree(node):
+    # 复制目录层级，图片节点仍共享；在锁内复制后可以在锁外遍历副本，
+    # 期间爬虫或其他写线程增删目录项不会让遍历出错
+    return {key: snapshot_tree(value) if isinstance(value, dict) and 'face_scores' not in value else value
+            for key, value in node.items()}
+
+
+class ImageIndex:
+    # 单个JSON文件的图片索引，构建后按引用发布，读请求无需持有 data_lock
+    def __init__(self, raw_data, img_data=None):
+        # img_data 为可选的目录结构快照（见 snapshot_tree），默认直接遍历 raw_data['img']
+        self.raw_data = raw_data
+        self.category_map = defaultdict(list)  # {分类: [img_info, ...]}
+        self.file_map = {}  # {"分类/文件名": 绝对路径}
+        self.path_map = {}  # {绝对路径: img_info}
+        self.approx_bytes = 0  # 原始数据与索引的近似内存占用
+        self.missing_count = 0  # 标记为文件缺失的图片数，由后台校验更新
+        self.like_counts = defaultdict(int)  # {分类: 已点赞图片数}，点赞时增量更新
+        self.validated_at = None  # 最近一次后台校验的时间
+        self.build(raw_data.get('img', {}) if img_data is None else img_data)
+
+    def build(self, img_data):
+        def walk_tree(node, current_rel_path, base_abs):
+            for key, value in node.items():
+                if isinstance(value, dict):
+                    if 'face_scores' in value:
+                        self.approx_bytes += RAW_NODE_BYTES + SCORE_BYTES * (
+                            len(value.get('face_scores') or ()) + len(value.get('face_landmark_scores_68') or ()))
+                        if not is_listed(value):
+                            continue
+                        self.approx_bytes += INDEX_ENTRY_BYTES
+
+                        abs_path = os.path.normpath(os.path.join(base_abs, current_rel_path, key))
+                        parent_relative_dir = current_rel_path.replace('\\', '/')
+                        dir_name = os.path.basename(base_abs) if parent_relative_dir == "" else parent_relative_dir
+                        img_info = {
+                            'filename': key,
+                            'category': dir_name,
+                            'path': abs_path,
+                            'face_scores': value.get('face_scores', []),
+                            'landmark_scores': value.get('face_landmark_scores_68', []),
+                            'like': value.get('like', False),
+                            'unscored': value.get('unscored', False),
+                            'missing': value.get('missing', False)
+                        }
+                        self.missing_count += bool(img_info['missing'])
+                        if img_info['like']:
+                            self.like_counts[dir_name] += 1
+                        self.category_map[dir_name].append(img_info)
+                        self.file_map[f"{dir_name}/{key}"] = abs_path
+                        self.path_map[abs_path] = img_info
+                    else:
+                        walk_tree(value, os.path.join(current_rel_path, key), base_abs)
+
+        for base in img_data:
+            base_abs = os.path.abspath(os.path.normpath(base))
+            walk_tree(img_data[base], "", base_abs)
+
+    def image_count(self) -> int:
+        return len(self.path_map)
+
+    def set_like(self, abs_path: str, liked: bool) -> bool:
+        # 点赞写入原始数据后同步更新索引中的状态
+        img_info = self.path_map.get(os.path.normpath(abs_path))
+        if img_info is None:
+            return False
+        self.update_like(img_info, liked)
+        return True
+
+    def update_like(self, img_info: dict, liked: bool):
+        # 调用方需持有 data_lock
+        if bool(img_info['like']) != bool(liked):
+            self.like_counts[img_info['category']] += 1 if liked else -1
+        img_info['like'] = liked
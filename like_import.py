@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from image_index import ImageIndex
+
+# 批量导入点赞：外部审阅工具给出的路径列表（每行一个路径，视为点赞）或 NDJSON
+# （{"path": 路径, "like": true/false} 或 {"path": 路径, "action": "like"/"unlike"}），
+# 空行和以 # 开头的行被忽略。同一路径以最后一行为准，整批在一次写入、一次保存中完成。
+# 输入逐行处理，内存只与数据集中的图片数有关，与输入行数无关。
+
+UNKNOWN_SAMPLE = 20  # 汇总中最多列出的未找到路径数
+
+
+def parse_like_line(line) -> Optional[Tuple[str, bool]]:
+    # 返回 (路径, 是否点赞)；空行返回 None，格式错误抛出 ValueError
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if not line.startswith('{'):
+        return line, True
+    entry = json.loads(line)
+    path = entry.get('path') if isinstance(entry, dict) else None
+    if not isinstance(path, str) or not path:
+        raise ValueError('missing path')
+    if 'like' in entry:
+        return path, bool(entry['like'])
+    action = entry.get('action', 'like')
+    if action not in ('like', 'unlike'):
+        raise ValueError(f"unknown action {action!r}")
+    return path, action == 'like'
+
+
+def new_summary() -> Dict:
+    return {'lines': 0, 'applied': 0, 'liked': 0, 'unliked': 0, 'unknown': 0, 'invalid': 0, 'unknown_paths': []}
+
+
+def iter_changes(lines: Iterable, summary: Dict) -> Iterator[Tuple[str, bool]]:
+    # 逐行解析并计数，格式错误的行只计数不中断导入
+    for line in lines:
+        try:
+            change = parse_like_line(line)
+        except ValueError:  # json.JSONDecodeError 与 UnicodeDecodeError 均为其子类
+            summary['lines'] += 1
+            summary['invalid'] += 1
+            continue
+        if change is not None:
+            summary['lines'] += 1
+            yield change
+
+
+def count_change(summary: Dict, path: str, liked, found: bool):
+    if not found:
+        summary['unknown'] += 1
+        if len(summary['unknown_paths']) < UNKNOWN_SAMPLE:
+            summary['unknown_paths'].append(path)
+        return
+    summary['applied'] += 1
+    summary['liked' if liked else 'unliked'] += 1
+
+
+def collect_changes(lines: Iterable, index: ImageIndex, summary: Dict) -> Dict[str, Dict[str, Tuple[str, bool]]]:
+    # 通过索引的 path_map 解析路径，只保留存在的图片，同一路径以最后一行为准。
+    # 按目录分组 {目录: {文件名: (绝对路径, 是否点赞)}}，路径拆分在锁外完成
+    wanted = defaultdict(dict)
+    for path, liked in iter_changes(lines, summary):
+        abs_path = os.path.normpath(path)
+        found = abs_path in index.path_map
+        count_change(summary, path, liked, found)
+        if found:
+            dir_path, filename = os.path.split(abs_path)
+            wanted[dir_path][filename] = (abs_path, liked)
+    return wanted
+
+
+class NodeResolver:
+    # 原始数据树中按绝对路径查找图片节点，缓存每个目录的节点，百万条路径只需逐级查找各目录一次
+    def __init__(self, img_data: Dict):
+        self.bases = [(os.path.abspath(os.path.normpath(base)), node) for base, node in img_data.items()]
+        self.dirs = {}  # {目录绝对路径: 目录节点或 None}
+
+    def directory(self, dir_path: str) -> Optional[Dict]:
+        if dir_path in self.dirs:
+            return self.dirs[dir_path]
+        node = None
+        for base_abs, base_node in self.bases:
+            if dir_path == base_abs:
+                node = base_node
+            elif dir_path.startswith(base_abs.rstrip(os.sep) + os.sep):
+                node = base_node
+                for part in os.path.relpath(dir_path, base_abs).split(os.sep):
+                    node = node.get(part) if isinstance(node, dict) else None
+            if isinstance(node, dict):
+                break
+            node = None
+        self.dirs[dir_path] = node
+        return node
+
+    def node(self, abs_path: str) -> Optional[Dict]:
+        parent = self.directory(os.path.dirname(abs_path))
+        node = parent.get(os.path.basename(abs_path)) if parent is not None else None
+        return node if isinstance(node, dict) and 'face_scores' in node else None
+
+
+def apply_changes(index: ImageIndex, wanted: Dict[str, Dict[str, Tuple[str, bool]]]) -> int:
+    # 调用方需持有 data_lock；每个目录只查找一次，返回写入的图片数
+    resolver = NodeResolver(index.raw_data.setdefault('img', {}))
+    applied = 0
+    for dir_path, files in wanted.items():
+        parent = resolver.directory(dir_path)
+        if parent is None:
+            continue
+        for filename, (abs_path, liked) in files.items():
+            node = parent.get(filename)
+            if not isinstance(node, dict) or 'face_scores' not in node:
+                continue
+            node['like'] = liked
+            img_info = index.path_map.get(abs_path)
+            if img_info is not None:
+                index.update_like(img_info, liked)
+            applied += 1
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply likes from a path list or NDJSON file to an input JSON file.')
+    parser.add_argument('--input_json', type=str, required=True, help='JSON file to update in place.')
+    parser.add_argument('--replace', type=str, nargs=2, action='append',
+                        help='Temporarily replace strings in input_json, e.g., "/abc" "/def"')
+    parser.add_argument('--file', type=str, default=None,
+                        help='Paths (one per line) or NDJSON {"path", "like"/"action"} lines (default: stdin).')
+    args = parser.parse_args()
+
+    # 与 WebApp 相同的替换方式：导入的路径使用替换后的形式，写回时还原
+    replace_rules = args.replace or []
+    with open(args.input_json, 'r', encoding='utf-8') as f:
+        data_str = json.dumps(json.load(f))
+    for old, new in replace_rules:
+        data_str = data_str.replace(old, new)
+    index = ImageIndex(json.loads(data_str))
+    del data_str
+
+    summary = new_summary()
+    source = open(args.file, 'rb') if args.file else sys.stdin.buffer
+    try:
+        wanted = collect_changes(source, index, summary)
+    finally:
+        if args.file:
+            source.close()
+    if apply_changes(index, wanted):
+        index.raw_data['date_updated'] = datetime.now().astimezone().isoformat()
+        data_str = json.dumps(index.raw_data)
+        for old, new in reversed(replace_rules):
+            data_str = data_str.replace(new, old)
+        tmp_path = f"{args.input_json}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(json.loads(data_str), ensure_ascii=False, indent=4))
+        os.replace(tmp_path, args.input_json)
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
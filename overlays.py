@@ -0,0 +1,167 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Set
+
+# 按用户的点赞覆盖层：多人共用一个实例时，已识别用户的点赞不写入共享JSON的 like 字段，
+# 而是写入 <overlay_dir>/<JSON编号>/<用户>.json（该用户点赞的图片路径集合），页面显示时按路径合并。
+# 文件中保存的是还原替换规则后的原始路径，与共享JSON一致，合并步骤可以直接按路径写回。
+
+USER_PATTERN = re.compile(r'^[A-Za-z0-9_.@-]{1,64}$')
+
+
+def valid_user(user: str) -> bool:
+    return bool(user) and USER_PATTERN.match(user) is not None and user not in ('.', '..')
+
+
+def overlay_dir_for(overlay_dir: str, json_path: str) -> str:
+    # 与 /d/<json_id> 相同，由JSON文件的真实路径得出
+    return os.path.join(overlay_dir, hashlib.sha1(os.path.realpath(json_path).encode('utf-8')).hexdigest()[:12])
+
+
+def read_overlay(path: str) -> List[str]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('liked', [])
+    except (OSError, ValueError, AttributeError):
+        return []
+
+
+def write_overlay(path: str, json_path: str, user: str, liked: Iterable[str]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'json_path': os.path.abspath(json_path), 'user': user, 'liked': sorted(liked)}, f,
+                  ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class LikeOverlays:
+    # 内存中为每个 (JSON文件, 用户) 保存替换规则之后的绝对路径集合，首次使用时从文件读取
+    def __init__(self, overlay_dir: str, replace_rules: List):
+        self.overlay_dir = overlay_dir
+        self.replace_rules = replace_rules
+        self.sets = {}  # {(JSON文件, 用户): 已点赞路径集合}
+        self.versions = defaultdict(int)  # {(JSON文件, 用户): 修改次数}
+        self.lock = threading.Lock()
+
+    def path(self, json_path: str, user: str) -> str:
+        return os.path.join(overlay_dir_for(self.overlay_dir, json_path), f"{user}.json")
+
+    def to_runtime(self, path: str) -> str:
+        for old, new in self.replace_rules:
+            path = path.replace(old, new)
+        return os.path.normpath(path)
+
+    def to_stored(self, path: str) -> str:
+        for old, new in reversed(self.replace_rules):
+            path = path.replace(new, old)
+        return path
+
+    def liked(self, json_path: str, user: str) -> Set[str]:
+        # 返回的集合只在 lock 内修改，读请求可以直接做成员判断
+        key = (json_path, user)
+        liked = self.sets.get(key)
+        if liked is None:
+            with self.lock:
+                liked = self.sets.get(key)
+                if liked is None:
+                    liked = self.sets[key] = {self.to_runtime(p) for p in read_overlay(self.path(json_path, user))}
+        return liked
+
+    def version(self, json_path: str, user: str) -> int:
+        return self.versions[(json_path, user)]
+
+    def apply(self, json_path: str, user: str, wanted: Dict[str, bool]) -> int:
+        # wanted 为 {绝对路径: 是否点赞}；只有集合变化时才重写文件，返回变化的图片数
+        liked = self.liked(json_path, user)
+        with self.lock:
+            changed = 0
+            for abs_path, value in wanted.items():
+                abs_path = os.path.normpath(abs_path)
+                if value and abs_path not in liked:
+                    liked.add(abs_path)
+                    changed += 1
+                elif not value and abs_path in liked:
+                    liked.discard(abs_path)
+                    changed += 1
+            if changed:
+                write_overlay(self.path(json_path, user), json_path, user, (self.to_stored(p) for p in liked))
+                self.versions[(json_path, user)] += 1
+        return changed
+
+
+def count_votes(overlay_dir: str, json_path: str, users: List[str] = None) -> Counter:
+    # {原始路径: 点赞的用户数}
+    directory = overlay_dir_for(overlay_dir, json_path)
+    votes = Counter()
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    except OSError:
+        return votes
+    for name in names:
+        if users and name[:-len('.json')] not in users:
+            continue
+        votes.update(set(read_overlay(os.path.join(directory, name))))
+    return votes
+
+
+def merge_votes(img_data: Dict, votes: Counter, min_votes: int, reset: bool = False) -> Dict[str, int]:
+    # 把达到票数的图片写回共享JSON的 like 字段；reset 时未达到票数的图片取消点赞
+    counts = {'liked': 0, 'unliked': 0}
+
+    def walk(node, prefix):
+        for key, value in node.items():
+            if not isinstance(value, dict):
+                continue
+            path = os.path.join(prefix, key)
+            if 'face_scores' not in value:
+                walk(value, path)
+                continue
+            liked = votes.get(os.path.normpath(path), 0) >= min_votes
+            if liked and not value.get('like'):
+                value['like'] = True
+                counts['liked'] += 1
+            elif reset and not liked and value.get('like'):
+                value['like'] = False
+                counts['unliked'] += 1
+
+    # 覆盖层中的路径与共享JSON一致（替换规则之前），按绝对路径比较
+    normalized = Counter()
+    for path, count in votes.items():
+        normalized[os.path.normpath(os.path.abspath(path))] += count
+    votes = normalized
+    for base, node in img_data.items():
+        walk(node, os.path.abspath(os.path.normpath(base)))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge per-user like overlays back into the shared JSON file.')
+    parser.add_argument('--input_json', type=str, nargs='+', required=True, help='JSON files to update in place.')
+    parser.add_argument('--overlay_dir', type=str, required=True, help='Directory given as --overlay_dir to the server.')
+    parser.add_argument('--min_votes', type=int, default=1, help='Users that must like an image (default: 1).')
+    parser.add_argument('--users', type=str, nargs='+', default=None, help='Only count these users.')
+    parser.add_argument('--reset', action='store_true',
+                        help='Also unlike images in the shared JSON that do not reach --min_votes.')
+    args = parser.parse_args()
+
+    for json_path in args.input_json:
+        votes = count_votes(args.overlay_dir, json_path, args.users)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            raw_data = json.load(f)
+        counts = merge_votes(raw_data.get('img', {}), votes, args.min_votes, args.reset)
+        if counts['liked'] or counts['unliked']:
+            tmp_path = f"{json_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(raw_data, ensure_ascii=False, indent=4))
+            os.replace(tmp_path, json_path)
+        print(f"{json_path}: {len(votes)} voted images, {counts}")
+
+
+if __name__ == '__main__':
+    main()
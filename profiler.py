@@ -0,0 +1,94 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import time
+from datetime import datetime
+from typing import Dict, List
+
+PROFILE_HEADER = 'X-Profile-Secret'
+
+
+def safe_filename_part(text: str, limit: int = 80) -> str:
+    text = re.sub(r'[^0-9A-Za-z一-鿿._=-]+', '_', text).strip('_')
+    return text[:limit] or 'root'
+
+
+class RequestProfiler:
+    # 携带密钥头的请求总是分析，其余请求按 sample_rate 抽样分析；只保存慢请求或强制分析的结果，
+    # 目录内只保留最近 keep 个文件
+    def __init__(self, profile_dir: str, threshold_ms: float = 500, secret: str = None, keep: int = 50,
+                 sample_rate: float = 0.01):
+        self.profile_dir = os.path.abspath(profile_dir)
+        self.threshold_ms = threshold_ms
+        self.secret = secret
+        self.keep = keep
+        self.sample_rate = sample_rate
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+    def has_secret(self, headers) -> bool:
+        # 密钥只从请求头读取，不出现在URL、访问日志和 Referer 中；按常量时间比较
+        supplied = headers.get(PROFILE_HEADER)
+        return bool(self.secret) and supplied is not None and hmac.compare_digest(
+            supplied.encode('utf-8'), self.secret.encode('utf-8'))
+
+    def is_sampled(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def start(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 其他线程的分析器仍在运行（Python 3.12+ 同时只允许一个）
+            return None
+        return profile, time.perf_counter()
+
+    def stop(self, state, route: str, query: str, forced: bool = False) -> str:
+        profile, start = state
+        profile.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if not forced and elapsed_ms < self.threshold_ms:
+            return None
+
+        parts = [datetime.now().strftime('%Y%m%d-%H%M%S-%f'), safe_filename_part(route)]
+        if query:
+            parts.append(safe_filename_part(query))
+        parts.append(f"{int(elapsed_ms)}ms")
+        path = os.path.join(self.profile_dir, '_'.join(parts) + '.prof')
+        profile.dump_stats(path)
+        self.rotate()
+        return path
+
+    def rotate(self):
+        profiles = self.list_profiles()
+        for item in profiles[self.keep:]:
+            try:
+                os.remove(os.path.join(self.profile_dir, item['name']))
+            except OSError:
+                pass
+
+    def list_profiles(self) -> List[Dict]:
+        # 按修改时间倒序
+        profiles = []
+        with os.scandir(self.profile_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.prof'):
+                    stat = entry.stat()
+                    profiles.append({
+                        'name': entry.name,
+                        'size': stat.st_size,
+                        'mtime': stat.st_mtime,
+                        'created': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+                    })
+        profiles.sort(key=lambda item: (item['mtime'], item['name']), reverse=True)
+        return profiles
+
+    def summary(self, name: str, limit: int = 40) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(os.path.join(self.profile_dir, name), stream=stream)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Callable, Dict, List
+
+from image_index import ImageIndex, is_listed
+
+# 分片存储：大JSON按顶层目录或分类拆成多个分片文件和一个小清单。
+# 清单可直接作为 --input_json 使用，启动时只读清单，打开分类时才加载对应分片，
+# 点赞只重写所属分片。分片本身是普通的JSON文件，替换规则同样生效。
+
+MANIFEST_FORMAT = 'img_display_shards'
+MANIFEST_BYTES = 256  # 清单中每个分类的近似内存开销
+
+
+def is_manifest(data) -> bool:
+    return isinstance(data, dict) and data.get('format') == MANIFEST_FORMAT
+
+
+def category_name(base: str, rel_dir: str) -> str:
+    # 与 ImageIndex 相同的分类命名规则
+    parent_relative_dir = rel_dir.replace('\\', '/')
+    return os.path.basename(os.path.abspath(os.path.normpath(base))) if parent_relative_dir == "" else parent_relative_dir
+
+
+def split_json(json_path: str, output_dir: str, by: str = 'top') -> str:
+    # by='top' 每个顶层目录一个分片，by='category' 每个分类（图片所在目录）一个分片
+    with open(json_path, 'r', encoding='utf-8') as f:
+        raw_data = json.load(f)
+
+    shard_trees = OrderedDict()  # {(base, 分片键): 子树}
+    categories = OrderedDict()  # {(base, 相对目录): 分类信息}
+
+    def walk_tree(node, dirs, base):
+        for key, value in node.items():
+            if not isinstance(value, dict):
+                continue
+            if 'face_scores' not in value:
+                walk_tree(value, dirs + [key], base)
+                continue
+            rel_dir = os.path.join(*dirs) if dirs else ''
+            shard_key = (base, rel_dir if by == 'category' else (dirs[0] if dirs else ''))
+            if shard_key not in shard_trees:
+                shard_trees[shard_key] = {}
+            target = shard_trees[shard_key]
+            for part in dirs:
+                target = target.setdefault(part, {})
+            target[key] = value
+            info = categories.get((base, rel_dir))
+            if info is None:
+                info = categories[(base, rel_dir)] = {
+                    'base': base, 'dir': rel_dir, 'shard': len(shard_trees) - 1, 'images': 0, 'thumb': None}
+            if is_listed(value):
+                info['images'] += 1
+                if info['thumb'] is None:
+                    info['thumb'] = key
+
+    for base, tree in raw_data.get('img', {}).items():
+        walk_tree(tree, [], base)
+
+    os.makedirs(os.path.join(output_dir, 'shards'), exist_ok=True)
+    shard_files = []
+    for number, ((base, _), tree) in enumerate(shard_trees.items()):
+        shard_file = f"shards/{number:05d}.json"
+        with open(os.path.join(output_dir, shard_file), 'w', encoding='utf-8') as f:
+            json.dump({'img': {base: tree}}, f, ensure_ascii=False, indent=4)
+        shard_files.append(shard_file)
+
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'version': 1,
+        'source': os.path.basename(json_path),
+        'meta': {key: value for key, value in raw_data.items() if key != 'img'},
+        'shards': shard_files,
+        'categories': [info for info in categories.values() if info['images']]
+    }
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    return manifest_path
+
+
+class ShardedIndex:
+    # 与 ImageIndex 接口一致的分片索引，category_map/file_map 按需加载分片。
+    # 分片的加入与逐出都在 lock（即 WebApp.data_lock）内进行，读请求无需加锁。
+    def __init__(self, manifest_path: str, manifest: Dict, read_json: Callable[[str], Dict],
+                 lock: threading.Lock, busy: Callable[[str], bool], max_bytes: int = 0):
+        self.raw_data = manifest
+        self.manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+        self.read_json = read_json
+        self.lock = lock
+        self.busy = busy  # 分片有待保存数据时不能逐出
+        self.max_bytes = max_bytes  # 已加载分片的内存上限，0 表示不限制
+        self.shards = OrderedDict()  # {分片路径: ImageIndex}，最近使用的在末尾
+        self.load_locks = {}
+        self.categories = OrderedDict()  # {分类: {'shards': [分片路径], 'images': n, 'thumb': 文件名, 'thumb_path': 绝对路径}}
+        for info in manifest.get('categories', []):
+            name = category_name(info['base'], info['dir'])
+            entry = self.categories.get(name)
+            if entry is None:
+                thumb = info.get('thumb')
+                entry = self.categories[name] = {
+                    'shards': [], 'images': 0, 'thumb': thumb,
+                    'thumb_path': os.path.normpath(os.path.join(
+                        os.path.abspath(os.path.normpath(info['base'])), info['dir'], thumb)) if thumb else None}
+            shard_path = self.shard_path(manifest['shards'][info['shard']])
+            if shard_path not in entry['shards']:
+                entry['shards'].append(shard_path)
+            entry['images'] += info['images']
+        self.bases = [info['base'] for info in manifest.get('categories', [])]
+        self.bases = [os.path.abspath(os.path.normpath(base)) for base in dict.fromkeys(self.bases)]
+        self.category_map = ShardedCategoryMap(self)
+        self.file_map = ShardedFileMap(self)
+
+    def shard_path(self, shard_file: str) -> str:
+        return os.path.normpath(os.path.join(self.manifest_dir, shard_file))
+
+    @property
+    def approx_bytes(self) -> int:
+        return MANIFEST_BYTES * len(self.categories) + sum(shard.approx_bytes for shard in list(self.shards.values()))
+
+    def image_count(self) -> int:
+        return sum(entry['images'] for entry in self.categories.values())
+
+    def load_shard(self, shard_path: str) -> ImageIndex:
+        shard = self.shards.get(shard_path)
+        if shard is not None:
+            # 不加锁的快速路径：另一线程可能在 get 之后逐出该分片，此时按未加载处理重新加载
+            try:
+                self.shards.move_to_end(shard_path)
+                return shard
+            except KeyError:
+                pass
+        load_lock = self.load_locks.setdefault(shard_path, threading.Lock())
+        with load_lock:
+            shard = self.shards.get(shard_path)
+            if shard is not None:
+                return shard
+            shard = ImageIndex(self.read_json(shard_path))
+            with self.lock:
+                shard = self.install(shard_path, shard)
+                self.evict(keep=shard_path)
+        return shard
+
+    def install(self, shard_path: str, shard: ImageIndex) -> ImageIndex:
+        # 调用方需持有 lock；已有同一分片时以已加载的为准
+        shard = self.shards.setdefault(shard_path, shard)
+        self.shards.move_to_end(shard_path)
+        return shard
+
+    def evict(self, keep: str):
+        # 调用方需持有 lock；按最近最少使用顺序逐出没有待保存数据的分片
+        if self.max_bytes <= 0:
+            return
+        total = self.approx_bytes
+        for shard_path in list(self.shards):
+            if total <= self.max_bytes:
+                break
+            if shard_path == keep or self.busy(shard_path):
+                continue
+            total -= self.shards.pop(shard_path).approx_bytes
+
+    def shards_for_category(self, category: str) -> List[ImageIndex]:
+        return [self.load_shard(path) for path in self.categories[category]['shards']]
+
+    def shards_for_path(self, abs_path: str) -> List[str]:
+        # 根据图片路径推算所属分类，返回可能包含该图片的分片路径
+        abs_path = os.path.normpath(abs_path)
+        paths = []
+        for base_abs in self.bases:
+            try:
+                if os.path.commonpath([base_abs, abs_path]) != base_abs:
+                    continue
+            except ValueError:
+                continue
+            rel_dir = os.path.dirname(os.path.relpath(abs_path, base_abs))
+            entry = self.categories.get(category_name(base_abs, rel_dir))
+            if entry is None:
+                continue
+            paths.extend(path for path in entry['shards'] if path not in paths)
+        return paths
+
+
+class ShardedCategoryMap(Mapping):
+    # 分类列表来自清单，访问某个分类时才加载其分片
+    def __init__(self, index: ShardedIndex):
+        self.index = index
+
+    def __getitem__(self, category: str) -> List[Dict]:
+        if category not in self.index.categories:
+            raise KeyError(category)
+        images = []
+        for shard in self.index.shards_for_category(category):
+            images.extend(shard.category_map.get(category, []))
+        return images
+
+    def __contains__(self, category) -> bool:
+        return category in self.index.categories
+
+    def __iter__(self):
+        return iter(self.index.categories)
+
+    def __len__(self) -> int:
+        return len(self.index.categories)
+
+    def first_image(self, category: str) -> Dict:
+        # 分类页缩略图直接取清单中记录的文件名，不加载分片
+        entry = self.index.categories.get(category)
+        if entry is None or not entry['thumb']:
+            return {}
+        return {'filename': entry['thumb'], 'category': category, 'path': entry['thumb_path']}
+
+
+class ShardedFileMap(Mapping):
+    # {"分类/文件名": 绝对路径}，按分类加载分片后查找
+    def __init__(self, index: ShardedIndex):
+        self.index = index
+
+    def __getitem__(self, unique_id: str) -> str:
+        category = unique_id.rsplit('/', 1)[0] if '/' in unique_id else ''
+        if category not in self.index.categories:
+            raise KeyError(unique_id)
+        path = None
+        for shard in self.index.shards_for_category(category):
+            path = shard.file_map.get(unique_id, path)
+        if path is None:
+            raise KeyError(unique_id)
+        return path
+
+    def __iter__(self):
+        for category in list(self.index.categories):
+            for shard in self.index.shards_for_category(category):
+                for unique_id, path in shard.file_map.items():
+                    if unique_id.rsplit('/', 1)[0] == category:
+                        yield unique_id
+
+    def __len__(self) -> int:
+        return self.index.image_count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split an input JSON file into shards plus a manifest.')
+    parser.add_argument('--input_json', type=str, required=True, help='JSON file to split.')
+    parser.add_argument('--output_dir', type=str, required=True, help='Directory for manifest.json and shards/.')
+    parser.add_argument('--by', type=str, choices=('top', 'category'), default='top',
+                        help='One shard per top-level directory of each base, or one per category.')
+    args = parser.parse_args()
+    manifest_path = split_json(args.input_json, args.output_dir, args.by)
+    print(f"已生成 {manifest_path}，使用 --input_json {manifest_path} 启动")
+
+
+if __name__ == '__main__':
+    main()
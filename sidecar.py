@@ -0,0 +1,46 @@
+import hashlib
+import os
+import pickle
+import threading
+from typing import Any, List
+
+# 被逐出缓存的JSON文件以 pickle 旁路文件保存，重新加载时比解析JSON快得多。
+# 旁路文件与JSON文件的 mtime/大小及替换规则绑定，JSON被改写后自动失效。
+# 目录中的文件会被反序列化，只能指向可信目录。
+
+
+def sidecar_path(sidecar_dir: str, json_path: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(json_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(sidecar_dir, f"{digest}.pickle")
+
+
+def sidecar_header(json_path: str, replace_rules: List) -> dict:
+    stat = os.stat(json_path)
+    return {
+        'json_path': os.path.abspath(json_path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'replace': [list(rule) for rule in replace_rules]
+    }
+
+
+def write_sidecar(sidecar_dir: str, json_path: str, replace_rules: List, data: Any, header: dict = None):
+    # header 可由调用方在确认 data 与JSON一致时预先取得，之后JSON再被改写，写入的旁路文件也会失效
+    os.makedirs(sidecar_dir, exist_ok=True)
+    path = sidecar_path(sidecar_dir, json_path)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"  # 同一文件可能有多个线程同时写
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(header or sidecar_header(json_path, replace_rules), f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_sidecar(sidecar_dir: str, json_path: str, replace_rules: List):
+    path = sidecar_path(sidecar_dir, json_path)
+    try:
+        with open(path, 'rb') as f:
+            if pickle.load(f) != sidecar_header(json_path, replace_rules):
+                return None
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
@@ -0,0 +1,86 @@
+import hashlib
+import math
+import os
+from contextlib import nullcontext
+from typing import Dict, List, Tuple
+
+from variants import DiskCache
+
+# 分类页拼图：把一页分类的缩略图拼成一张 JPEG，分类页只需请求一次。
+# 拼图以 (瓦片尺寸, 每张缩略图的路径/大小/mtime) 为键，分类缩略图变化时自动生成新拼图，
+# 旧拼图按最近最少使用顺序清理。拼图在后台生成，生成完成前分类页仍逐张请求缩略图。
+# Pillow 为可选依赖，未安装时不启用。
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def compose_sprite(sources: List[str], target_path: str, tile: int, columns: int) -> int:
+    # sources 中为 None 或无法解码的位置留空
+    from PIL import Image, ImageOps
+    rows = max(math.ceil(len(sources) / columns), 1)
+    sheet = Image.new('RGB', (tile * columns, tile * rows), (238, 238, 238))
+    for position, source_path in enumerate(sources):
+        if source_path is None:
+            continue
+        try:
+            with Image.open(source_path) as image:
+                image.draft('RGB', (tile, tile))  # JPEG 按缩小比例解码，避免解码整张大图
+                image = ImageOps.exif_transpose(image).convert('RGB')
+                image = ImageOps.fit(image, (tile, tile))
+        except Exception:
+            continue
+        sheet.paste(image, ((position % columns) * tile, (position // columns) * tile))
+    tmp_path = f"{target_path}.tmp"
+    sheet.save(tmp_path, format='JPEG', quality=80, optimize=True, progressive=True)
+    os.replace(tmp_path, target_path)
+    return os.path.getsize(target_path)
+
+
+class SpriteCache(DiskCache):
+    def __init__(self, cache_dir: str, max_bytes: int, workers: int, tile: int = 250, columns: int = 10,
+                 build_seconds=None):
+        super().__init__(cache_dir, max_bytes, workers, 'sprite')
+        self.tile = tile
+        self.columns = columns
+        self.build_seconds = build_seconds
+
+    def sprite_name(self, sources: List[str]) -> Tuple[str, List[bool]]:
+        # 文件不可访问的位置记为空，文件恢复或修改后键随之变化
+        key = [f"{self.tile}x{self.columns}"]
+        present = []
+        for source_path in sources:
+            try:
+                stat = os.stat(source_path) if source_path else None
+            except OSError:
+                stat = None
+            present.append(stat is not None)
+            key.append(f"{source_path}\0{stat.st_size}\0{stat.st_mtime_ns}" if stat else '')
+        return f"{hashlib.sha1(chr(1).join(key).encode('utf-8')).hexdigest()[:24]}.jpg", present
+
+    def lookup(self, sources: List[str]) -> Dict:
+        # 返回 {'name': 拼图文件名, 'tiles': [每个位置的 CSS 背景参数或 None]}；拼图未就绪时安排生成并返回 None
+        if not sources:
+            return None
+        name, present = self.sprite_name(sources)
+        if not self.get_or_schedule(name, self.generate, [path if ok else None for path, ok in zip(sources, present)]):
+            return None
+        rows = max(math.ceil(len(sources) / self.columns), 1)
+        # 百分比定位：卡片尺寸变化时拼图等比缩放
+        size = f"{self.columns * 100}% {rows * 100}%"
+        tiles = []
+        for position, ok in enumerate(present):
+            column, row = position % self.columns, position // self.columns
+            x = column * 100 / (self.columns - 1) if self.columns > 1 else 0
+            y = row * 100 / (rows - 1) if rows > 1 else 0
+            tiles.append({'size': size, 'position': f"{x:g}% {y:g}%"} if ok else None)
+        return {'name': name, 'tiles': tiles}
+
+    def generate(self, target_path: str, sources: List[str]) -> int:
+        with self.build_seconds.time() if self.build_seconds is not None else nullcontext():
+            return compose_sprite(sources, target_path, self.tile, self.columns)
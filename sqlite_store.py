@@ -0,0 +1,387 @@
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from image_index import is_listed
+
+# 可选的 SQLite 存储后端：输入JSON只导入一次，之后分页走索引查询，点赞只更新一行。
+# 数据库中保存的是应用替换规则之后的数据，导出时再还原为原始JSON格式。
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    json_path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    replace_rules TEXT NOT NULL,
+    meta TEXT NOT NULL,
+    date_updated TEXT
+);
+CREATE TABLE IF NOT EXISTS categories (
+    file_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    image_count INTEGER NOT NULL,
+    PRIMARY KEY (file_id, name)
+);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    base TEXT NOT NULL,
+    dirs TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    category TEXT NOT NULL,
+    category_seq INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    scored INTEGER NOT NULL,
+    liked INTEGER,
+    node TEXT NOT NULL,
+    unexported INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS images_category ON images (file_id, scored, category, id);
+CREATE INDEX IF NOT EXISTS images_liked ON images (file_id, scored, liked, category_seq, id);
+CREATE INDEX IF NOT EXISTS images_path ON images (file_id, path);
+CREATE INDEX IF NOT EXISTS images_filename ON images (file_id, category, filename);
+"""
+
+IMAGE_COLUMNS = 'id, category, filename, path, liked, node'
+# 随机顺序的排序键：对 id 做两轮乘法散列并与种子异或（SQLite 没有 ^，用 (a | b) - (a & b)），
+# 同一种子得到固定的顺序，分页只取当前页，不在内存中打乱全部 id
+SHUFFLE_KEY = ('((((id * 2654435761) % 4294967296) | :seed) - (((id * 2654435761) % 4294967296) & :seed)) '
+               '* 1597334677 % 4294967296')
+# 连接池上限：超过上限的并发请求等待空闲连接
+POOL_SIZE = 8
+
+
+def reverse_rules(data_str: str, replace_rules: List) -> str:
+    for old, new in reversed(replace_rules):
+        data_str = data_str.replace(new, old)
+    return data_str
+
+
+class SqliteStore:
+    def __init__(self, db_path: str, pool_size: int = POOL_SIZE):
+        self.db_path = db_path
+        # werkzeug 每个请求一个新线程，按线程保存连接会让每个请求都新建连接并重新执行 PRAGMA；
+        # 改为有上限的连接池，空闲连接在线程间复用（后进先出），PRAGMA 只在新建连接时执行一次
+        self.pool = queue.LifoQueue()
+        self.pool_slots = threading.BoundedSemaphore(max(pool_size, 1))
+        self.import_lock = threading.Lock()
+        with self.connection() as conn, conn:
+            conn.executescript(SCHEMA)
+            # 旧版本创建的数据库没有 unexported 列
+            if 'unexported' not in {row[1] for row in conn.execute('PRAGMA table_info(images)')}:
+                conn.execute('ALTER TABLE images ADD COLUMN unexported INTEGER NOT NULL DEFAULT 0')
+
+    def connect(self) -> sqlite3.Connection:
+        # 连接只在持有池中名额时使用，同一时刻只属于一个线程
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        # WAL 模式下读不阻塞写，点赞提交时分页查询照常进行
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        # 从连接池借出一个连接，用完归还；同一线程内不要嵌套借用，避免池满时自己等自己
+        with self.pool_slots:
+            try:
+                conn = self.pool.get_nowait()
+            except queue.Empty:
+                conn = self.connect()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self.pool.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    @staticmethod
+    def file_header(json_path: str, replace_rules: List) -> Tuple[int, int, str]:
+        stat = os.stat(json_path)
+        return stat.st_mtime_ns, stat.st_size, json.dumps([list(rule) for rule in replace_rules])
+
+    def import_json(self, json_path: str, read_json: Callable[[str], Dict], replace_rules: List) -> int:
+        # JSON文件与替换规则未变化时直接复用已导入的数据，不再解析JSON
+        json_key = os.path.abspath(json_path)
+        header = self.file_header(json_path, replace_rules)
+        with self.connection() as conn:
+            row = conn.execute('SELECT id, mtime_ns, size, replace_rules FROM files WHERE json_path = ?',
+                               (json_key,)).fetchone()
+        if row is not None and tuple(row[1:]) == header:
+            return row[0]
+
+        # 解析JSON时不占用连接
+        raw_data = read_json(json_path)
+        with self.import_lock, self.connection() as conn, conn:
+            unexported = {}
+            if row is not None:
+                # 尚未导出的点赞在重新导入后保留，并继续标记为未导出
+                unexported = dict(conn.execute('SELECT path, liked FROM images WHERE file_id = ? AND unexported = 1',
+                                               (row[0],)))
+                for table in ('images', 'categories'):
+                    conn.execute(f'DELETE FROM {table} WHERE file_id = ?', (row[0],))
+                conn.execute('DELETE FROM files WHERE id = ?', (row[0],))
+            meta = {key: (None if key == 'img' else value) for key, value in raw_data.items()}
+            cursor = conn.execute(
+                'INSERT INTO files (json_path, mtime_ns, size, replace_rules, meta, date_updated) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (json_key, *header, json.dumps(meta, ensure_ascii=False), raw_data.get('date_updated')))
+            file_id = cursor.lastrowid
+            counts = {}
+            rows = self.iter_rows(file_id, raw_data.get('img', {}), counts)
+            conn.executemany(
+                'INSERT INTO images (file_id, base, dirs, filename, category, category_seq, path, scored, liked, node, '
+                'unexported) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                ((*r[:8], unexported[r[6]], r[9], 1) if r[6] in unexported else (*r, 0) for r in rows))
+            conn.executemany('INSERT INTO categories (file_id, name, image_count) VALUES (?, ?, ?)',
+                             ((file_id, name, count) for name, count in counts.items()))
+        return file_id
+
+    @staticmethod
+    def iter_rows(file_id: int, img_data: Dict, counts: Dict):
+        # 与 ImageIndex 相同的遍历规则；没有分数的图片也导入，导出时原样写回
+        category_seqs = {}
+
+        def walk_tree(node, dirs, base, base_abs):
+            for key, value in node.items():
+                if not isinstance(value, dict):
+                    continue
+                if 'face_scores' not in value:
+                    yield from walk_tree(value, dirs + [key], base, base_abs)
+                    continue
+                rel_dir = os.path.join(*dirs) if dirs else ''
+                parent_relative_dir = rel_dir.replace('\\', '/')
+                dir_name = os.path.basename(base_abs) if parent_relative_dir == "" else parent_relative_dir
+                scored = is_listed(value)
+                if scored:
+                    counts[dir_name] = counts.get(dir_name, 0) + 1
+                    category_seqs.setdefault(dir_name, len(category_seqs))
+                node_data = dict(value)
+                liked = node_data.pop('like', None)
+                yield (file_id, base, json.dumps(dirs, ensure_ascii=False), key, dir_name,
+                       category_seqs.get(dir_name, -1),
+                       os.path.normpath(os.path.join(base_abs, rel_dir, key)), int(scored),
+                       None if liked is None else int(bool(liked)), json.dumps(node_data, ensure_ascii=False))
+
+        for base in img_data:
+            base_abs = os.path.abspath(os.path.normpath(base))
+            yield from walk_tree(img_data[base], [], base, base_abs)
+
+    @staticmethod
+    def image_info(row) -> Dict:
+        _, category, filename, path, liked, node = row
+        node = json.loads(node)
+        return {
+            'filename': filename,
+            'category': category,
+            'path': path,
+            'face_scores': node.get('face_scores', []),
+            'landmark_scores': node.get('face_landmark_scores_68', []),
+            'like': bool(liked),
+            'unscored': node.get('unscored', False),
+            'missing': node.get('missing', False)
+        }
+
+    def query(self, sql: str, params=()) -> List:
+        # 一次性读取全部结果后立即归还连接
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def categories(self, file_id: int) -> List[str]:
+        rows = self.query('SELECT name FROM categories WHERE file_id = ? ORDER BY name', (file_id,))
+        return [row[0] for row in rows]
+
+    def has_category(self, file_id: int, category: str) -> bool:
+        return bool(self.query('SELECT 1 FROM categories WHERE file_id = ? AND name = ?', (file_id, category)))
+
+    def image_count(self, file_id: int) -> int:
+        rows = self.query('SELECT SUM(image_count) FROM categories WHERE file_id = ?', (file_id,))
+        return rows[0][0] or 0
+
+    def first_image(self, file_id: int, category: str) -> Dict:
+        rows = self.query(
+            f'SELECT {IMAGE_COLUMNS} FROM images WHERE file_id = ? AND scored = 1 AND category = ? '
+            'ORDER BY id LIMIT 1', (file_id, category))
+        return self.image_info(rows[0]) if rows else {}
+
+    def find_image(self, file_id: int, category: str, filename: str) -> str:
+        rows = self.query(
+            'SELECT path FROM images WHERE file_id = ? AND category = ? AND filename = ? AND scored = 1 '
+            'ORDER BY id DESC LIMIT 1', (file_id, category, filename))
+        return rows[0][0] if rows else None
+
+    def category_counts(self, file_id: int) -> Dict[str, int]:
+        return dict(self.query('SELECT name, image_count FROM categories WHERE file_id = ?', (file_id,)))
+
+    def category_like_counts(self, file_id: int) -> Dict[str, int]:
+        # 走 images_liked 索引，只读取已点赞的行
+        return dict(self.query(
+            'SELECT category, COUNT(*) FROM images WHERE file_id = ? AND scored = 1 AND liked = 1 GROUP BY category',
+            (file_id,)))
+
+    def category_images(self, file_id: int, category: str, offset: int, limit: int) -> List[Dict]:
+        rows = self.query(
+            f'SELECT {IMAGE_COLUMNS} FROM images WHERE file_id = ? AND scored = 1 AND category = ? '
+            'ORDER BY id LIMIT ? OFFSET ?', (file_id, category, limit, offset))
+        return [self.image_info(row) for row in rows]
+
+    def page_images(self, file_id: int, category: str, page: int, per_page: int,
+                    seed: str = None) -> Tuple[List[Dict], int]:
+        # 返回 (当前页图片, 总数)，顺序与内存索引分页一致；带种子的随机顺序由 SQLite 排序，与内存索引的打乱结果不同
+        with self.connection() as conn:
+            return self.query_page(conn, file_id, category, page, per_page, seed)
+
+    def query_page(self, conn: sqlite3.Connection, file_id: int, category: str, page: int, per_page: int,
+                   seed: str) -> Tuple[List[Dict], int]:
+        offset = (max(page, 1) - 1) * per_page
+        if category in ('_favorites', '_unfavorites'):
+            liked = 'liked = 1' if category == '_favorites' else 'liked IS NOT 1'
+            where = f'file_id = :file_id AND scored = 1 AND {liked}'
+            params = {'file_id': file_id, 'seed': self.shuffle_seed(seed), 'limit': per_page, 'offset': offset}
+            total = conn.execute(f'SELECT COUNT(*) FROM images WHERE {where}', params).fetchone()[0]
+            if per_page <= 0:
+                return [], total
+            order = SHUFFLE_KEY + ', id' if seed else 'category_seq, id'
+            rows = conn.execute(f'SELECT {IMAGE_COLUMNS} FROM images WHERE {where} ORDER BY {order} '
+                                'LIMIT :limit OFFSET :offset', params)
+            return [self.image_info(row) for row in rows], total
+
+        if category:
+            total = conn.execute('SELECT image_count FROM categories WHERE file_id = ? AND name = ?',
+                                 (file_id, category)).fetchone()
+            total = total[0] if total else 0
+            where, params = 'file_id = ? AND scored = 1 AND category = ?', (file_id, category)
+        else:
+            total = conn.execute('SELECT SUM(image_count) FROM categories WHERE file_id = ?',
+                                 (file_id,)).fetchone()[0] or 0
+            where, params = 'file_id = ? AND scored = 1', (file_id,)
+        if per_page <= 0:
+            return [], total
+        rows = conn.execute(f'SELECT {IMAGE_COLUMNS} FROM images WHERE {where} ORDER BY category, id '
+                            'LIMIT ? OFFSET ?', (*params, per_page, offset))
+        return [self.image_info(row) for row in rows], total
+
+    @staticmethod
+    def shuffle_seed(seed: str) -> int:
+        # 数字种子直接使用，其他字符串取 CRC32；种子与散列值都在 32 位内，排序键的乘法不会超出 64 位整数
+        if not seed:
+            return 0
+        try:
+            return int(seed) % 4294967296
+        except ValueError:
+            return zlib.crc32(seed.encode('utf-8'))
+
+    def iter_images(self, file_id: int, category: str = None) -> Iterator[Dict]:
+        # 逐行读取，导出大量图片时不在内存中构建列表；顺序与内存索引的视图一致
+        if category in ('_favorites', '_unfavorites'):
+            liked = 'liked = 1' if category == '_favorites' else 'liked IS NOT 1'
+            where, params, order = f'file_id = ? AND scored = 1 AND {liked}', (file_id,), 'category_seq, id'
+        elif category:
+            where, params, order = 'file_id = ? AND scored = 1 AND category = ?', (file_id, category), 'id'
+        else:
+            where, params, order = 'file_id = ? AND scored = 1', (file_id,), 'category, id'
+        with self.connection() as conn:
+            for row in conn.execute(f'SELECT {IMAGE_COLUMNS} FROM images WHERE {where} ORDER BY {order}', params):
+                yield self.image_info(row)
+
+    def set_like(self, file_id: int, paths: List[str], liked: bool, date_updated: str) -> Tuple[List, List]:
+        found_paths = []
+        not_found_paths = []
+        with self.connection() as conn, conn:
+            for req_path in paths:
+                cursor = conn.execute('UPDATE images SET liked = ?, unexported = 1 WHERE file_id = ? AND path = ?',
+                                      (int(liked), file_id, os.path.normpath(req_path)))
+                (found_paths if cursor.rowcount else not_found_paths).append(req_path)
+            if found_paths:
+                conn.execute('UPDATE files SET date_updated = ? WHERE id = ?', (date_updated, file_id))
+        return found_paths, not_found_paths
+
+    def import_likes(self, file_id: int, changes: Iterable[Tuple[str, bool]], date_updated: str,
+                     report: Callable[[str, bool, bool], None]) -> int:
+        # 批量导入在一个事务中逐条更新，不在内存中收集路径；report(路径, 是否点赞, 是否找到) 用于计数
+        applied = 0
+        with self.connection() as conn, conn:
+            for req_path, liked in changes:
+                cursor = conn.execute('UPDATE images SET liked = ?, unexported = 1 WHERE file_id = ? AND path = ?',
+                                      (int(liked), file_id, os.path.normpath(req_path)))
+                report(req_path, liked, bool(cursor.rowcount))
+                applied += bool(cursor.rowcount)
+            if applied:
+                conn.execute('UPDATE files SET date_updated = ? WHERE id = ?', (date_updated, file_id))
+        return applied
+
+    def export_data(self, json_path: str) -> Dict:
+        # 按导入顺序重建原始的目录树结构
+        rows = self.query('SELECT id, meta, date_updated FROM files WHERE json_path = ?',
+                          (os.path.abspath(json_path),))
+        if not rows:
+            raise KeyError(f"{json_path} has not been imported into {self.db_path}")
+        file_id, meta, date_updated = rows[0]
+        img_data = {}
+        with self.connection() as conn:
+            for base, dirs, filename, liked, node in conn.execute(
+                    'SELECT base, dirs, filename, liked, node FROM images WHERE file_id = ? ORDER BY id', (file_id,)):
+                parent = img_data.setdefault(base, {})
+                for part in json.loads(dirs):
+                    parent = parent.setdefault(part, {})
+                node = json.loads(node)
+                if liked is not None:
+                    node['like'] = bool(liked)
+                parent[filename] = node
+        data = json.loads(meta)
+        data['img'] = img_data
+        if date_updated is not None:
+            data['date_updated'] = date_updated
+        return data
+
+    def export_json(self, json_path: str, output: str, replace_rules: List):
+        data_str = reverse_rules(json.dumps(self.export_data(json_path)), replace_rules)
+        data_str = json.dumps(json.loads(data_str), ensure_ascii=False, indent=4)
+        tmp_path = f"{output}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data_str)
+        os.replace(tmp_path, output)
+        # 导出覆盖原文件时同步记录的文件状态，避免下次启动重新导入；点赞已写回原文件，不再标记为未导出
+        if os.path.abspath(output) == os.path.abspath(json_path):
+            with self.connection() as conn, conn:
+                conn.execute('UPDATE files SET mtime_ns = ?, size = ?, replace_rules = ? WHERE json_path = ?',
+                             (*self.file_header(json_path, replace_rules), os.path.abspath(json_path)))
+                conn.execute('UPDATE images SET unexported = 0 WHERE unexported = 1 AND file_id = '
+                             '(SELECT id FROM files WHERE json_path = ?)', (os.path.abspath(json_path),))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export liked state from the SQLite store back to JSON.')
+    parser.add_argument('--db', type=str, required=True, help='SQLite database file.')
+    parser.add_argument('--input_json', type=str, nargs='+', required=True, help='Imported JSON files to export.')
+    parser.add_argument('--output_dir', type=str, default=None,
+                        help='Write exported files here (default: overwrite the input JSON files).')
+    parser.add_argument('--replace', type=str, nargs=2, action='append',
+                        help='Replace rules used when the files were imported, e.g., "/abc" "/def"')
+    args = parser.parse_args()
+
+    store = SqliteStore(args.db)
+    for json_path in args.input_json:
+        output = json_path
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            output = os.path.join(args.output_dir, os.path.basename(json_path))
+        store.export_json(json_path, output, args.replace or [])
+        print(f"已导出 {json_path} -> {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,7 @@
 // static/js/main.js
+// 当前数据集的地址前缀："/" 或 "/d/<json_id>/"
+const BASE_URL = document.body.dataset.baseUrl || '/';
+
 // 收藏功能相关
 document.addEventListener('DOMContentLoaded', () => {
     const heartIcons = document.querySelectorAll('.heart-icon');
@@ -20,15 +23,116 @@ document.addEventListener('DOMContentLoaded', () => {
             wrapper.querySelector('.heart-icon').style.visibility = 'visible';
         };
 
-        if (img.complete) {
-            handleLoad();
-        } else {
-            img.addEventListener('load', handleLoad);
-            img.addEventListener('error', handleLoad);
+        // 服务器图片请求过多时返回 503，稍后重试几次再显示为加载失败；
+        // <img> 的错误事件不带状态码，先用 HEAD 请求确认，404 等永久错误不再重试
+        const handleError = () => {
+            const retries = Number(img.dataset.retries || 0);
+            const src = img.src;
+            if (retries >= 3 || !src) {
+                handleLoad();
+                return;
+            }
+            fetch(src, { method: 'HEAD' })
+                .then(response => {
+                    if (response.status !== 503) {
+                        handleLoad();
+                        return;
+                    }
+                    img.dataset.retries = retries + 1;
+                    const retryAfter = Math.max(Number(response.headers.get('Retry-After')) || 0, retries + 1);
+                    setTimeout(() => { img.src = src; }, 1000 * retryAfter + Math.random() * 500);
+                })
+                .catch(handleLoad);
+        };
+
+        img.addEventListener('load', handleLoad);
+        img.addEventListener('error', handleError);
+        // 等待 /bundle 的图片还没有 src
+        if (img.complete && img.getAttribute('src')) {
+            img.naturalWidth > 0 ? handleLoad() : handleError();
         }
     });
+
+    if (document.body.dataset.bundleUrl) {
+        loadBundle(Array.from(document.querySelectorAll('.image-item[data-src]')));
+    }
 });
 
+// 从流中按需读取指定字节数，跨块拼接
+class FrameReader {
+    constructor(reader) {
+        this.reader = reader;
+        this.chunks = [];
+        this.length = 0;
+    }
+
+    async take(size) {
+        while (this.length < size) {
+            const { done, value } = await this.reader.read();
+            if (done) return null;
+            this.chunks.push(value);
+            this.length += value.length;
+        }
+        const result = new Uint8Array(size);
+        let offset = 0;
+        while (offset < size) {
+            const chunk = this.chunks[0];
+            const needed = size - offset;
+            if (chunk.length <= needed) {
+                result.set(chunk, offset);
+                offset += chunk.length;
+                this.chunks.shift();
+            } else {
+                result.set(chunk.subarray(0, needed), offset);
+                this.chunks[0] = chunk.subarray(needed);
+                offset += needed;
+            }
+        }
+        this.length -= size;
+        return result;
+    }
+}
+
+// 整页图片打包：一次 GET 请求取回当前页的所有图片，每收到一帧就显示一张（帧格式见 bundle.py）。
+// 打包按数据集和页码缓存并用 ETag 重新验证；帧按"分类/文件名"对应页面中的图片，
+// 请求失败或图片不在打包中时退回逐张请求
+const loadBundle = async (images) => {
+    if (images.length === 0) return;
+    const fallback = (img) => {
+        if (!img.getAttribute('src')) img.src = img.dataset.src;
+    };
+    const byName = new Map(images.map(img => [`${img.dataset.category}/${img.dataset.filename}`, img]));
+    try {
+        const response = await fetch(document.body.dataset.bundleUrl, {
+            headers: { 'Accept': 'image/avif,image/webp,*/*' }
+        });
+        if (!response.ok || !response.body) throw new Error(`HTTP error! status: ${response.status}`);
+        const reader = new FrameReader(response.body.getReader());
+        const decoder = new TextDecoder();
+        for (;;) {
+            const prefix = await reader.take(4);
+            if (prefix === null) break;
+            const headerBytes = await reader.take(new DataView(prefix.buffer).getUint32(0));
+            if (headerBytes === null) break;
+            const header = JSON.parse(decoder.decode(headerBytes));
+            const body = await reader.take(header.size);
+            if (body === null) break;
+            const img = byName.get(header.name);
+            if (!img) continue;
+            if (header.status === 200) {
+                const url = URL.createObjectURL(new Blob([body], { type: header.type }));
+                img.addEventListener('load', () => URL.revokeObjectURL(url), { once: true });
+                img.src = url;
+            } else {
+                fallback(img);
+            }
+        }
+    } catch (error) {
+        console.error('Bundle error:', error);
+    }
+    images.forEach(fallback);
+};
+
 // 图片信息展示
 const showImageInfo = (category, path, faceScores, landmarkScores) => {
     const formatScore = (arr) => {
@@ -43,7 +147,7 @@ const showImageInfo = (category, path, faceScores, landmarkScores) => {
 
     // 更新分类链接
     const categoryLink = document.getElementById('infoCategoryLink');
-    categoryLink.href = `/category/${category}`;
+    categoryLink.href = `${BASE_URL}category/${category}`;
     categoryLink.textContent = category;
 
     document.getElementById('infoModal').style.display = 'flex';
@@ -59,42 +163,117 @@ window.onclick = (event) => {
     if (event.target === modal) closeModal();
 };
 
-// 收藏操作
-const toggleLike = (event, path) => {
+// 收藏操作：点击立即更新界面，修改在短暂停顿后合并为一次请求（服务器只保存一次），失败时回滚
+const LIKE_DEBOUNCE_MS = 400;   // 最后一次点击后等待的时间
+const LIKE_MAX_DELAY_MS = 2000; // 连续点击时最长等待时间
+
+const likeQueue = {
+    pending: new Map(),   // {路径: 期望状态}，尚未发送
+    inFlight: null,       // 正在发送的 Map，同一时间只有一个请求
+    confirmed: new Map(), // {路径: 服务器确认的状态}
+    timer: null,
+    firstQueuedAt: 0
+};
+
+const heartsFor = (path) =>
+    Array.from(document.querySelectorAll('.heart-icon')).filter(heart => heart.dataset.path === path);
+
+const setHeartState = (path, liked) => {
+    heartsFor(path).forEach(heart => {
+        heart.classList.toggle('liked', liked);
+        heart.classList.toggle('unliked', !liked);
+        heart.dataset.liked = liked ? 'true' : 'false';
+    });
+};
+
+// 界面当前显示的状态 = 未发送的修改 > 发送中的修改 > 服务器确认的状态
+const displayedLike = (path, heart) => {
+    if (likeQueue.pending.has(path)) return likeQueue.pending.get(path);
+    if (likeQueue.inFlight && likeQueue.inFlight.has(path)) return likeQueue.inFlight.get(path);
+    if (!likeQueue.confirmed.has(path)) likeQueue.confirmed.set(path, heart.classList.contains('liked'));
+    return likeQueue.confirmed.get(path);
+};
+
+const scheduleLikeFlush = () => {
+    clearTimeout(likeQueue.timer);
+    const waited = Date.now() - likeQueue.firstQueuedAt;
+    likeQueue.timer = setTimeout(flushLikes, Math.max(0, Math.min(LIKE_DEBOUNCE_MS, LIKE_MAX_DELAY_MS - waited)));
+};
+
+const toggleLike = (event, rawPath) => {
     event.stopPropagation();
-    const heart = event.target;
-    const isLiked = heart.classList.contains('liked');
+    // 与 BatchLike 和 heartsFor 使用同一个键：data-path（Windows 路径中的 \ 已替换为 /）
+    const heart = event.currentTarget || event.target;
+    const path = heart.dataset.path || rawPath;
+    const liked = !displayedLike(path, heart);
+    if (!likeQueue.pending.size) likeQueue.firstQueuedAt = Date.now();
+    likeQueue.pending.set(path, liked);
+    setHeartState(path, liked);
+    scheduleLikeFlush();
+};
+
+const likeChanges = (batch) => Array.from(batch, ([path, like]) => ({ path, like }));
 
-    fetch('/like_image', {
+const flushLikes = () => {
+    clearTimeout(likeQueue.timer);
+    if (likeQueue.inFlight || !likeQueue.pending.size) return;
+    const batch = likeQueue.pending;
+    likeQueue.pending = new Map();
+    // 与服务器状态相同的修改（如点了两次）无需发送
+    batch.forEach((liked, path) => {
+        if (likeQueue.confirmed.get(path) === liked) batch.delete(path);
+    });
+    if (!batch.size) return;
+    likeQueue.inFlight = batch;
+
+    fetch(`${BASE_URL}like_image`, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ 
-            path: path,
-            action: isLiked ? 'unlike' : 'like'
-        })
+        body: JSON.stringify({ changes: likeChanges(batch) })
     })
-    .then(response => {
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
+    .then(async response => {
+        const data = await response.json().catch(() => ({}));
+        // 全部未找到时服务器返回 404 和 not_found 列表，按未找到处理
+        if (!response.ok && !(response.status === 404 && data.not_found)) {
+            throw new Error(data.message || `HTTP error! status: ${response.status}`);
         }
-        return response.json();
+        return data;
     })
     .then(data => {
-        if (data.success) {
-            heart.classList.toggle('liked');
-            heart.classList.toggle('unliked');
-        } else {
-            alert(`操作失败: ${data.message || '未知错误'}`);
+        (data.found || []).forEach(path => likeQueue.confirmed.set(path, batch.get(path)));
+        finishLikeBatch(batch, data.not_found || []);
+        if (data.not_found && data.not_found.length) {
+            alert(`操作失败: ${data.not_found.length}张图片未找到`);
         }
     })
     .catch(error => {
         console.error('Error:', error);
+        finishLikeBatch(batch, Array.from(batch.keys()));
         alert(`操作失败: ${error.message}`);
     });
 };
 
+const finishLikeBatch = (batch, failedPaths) => {
+    likeQueue.inFlight = null;
+    // 失败的修改回滚到服务器确认的状态，之后又点击过的图片以最新点击为准
+    failedPaths.forEach(path => {
+        if (!likeQueue.pending.has(path) && likeQueue.confirmed.has(path)) {
+            setHeartState(path, likeQueue.confirmed.get(path));
+        }
+    });
+    if (likeQueue.pending.size) scheduleLikeFlush();
+};
+
+// 离开页面时用 sendBeacon 发送尚未发送的修改
+window.addEventListener('pagehide', () => {
+    if (!likeQueue.pending.size) return;
+    const body = JSON.stringify({ changes: likeChanges(likeQueue.pending) });
+    navigator.sendBeacon(`${BASE_URL}like_image`, new Blob([body], { type: 'application/json' }));
+    likeQueue.pending = new Map();
+});
+
 // 一键点赞所有图片
 function BatchLike() {
     const hearts = document.querySelectorAll('.heart-icon');
@@ -105,7 +284,7 @@ function BatchLike() {
         return;
     }
 
-    fetch('/like_image', {
+    fetch(`${BASE_URL}like_image`, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -127,6 +306,8 @@ function BatchLike() {
                 heart.classList.add('liked');
                 heart.classList.remove('unliked');
                 heart.dataset.liked = 'true';
+                likeQueue.confirmed.set(path, true);
+                likeQueue.pending.delete(path);
             }
         });
         
@@ -0,0 +1,62 @@
+// static/js/tree.js
+// 目录树：子目录在第一次展开时从 /tree/children 加载，之后只切换显示
+function createTreeNode(node) {
+    const item = document.createElement('li');
+    item.className = 'tree-node';
+    if (node.children_url) {
+        item.dataset.childrenUrl = node.children_url;
+        const toggle = document.createElement('button');
+        toggle.className = 'tree-toggle';
+        toggle.type = 'button';
+        toggle.textContent = '▸';
+        toggle.setAttribute('aria-expanded', 'false');
+        toggle.setAttribute('aria-label', '展开');
+        item.appendChild(toggle);
+    } else {
+        const leaf = document.createElement('span');
+        leaf.className = 'tree-toggle tree-leaf';
+        item.appendChild(leaf);
+    }
+    const link = document.createElement('a');
+    link.className = 'tree-link';
+    link.href = node.url;
+    link.textContent = node.name;
+    item.appendChild(link);
+    const count = document.createElement('span');
+    count.className = 'tree-count';
+    count.textContent = `${node.images}P` + (node.likes === null ? '' : ` · ❤ ${node.likes}`);
+    item.appendChild(count);
+    return item;
+}
+
+async function toggleTreeNode(item, toggle) {
+    let children = item.querySelector(':scope > ul');
+    const expanded = toggle.getAttribute('aria-expanded') === 'true';
+    if (!children && !expanded) {
+        toggle.disabled = true;
+        try {
+            const response = await fetch(item.dataset.childrenUrl, { headers: { 'Accept': 'application/json' } });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const data = await response.json();
+            children = document.createElement('ul');
+            children.className = 'tree';
+            data.children.forEach(node => children.appendChild(createTreeNode(node)));
+            item.appendChild(children);
+        } catch (error) {
+            console.error('加载子目录失败:', error);
+            return;
+        } finally {
+            toggle.disabled = false;
+        }
+    }
+    children.hidden = expanded;
+    toggle.textContent = expanded ? '▸' : '▾';
+    toggle.setAttribute('aria-expanded', String(!expanded));
+}
+
+document.addEventListener('click', event => {
+    const toggle = event.target.closest('.tree-toggle');
+    if (toggle && toggle.tagName === 'BUTTON') {
+        toggleTreeNode(toggle.closest('.tree-node'), toggle);
+    }
+});
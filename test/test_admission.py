@@ -0,0 +1,50 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from admission import AdmissionGate, Rejected
+
+class TestAdmissionGate(unittest.TestCase):
+    def test_limit_and_release(self):
+        gate = AdmissionGate(2, max_waiting=4, timeout=5)
+        self.assertEqual(gate.acquire(), 0.0)
+        self.assertEqual(gate.acquire(), 0.0)
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(gate.acquire()))
+        waiter.start()
+        deadline = time.time() + 5
+        while gate.waiting == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual((gate.active, gate.waiting), (2, 1))
+        time.sleep(0.05)
+        gate.release()
+        waiter.join(5)
+        self.assertEqual(len(results), 1)
+        self.assertGreater(results[0], 0.03)
+        self.assertEqual((gate.active, gate.waiting), (2, 0))
+
+    def test_full_queue_rejected_immediately(self):
+        gate = AdmissionGate(1, max_waiting=0, timeout=5)
+        gate.acquire()
+        start = time.perf_counter()
+        with self.assertRaises(Rejected) as ctx:
+            gate.acquire()
+        self.assertEqual(ctx.exception.reason, 'full')
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(gate.active, 1)
+
+    def test_timeout(self):
+        gate = AdmissionGate(1, max_waiting=1, timeout=0.05)
+        gate.acquire()
+        with self.assertRaises(Rejected) as ctx:
+            gate.acquire()
+        self.assertEqual(ctx.exception.reason, 'timeout')
+        self.assertEqual((gate.active, gate.waiting), (1, 0))
+        gate.release()
+        self.assertEqual(gate.acquire(), 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+import sys
+import os
+import argparse
+import json
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from web import WebApp
+from benchmarks.dataset import generate_dataset, iter_image_paths, materialize_images
+from benchmarks.bench_hot_paths import measure
+from benchmarks.loadtest import percentile, run_load_test
+
+class TestDatasetGenerator(unittest.TestCase):
+    def test_generate_dataset_shape(self):
+        """测试合成数据的图片数、分类数与点赞比例"""
+        data = generate_dataset('/data', bases=2, depth=3, categories=10, images=1000,
+                                score_size=3, like_ratio=0.5, seed=1)
+        self.assertEqual(len(data['img']), 2)
+        paths = list(iter_image_paths(data))
+        self.assertEqual(len(paths), 1000)
+
+        args = argparse.Namespace(per_page=20, input_json=['synthetic.json'], replace=None)
+        web_app = WebApp(args)
+        web_app.cached_raw_data['synthetic.json'] = data
+        with web_app.app.test_request_context():
+            category_map, file_map = web_app.load_image_data()
+        self.assertEqual(len(category_map), 10)
+        self.assertEqual(len(file_map), 1000)
+        liked = sum(1 for imgs in category_map.values() for img in imgs if img['like'])
+        self.assertTrue(400 < liked < 600)
+        first = next(iter(category_map.values()))[0]
+        self.assertEqual(len(first['face_scores']), 3)
+        self.assertEqual(first['category'].count('/'), 2)
+
+    def test_generate_dataset_repeatable(self):
+        """测试相同种子生成相同数据"""
+        self.assertEqual(generate_dataset('/data', images=200, seed=7),
+                         generate_dataset('/data', images=200, seed=7))
+
+    def test_materialize_images(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data = generate_dataset(tmp, images=50)
+            paths = list(iter_image_paths(data))[:5]
+            materialize_images(paths, size=128)
+            for path in paths:
+                self.assertEqual(os.path.getsize(path), 128)
+
+    def test_measure_reports_timing_and_memory(self):
+        result = measure(lambda: [0] * 10000, repeat=3)
+        self.assertEqual(result['repeat'], 3)
+        self.assertLessEqual(result['min_ms'], result['max_ms'])
+        self.assertGreater(result['peak_kb'], 0)
+
+class TestLoadTest(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_run_load_test_reports_routes(self):
+        """测试负载测试在本地启动服务并输出各路由统计"""
+        with tempfile.TemporaryDirectory() as tmp:
+            report = run_load_test(tmp, images=200, categories=4, users=2, duration=1,
+                                   like_rate=1.0, per_page=10, images_per_page=2)
+        self.assertGreater(report['requests'], 0)
+        self.assertIn('image', report['routes'])
+        for stats in report['routes'].values():
+            self.assertEqual(stats['errors'], 0)
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+
+class TestConcurrencyStress(unittest.TestCase):
+    def test_reads_progress_while_liking(self):
+        """测试读线程在持续点赞与保存期间仍有吞吐"""
+        from urllib.parse import quote
+        from benchmarks.bench_concurrency import run_stress
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, 'stress.json')
+            data = generate_dataset(os.path.join(tmp, 'img'), categories=4, images=200)
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            paths = list(iter_image_paths(data))[:20]
+            materialize_images(paths, size=256)
+            web_app = WebApp(argparse.Namespace(per_page=20, input_json=[json_path], replace=None))
+            index = web_app.get_image_index(json_path)
+            urls = [f"/image/{quote(index.path_map[p]['category'])}/{quote(index.path_map[p]['filename'])}"
+                    for p in paths]
+            result = run_stress(web_app, urls, paths, threads=4, duration=0.5)
+            web_app.save_queue.join()
+            web_app.save_thread_running = False
+        self.assertGreater(result['reads'], 0)
+        self.assertGreater(result['likes'], 0)
+
+    def test_reads_progress_while_data_lock_held(self):
+        """测试写线程持有 data_lock 期间，页面与图片读取不被阻塞"""
+        from urllib.parse import quote
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, 'stress.json')
+            data = generate_dataset(os.path.join(tmp, 'img'), categories=4, images=200)
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            paths = list(iter_image_paths(data))[:20]
+            materialize_images(paths, size=256)
+            web_app = WebApp(argparse.Namespace(per_page=20, input_json=[json_path], replace=None))
+            index = web_app.get_image_index(json_path)
+            category = index.path_map[paths[0]]['category']
+            urls = [f"/category/{quote(category)}", '/category/_favorites?seed=1', '/all?page=2']
+            urls += [f"/image/{quote(index.path_map[p]['category'])}/{quote(index.path_map[p]['filename'])}"
+                     for p in paths]
+            statuses = []
+
+            def reader():
+                client = web_app.app.test_client()
+                deadline = time.monotonic() + 0.5
+                n = 0
+                while time.monotonic() < deadline:
+                    with client.get(urls[n % len(urls)]) as response:
+                        statuses.append(response.status_code)
+                    n += 1
+
+            # 模拟一次耗时的保存或重建：锁一直被持有，读线程必须在锁释放前完成
+            with web_app.data_lock:
+                threads = [threading.Thread(target=reader) for _ in range(2)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join(10)
+                blocked = any(t.is_alive() for t in threads)
+            for t in threads:
+                t.join()
+            web_app.save_thread_running = False
+        self.assertFalse(blocked)
+        self.assertGreater(len(statuses), len(urls))
+        self.assertEqual(set(statuses), {200})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import sys
+import os
+import json
+import struct
+import tempfile
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bundle
+from bundle import iter_frames, frame_header
+
+
+def parse_frames(data):
+    # 与 main.js 中的解析相同：帧头长度 + JSON 帧头 + 内容
+    frames = []
+    offset = 0
+    while offset < len(data):
+        length = struct.unpack('>I', data[offset:offset + 4])[0]
+        header = json.loads(data[offset + 4:offset + 4 + length])
+        offset += 4 + length
+        frames.append((header, data[offset:offset + header['size']]))
+        offset += header['size']
+    return frames
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class TestBundleFrames(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.big = os.path.join(self.tmp.name, 'big.jpg')
+        with open(self.big, 'wb') as f:
+            f.write(bytes(range(256)) * 1000)
+        self.small = os.path.join(self.tmp.name, 'small.png')
+        with open(self.small, 'wb') as f:
+            f.write(b'png')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_frames_in_order(self):
+        sent = Counter()
+        entries = [(0, self.big, 'image/jpeg', 'a/big.jpg'), (1, None, None, 'a/none.jpg'),
+                   (2, self.small, 'image/png', '分类/small.png'),
+                   (3, os.path.join(self.tmp.name, 'gone.jpg'), 'image/jpeg', 'a/gone.jpg')]
+        frames = parse_frames(b''.join(iter_frames(entries, sent)))
+        self.assertEqual([(h['i'], h['name'], h['status'], h['type'], h['size']) for h, _ in frames],
+                         [(0, 'a/big.jpg', 200, 'image/jpeg', 256000), (1, 'a/none.jpg', 404, None, 0),
+                          (2, '分类/small.png', 200, 'image/png', 3), (3, 'a/gone.jpg', 404, None, 0)])
+        self.assertEqual(frames[0][1], bytes(range(256)) * 1000)
+        self.assertEqual(frames[2][1], b'png')
+        self.assertEqual(sent.value, 256003)
+
+    def test_streams_in_chunks(self):
+        with patch.object(bundle, 'CHUNK_SIZE', 1000):
+            chunks = list(iter_frames([(0, self.big, 'image/jpeg', 'a/big.jpg')]))
+        self.assertEqual(chunks[0], frame_header(0, 200, 'image/jpeg', 256000, 'a/big.jpg'))
+        self.assertEqual(len(chunks), 257)
+        self.assertTrue(all(len(chunk) == 1000 for chunk in chunks[1:]))
+
+    def test_truncated_file_keeps_frame_boundary(self):
+        frames = iter_frames([(0, self.big, 'image/jpeg', 'a/big.jpg'), (1, self.small, 'image/png', 'a/small.png')])
+        data = next(frames) + next(frames)
+        with open(self.big, 'wb') as f:
+            f.write(b'')
+        data += b''.join(frames)
+        parsed = parse_frames(data)
+        self.assertEqual([h['i'] for h, _ in parsed], [0, 1])
+        self.assertEqual(len(parsed[0][1]), 256000)
+        self.assertEqual(parsed[1][1], b'png')
+
+
+if __name__ == '__main__':
+    unittest.main()
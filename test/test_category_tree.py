@@ -0,0 +1,51 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from category_tree import CategoryTree
+from image_index import ImageIndex
+
+class TestCategoryTree(unittest.TestCase):
+    def setUp(self):
+        self.tree = CategoryTree({'a': 2, 'a/b': 3, 'a/b/c': 4, 'a/d': 1, 'photos': 5, 'z/y': 0})
+
+    def test_subtree_counts(self):
+        self.assertEqual(list(self.tree.root.children), ['a', 'photos', 'z'])
+        node = self.tree.node('a')
+        self.assertEqual((node.images, node.subtree_images), (2, 10))
+        self.assertEqual(list(node.children), ['b', 'd'])
+        self.assertEqual(self.tree.node('a/b/').subtree_images, 7)
+        self.assertEqual(self.tree.root.subtree_images, 15)
+        self.assertIsNone(self.tree.node('a/x'))
+        self.assertEqual(self.tree.describe(self.tree.node('a/d')),
+                         {'name': 'd', 'path': 'a/d', 'images': 1, 'own_images': 1, 'likes': None,
+                          'has_children': False})
+
+    def test_subtree_totals(self):
+        totals = self.tree.subtree_totals({'a/b/c': 2, 'a': 1, 'photos': 0, 'gone': 3})
+        self.assertEqual(totals, {'a/b/c': 2, 'a/b': 2, 'a': 3, '': 3})
+
+    def test_slices_skip_whole_subtrees(self):
+        # 先序：a(2) a/b(3) a/b/c(4) a/d(1)
+        self.assertEqual(self.tree.slices('a', 0, 4), [('a', 0, 2), ('a/b', 0, 2)])
+        self.assertEqual(self.tree.slices('a', 4, 4), [('a/b', 2, 3), ('a/b/c', 0, 3)])
+        self.assertEqual(self.tree.slices('a', 8, 4), [('a/b/c', 3, 4), ('a/d', 0, 1)])
+        self.assertEqual(self.tree.slices('a', 10, 4), [])
+        self.assertEqual(self.tree.slices('', 10, 3), [('photos', 0, 3)])
+        self.assertEqual(self.tree.slices('nope', 0, 3), [])
+
+    def test_index_like_counts_follow_likes(self):
+        index = ImageIndex({'img': {'/photos': {'a': {
+            '1.jpg': {'face_scores': [0.5], 'like': True},
+            '2.jpg': {'face_scores': [0.5]}
+        }}}})
+        self.assertEqual(index.like_counts['a'], 1)
+        index.set_like(os.path.abspath('/photos/a/2.jpg'), True)
+        index.set_like(os.path.abspath('/photos/a/2.jpg'), True)
+        self.assertEqual(index.like_counts['a'], 2)
+        index.set_like(os.path.abspath('/photos/a/1.jpg'), False)
+        self.assertEqual(index.like_counts['a'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import sys
+import os
+import gzip
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compression import CompressedCache, StaticAssets, precompress_static, compress, load_brotli
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp.name, 'css'))
+        self.css = os.path.join(self.tmp.name, 'css', 'style.css')
+        with open(self.css, 'w', encoding='utf-8') as f:
+            f.write('body { margin: 0; }\n' * 200)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_gzip_round_trip(self):
+        data = b'<html>' + b'x' * 5000
+        self.assertEqual(gzip.decompress(compress(data, 'gzip')), data)
+        # 相同内容的压缩结果相同，便于缓存
+        self.assertEqual(compress(data, 'gzip'), compress(data, 'gzip'))
+
+    def test_cache_bounded_by_bytes(self):
+        cache = CompressedCache(max_bytes=10)
+        cache.put(('a', 'v1', 'gzip'), b'12345', 'text/html')
+        cache.put(('b', 'v1', 'gzip'), b'12345', 'text/html')
+        cache.get(('a', 'v1', 'gzip'))
+        cache.put(('c', 'v1', 'gzip'), b'123', 'text/html')
+        # 逐出最久未使用的 b
+        self.assertIsNone(cache.get(('b', 'v1', 'gzip')))
+        self.assertEqual(cache.get(('a', 'v1', 'gzip')), (b'12345', 'text/html'))
+        self.assertEqual(cache.total_bytes, 8)
+        cache.put(('huge', 'v1', 'gzip'), b'x' * 11, 'text/html')
+        self.assertIsNone(cache.get(('huge', 'v1', 'gzip')))
+
+    def test_precompress_and_digest(self):
+        assets = StaticAssets(self.tmp.name)
+        digest = assets.digest('css/style.css')
+        self.assertEqual(assets.precompressed('css/style.css', ['gzip']), (None, None))
+        written = precompress_static(self.tmp.name)
+        self.assertIn('css/style.css.gz', written)
+        self.assertEqual(assets.precompressed('css/style.css', ['br', 'gzip'])[1],
+                         'br' if load_brotli() is not None else 'gzip')
+        with open(self.css + '.gz', 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), b'body { margin: 0; }\n' * 200)
+        # 修改后哈希变化，旧的预压缩文件不再使用
+        with open(self.css, 'a', encoding='utf-8') as f:
+            f.write('p { color: red; }\n')
+        os.utime(self.css, ns=(os.stat(self.css).st_atime_ns, os.stat(self.css + '.gz').st_mtime_ns + 10 ** 9))
+        self.assertNotEqual(assets.digest('css/style.css'), digest)
+        self.assertEqual(assets.precompressed('css/style.css', ['gzip']), (None, None))
+        self.assertEqual(assets.digest('css/missing.css'), 'missing')
+
+if __name__ == '__main__':
+    unittest.main()
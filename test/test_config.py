@@ -3,6 +3,7 @@ import sys
 import os
 from unittest.mock import patch, MagicMock
 import argparse
+import subprocess
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import parse_args, ConfigGUI
@@ -70,5 +71,42 @@ class TestConfigGUI(unittest.TestCase):
         gui.submit_params()
         mock_showerror.assert_called_with("错误", "端口号必须是0-65535之间的整数")
 
+class TestHeadlessStartup(unittest.TestCase):
+    def test_headless_import_skips_gui_modules(self):
+        """测试无界面启动路径不导入 GUI、HTTP 客户端和默认关闭的功能模块（sqlite3、cProfile、pstats 等）"""
+        from benchmarks.bench_startup import HEAVY_MODULES
+        code = ("import sys; import config, display; "
+                f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_headless_startup_skips_disabled_features(self):
+        """测试默认配置构建应用后仍未导入默认关闭的功能模块"""
+        import tempfile
+        from benchmarks.bench_startup import HEADLESS_SNIPPET, HEAVY_MODULES
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, 'empty.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                f.write('{"img": {}}')
+            result = subprocess.run([sys.executable, '-c', HEADLESS_SNIPPET.format(json_path=json_path,
+                                                                                    modules=HEAVY_MODULES)],
+                                    capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '')
+
+    @patch('version.get_cached_git_version', return_value='v1.2.3')
+    def test_version_resolved_once(self, mock_git):
+        import version
+        version.get_version.cache_clear()
+        try:
+            self.assertEqual(version.get_version(), 'v1.2.3')
+            self.assertEqual(version.__version__, 'v1.2.3')
+            mock_git.assert_called_once()
+        finally:
+            version.get_version.cache_clear()
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
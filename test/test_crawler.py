@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crawler import DirectoryCrawler, scan_bases, apply_scans
+
+class TestDirectoryCrawler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        for name in ('a/1.jpg', 'a/2.jpg', 'a/notes.txt', 'b/deep/3.png', 'root.jpg', 'scored.tif'):
+            self.touch(name)
+        self.img_data = {self.base: {
+            'scored.tif': {'face_scores': [0.5]},
+            'a': {'1.jpg': {'face_scores': [0.9]}},
+            'gone': {'old.jpg': {'face_scores': [0.4]}}
+        }}
+        self.crawler = DirectoryCrawler(workers=4)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def touch(self, name, content=b'x'):
+        path = os.path.join(self.base, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def refresh(self, state, full=False):
+        return apply_scans(self.img_data, state, scan_bases(self.img_data, state, self.crawler, full))
+
+    def test_first_crawl_merges_new_and_missing(self):
+        state, counts = self.refresh({})
+        tree = self.img_data[self.base]
+        self.assertEqual(counts['added'], 3)
+        self.assertEqual(tree['a']['2.jpg'], {'face_scores': [], 'face_landmark_scores_68': [], 'unscored': True})
+        self.assertTrue(tree['b']['deep']['3.png']['unscored'])
+        self.assertNotIn('notes.txt', tree['a'])
+        # 扩展名不在列表内但存在于磁盘的图片不会被标记为缺失
+        self.assertNotIn('missing', tree['scored.tif'])
+        self.assertEqual(set(state[os.path.abspath(self.base)]), {'', 'a', 'b', 'b/deep'})
+
+    def test_incremental_refresh_skips_unchanged_directories(self):
+        state, _ = self.refresh({})
+        state, counts = self.refresh(state)
+        self.assertEqual(counts['dirs_rescanned'], 0)
+        self.touch('b/deep/4.jpg')
+        os.remove(os.path.join(self.base, 'a', '2.jpg'))
+        state, counts = self.refresh(state)
+        self.assertEqual(counts['dirs_rescanned'], 2)
+        self.assertEqual((counts['added'], counts['removed']), (1, 1))
+        self.assertNotIn('2.jpg', self.img_data[self.base]['a'])
+
+    def test_removed_scored_image_marked_missing_and_restored(self):
+        state, _ = self.refresh({})
+        os.remove(os.path.join(self.base, 'a', '1.jpg'))
+        state, counts = self.refresh(state)
+        self.assertEqual(counts['missing'], 1)
+        self.assertTrue(self.img_data[self.base]['a']['1.jpg']['missing'])
+        self.touch('a/1.jpg')
+        state, counts = self.refresh(state)
+        self.assertEqual(counts['restored'], 1)
+        self.assertNotIn('missing', self.img_data[self.base]['a']['1.jpg'])
+
+    def test_full_refresh_detects_modified_image(self):
+        state, _ = self.refresh({})
+        path = os.path.join(self.base, 'a', '1.jpg')
+        stat = os.stat(os.path.join(self.base, 'a'))
+        self.touch('a/1.jpg', b'rewritten')
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        os.utime(os.path.join(self.base, 'a'), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        state, counts = self.refresh(state)
+        self.assertEqual(counts['modified'], 0)
+        state, counts = self.refresh(state, full=True)
+        self.assertEqual(counts['modified'], 1)
+        self.assertTrue(self.img_data[self.base]['a']['1.jpg']['unscored'])
+        self.assertEqual(self.img_data[self.base]['a']['1.jpg']['face_scores'], [0.9])
+
+    def test_unreachable_base_keeps_state(self):
+        state, _ = self.refresh({})
+        os.rename(self.base, self.base + '_unmounted')
+        new_state, counts = self.refresh(state)
+        self.assertEqual(new_state, state)
+        self.assertEqual(counts['missing'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
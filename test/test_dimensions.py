@@ -0,0 +1,156 @@
+import unittest
+import sys
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dimensions import read_dimensions, exif_orientation, carry_over, DimensionProber
+from image_index import ImageIndex
+
+
+def png_bytes(width, height):
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr
+            + struct.pack('>I', zlib.crc32(b'IHDR' + ihdr)))
+
+
+def exif_segment(orientation, order=b'MM'):
+    fmt = '>' if order == b'MM' else '<'
+    ifd = struct.pack(f'{fmt}H', 1) + struct.pack(f'{fmt}HHIH2x', 0x0112, 3, 1, orientation) + b'\0\0\0\0'
+    data = b'Exif\0\0' + order + struct.pack(f'{fmt}HI', 42, 8) + ifd
+    return b'\xff\xe1' + struct.pack('>H', len(data) + 2) + data
+
+
+def jpeg_bytes(width, height, orientation=None):
+    # SOI + 可选 EXIF + 大的 APP 段 + DQT + SOF2（渐进式）+ SOS
+    data = b'\xff\xd8'
+    if orientation is not None:
+        data += exif_segment(orientation)
+    data += b'\xff\xed' + struct.pack('>H', 5002) + b'\0' * 5000
+    data += b'\xff\xdb' + struct.pack('>H', 67) + b'\0' * 65
+    data += b'\xff\xc2' + struct.pack('>HBHHB', 11, 8, height, width, 1) + b'\x01\x11\x00'
+    return data + b'\xff\xda' + struct.pack('>H', 8) + b'\0' * 6 + b'\xff\xd9'
+
+
+class TestReadDimensions(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_formats(self):
+        vp8x = b'RIFF' + struct.pack('<I', 30) + b'WEBPVP8X' + struct.pack('<I', 10) + b'\0' * 4 \
+            + (639).to_bytes(3, 'little') + (479).to_bytes(3, 'little')
+        vp8l_bits = (400 - 1) | ((300 - 1) << 14)
+        vp8l = b'RIFF' + struct.pack('<I', 30) + b'WEBPVP8L' + struct.pack('<I', 10) + b'\x2f' \
+            + struct.pack('<I', vp8l_bits)
+        vp8 = b'RIFF' + struct.pack('<I', 30) + b'WEBPVP8 ' + struct.pack('<I', 10) + b'\0' * 3 \
+            + b'\x9d\x01\x2a' + struct.pack('<HH', 320, 200)
+        cases = {
+            'a.png': (png_bytes(1920, 1080), (1920, 1080)),
+            'b.gif': (b'GIF89a' + struct.pack('<HH', 64, 48) + b'\0' * 10, (64, 48)),
+            'c.webp': (vp8x, (640, 480)),
+            'd.webp': (vp8l, (400, 300)),
+            'e.webp': (vp8, (320, 200)),
+            'f.jpg': (jpeg_bytes(4000, 3000), (4000, 3000)),
+            'g.jpg': (jpeg_bytes(4000, 3000, orientation=6), (3000, 4000)),
+            'h.jpg': (jpeg_bytes(4000, 3000, orientation=3), (4000, 3000)),
+        }
+        for name, (data, expected) in cases.items():
+            self.assertEqual(read_dimensions(self.write(name, data)), expected, name)
+
+    def test_unreadable_files(self):
+        self.assertIsNone(read_dimensions(self.write('x.txt', b'not an image')))
+        self.assertIsNone(read_dimensions(self.write('trunc.jpg', jpeg_bytes(10, 10)[:40])))
+        self.assertIsNone(read_dimensions(self.write('zero.png', png_bytes(0, 5))))
+        self.assertIsNone(read_dimensions(os.path.join(self.tmp.name, 'gone.jpg')))
+
+    def test_exif_orientation(self):
+        self.assertEqual(exif_orientation(exif_segment(8, b'II')[4:]), 8)
+        self.assertEqual(exif_orientation(b'Exif\0\0MM\0*\0\0\xff\xff'), 1)
+        self.assertEqual(exif_orientation(b'http://ns.adobe.com/xap/1.0/'), 1)
+
+
+class TestDimensionProber(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        os.makedirs(os.path.join(self.base, 'cat'))
+        with open(os.path.join(self.base, 'cat', 'a.png'), 'wb') as f:
+            f.write(png_bytes(30, 20))
+        with open(os.path.join(self.base, 'cat', 'b.jpg'), 'wb') as f:
+            f.write(b'broken')
+        self.data = {'img': {self.base: {'cat': {
+            'a.png': {'face_scores': [0.5]},
+            'b.jpg': {'face_scores': [0.5]},
+            'gone.jpg': {'face_scores': [0.5]}
+        }}}}
+        self.index = ImageIndex(self.data)
+        self.images = self.index.category_map['cat']
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fill_waits_for_page(self):
+        prober = DimensionProber(1)
+        self.assertTrue(prober.fill(self.images, timeout=5))
+        self.assertEqual([(img['width'], img.get('height')) for img in self.images],
+                         [(30, 20), (None, None), (None, None)])
+        # 已探测的图片不再排队
+        self.assertTrue(prober.fill(self.images))
+        self.assertEqual(prober.pending(), 0)
+
+    def test_generation_per_file_only_on_size_change(self):
+        prober = DimensionProber(1)
+        # 只有失败的探测时宽高仍为空，页面不变
+        self.assertTrue(prober.fill(self.images[1:], timeout=5, key='a.json'))
+        self.assertEqual(prober.generation('a.json'), 0)
+        self.assertTrue(prober.fill(self.images, timeout=5, key='a.json'))
+        self.assertEqual((prober.generation('a.json'), prober.generation('b.json')), (1, 0))
+        # 文件被改写但尺寸相同，后台重新探测不换代
+        path = self.images[0]['path']
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        prober.schedule(self.index, key='a.json')
+        prober.queue.join()
+        self.assertEqual(self.images[0]['probed'][0], stat.st_mtime_ns + 10 ** 9)
+        self.assertEqual(prober.generation('a.json'), 1)
+
+    def test_probe_follows_mtime(self):
+        img = self.images[0]
+        self.assertEqual(DimensionProber.probe(img), 'probed')
+        self.assertEqual(DimensionProber.probe(img), 'unchanged')
+        with open(img['path'], 'wb') as f:
+            f.write(png_bytes(8, 9))
+        stat = os.stat(img['path'])
+        os.utime(img['path'], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(DimensionProber.probe(img), 'probed')
+        self.assertEqual((img['width'], img['height']), (8, 9))
+
+    def test_schedule_carries_over_rebuilt_index(self):
+        DimensionProber.probe(self.images[0])
+        rebuilt = ImageIndex(self.data)
+        self.assertEqual(carry_over(rebuilt, self.index), 1)
+        self.assertEqual(rebuilt.category_map['cat'][0]['width'], 30)
+        again = ImageIndex(self.data)
+        prober = DimensionProber(2)
+        prober.schedule(again)
+        deadline = time.time() + 5
+        while 'width' not in again.category_map['cat'][1] and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(again.category_map['cat'][0]['width'], 30)
+        self.assertIsNone(again.category_map['cat'][1]['width'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import sys
+import os
+import io
+import csv
+import json
+import tempfile
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_index import ImageIndex
+import export
+from export import iter_view, iter_records, export_lines, batch_lines
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.data = {'img': {'/photos': {
+            'b': {
+                'b1.jpg': {'face_scores': [0.2, 0.8], 'face_landmark_scores_68': [0.5], 'like': True},
+                'b2.jpg': {'face_scores': [0.1]}
+            },
+            'a': {
+                'a1.jpg': {'face_scores': [0.9], 'like': True},
+                'new.jpg': {'face_scores': [], 'unscored': True}
+            }
+        }}}
+        self.index = ImageIndex(self.data)
+
+    def filenames(self, view, **kwargs):
+        return [r['filename'] for r in iter_records(iter_view(self.index.category_map, view), **kwargs)]
+
+    def test_views_match_page_order(self):
+        self.assertEqual(self.filenames(None), ['a1.jpg', 'new.jpg', 'b1.jpg', 'b2.jpg'])
+        self.assertEqual(self.filenames('_favorites'), ['b1.jpg', 'a1.jpg'])
+        self.assertEqual(self.filenames('_unfavorites'), ['b2.jpg', 'new.jpg'])
+        self.assertEqual(self.filenames('b'), ['b1.jpg', 'b2.jpg'])
+        self.assertEqual(self.filenames('missing'), [])
+
+    def test_score_filter_and_aggregates(self):
+        records = list(iter_records(iter_view(self.index.category_map, None), min_score=0.5))
+        self.assertEqual([r['filename'] for r in records], ['a1.jpg', 'b1.jpg'])
+        self.assertEqual(records[1]['faces'], 2)
+        self.assertEqual(records[1]['face_score_max'], 0.8)
+        self.assertAlmostEqual(records[1]['face_score_mean'], 0.5)
+        self.assertEqual(records[1]['landmark_score_mean'], 0.5)
+        self.assertEqual(self.filenames(None, max_score=0.5), ['b2.jpg'])
+
+    def test_formats(self):
+        records = list(iter_records(iter_view(self.index.category_map, 'a')))
+        lines = ''.join(export_lines(iter(records), 'ndjson')).splitlines()
+        self.assertEqual(json.loads(lines[1])['unscored'], True)
+        self.assertIsNone(json.loads(lines[1])['face_score_max'])
+        rows = list(csv.DictReader(io.StringIO(''.join(export_lines(iter(records), 'csv')))))
+        self.assertEqual(rows[0]['path'], os.path.normpath('/photos/a/a1.jpg'))
+        self.assertEqual(rows[1]['face_score_max'], '')
+        self.assertEqual(''.join(export_lines(iter([]), 'csv')).strip(), ','.join(export.EXPORT_FIELDS))
+        self.assertEqual(list(batch_lines(['ab', 'cd', 'e'], size=3)), [b'abcd', b'e'])
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, 'data.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f)
+            output = os.path.join(tmp, 'out.csv')
+            argv = ['export.py', '--input_json', json_path, '--view', '_favorites', '--format', 'csv',
+                    '--replace', '/photos', '/mnt', '--output', output]
+            with patch.object(sys, 'argv', argv), patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                export.main()
+            with open(output, 'r', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual([row['path'] for row in rows],
+                             [os.path.normpath('/mnt/b/b1.jpg'), os.path.normpath('/mnt/a/a1.jpg')])
+            self.assertIn('exported 2 records', stderr.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
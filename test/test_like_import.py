@@ -0,0 +1,87 @@
+import unittest
+import sys
+import os
+import io
+import json
+import tempfile
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_index import ImageIndex
+import like_import
+from like_import import parse_like_line, new_summary, collect_changes, apply_changes, NodeResolver
+
+class TestLikeImport(unittest.TestCase):
+    def setUp(self):
+        self.base = os.path.abspath('/photos')
+        self.data = {'img': {'/photos': {
+            'a': {
+                '1.jpg': {'face_scores': [0.9]},
+                'deep': {'2.jpg': {'face_scores': [0.5], 'like': True}}
+            },
+            'root.jpg': {'face_scores': [0.4]},
+            'hidden.jpg': {'face_scores': []}
+        }}}
+        self.index = ImageIndex(self.data)
+
+    def path(self, *parts):
+        return os.path.join(self.base, *parts)
+
+    def test_parse_lines(self):
+        self.assertEqual(parse_like_line(b'/x/1.jpg\n'), ('/x/1.jpg', True))
+        self.assertEqual(parse_like_line('{"path": "/x/1.jpg", "like": false}'), ('/x/1.jpg', False))
+        self.assertEqual(parse_like_line('{"path": "/x/1.jpg", "action": "unlike"}'), ('/x/1.jpg', False))
+        self.assertIsNone(parse_like_line('  \n'))
+        self.assertIsNone(parse_like_line('# exported by reviewer'))
+        for line in ('{"path": "/x/1.jpg", "action": "maybe"}', '{"like": true}', '{broken', b'\xff\n'):
+            with self.assertRaises(ValueError):
+                parse_like_line(line)
+
+    def test_collect_last_line_wins_and_counts(self):
+        summary = new_summary()
+        lines = [self.path('a', '1.jpg'), '{broken', self.path('nope.jpg'), self.path('hidden.jpg'),
+                 json.dumps({'path': self.path('a', '1.jpg'), 'like': False}), '']
+        wanted = collect_changes(lines, self.index, summary)
+        self.assertEqual(wanted, {self.path('a'): {'1.jpg': (self.path('a', '1.jpg'), False)}})
+        self.assertEqual((summary['lines'], summary['applied'], summary['liked'], summary['unliked']), (5, 2, 1, 1))
+        self.assertEqual((summary['unknown'], summary['invalid']), (2, 1))
+        self.assertEqual(summary['unknown_paths'], [self.path('nope.jpg'), self.path('hidden.jpg')])
+
+    def test_apply_updates_raw_data_and_index(self):
+        summary = new_summary()
+        wanted = collect_changes([json.dumps({'path': self.path('a', 'deep', '2.jpg'), 'like': False}),
+                                  self.path('root.jpg')], self.index, summary)
+        self.assertEqual(apply_changes(self.index, wanted), 2)
+        tree = self.data['img']['/photos']
+        self.assertFalse(tree['a']['deep']['2.jpg']['like'])
+        self.assertTrue(tree['root.jpg']['like'])
+        self.assertTrue(self.index.path_map[self.path('root.jpg')]['like'])
+
+    def test_resolver_caches_directories(self):
+        resolver = NodeResolver(self.data['img'])
+        self.assertIsNone(resolver.node(self.path('a')))
+        self.assertIsNone(resolver.node(self.path('b', '1.jpg')))
+        self.assertIsNotNone(resolver.node(self.path('a', '1.jpg')))
+        self.assertEqual(set(resolver.dirs), {self.base, self.path('a'), self.path('b')})
+        self.assertIsNone(resolver.dirs[self.path('b')])
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, 'data.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f)
+            likes_path = os.path.join(tmp, 'likes.txt')
+            with open(likes_path, 'w', encoding='utf-8') as f:
+                f.write(f"{os.path.abspath('/mnt/root.jpg')}\n{os.path.abspath('/mnt/gone.jpg')}\n")
+            argv = ['like_import.py', '--input_json', json_path, '--replace', '/photos', '/mnt', '--file', likes_path]
+            with patch.object(sys, 'argv', argv), patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                like_import.main()
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.assertTrue(data['img']['/photos']['root.jpg']['like'])
+            self.assertIn('date_updated', data)
+            summary = json.loads(stderr.getvalue())
+            self.assertEqual((summary['applied'], summary['unknown']), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import MetricsRegistry
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_with_labels(self):
+        counter = self.registry.counter('requests_total', 'Requests.', ('route',))
+        counter.inc(route='/a')
+        counter.inc(2, route='/a')
+        counter.inc(route='/b"x')
+        text = self.registry.render()
+        self.assertIn('# TYPE requests_total counter', text)
+        self.assertIn('requests_total{route="/a"} 3', text)
+        self.assertIn('requests_total{route="/b\\"x"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 5):
+            histogram.observe(value)
+        text = self.registry.render()
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_count 4', text)
+        self.assertIn('latency_seconds_sum 6.25', text)
+
+    def test_gauge_function_evaluated_on_scrape(self):
+        depth = [0]
+        self.registry.gauge('queue_depth', 'Depth.').set_function(lambda: depth[0])
+        depth[0] = 7
+        self.assertIn('queue_depth 7', self.registry.render())
+
+    def test_histogram_time_context(self):
+        histogram = self.registry.histogram('work_seconds', 'Work.')
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.get(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
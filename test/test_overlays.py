@@ -0,0 +1,76 @@
+import unittest
+import sys
+import os
+import io
+import json
+import tempfile
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import overlays
+from overlays import LikeOverlays, valid_user, count_votes, merge_votes
+
+class TestLikeOverlays(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.overlay_dir = os.path.join(self.tmp.name, 'overlays')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        self.base = os.path.abspath('/photos')
+        self.data = {'img': {'/photos': {'cat': {
+            '1.jpg': {'face_scores': [0.5]},
+            '2.jpg': {'face_scores': [0.6], 'like': True},
+            '3.jpg': {'face_scores': [0.7]}
+        }}}}
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def image(self, root, name):
+        return os.path.join(os.path.abspath(root), 'cat', name)
+
+    def test_valid_user(self):
+        self.assertTrue(valid_user('alice.b@example-1'))
+        for user in ('', '..', 'a/b', 'a b', 'x' * 65):
+            self.assertFalse(valid_user(user))
+
+    def test_apply_persists_original_paths(self):
+        store = LikeOverlays(self.overlay_dir, [('/photos', '/mnt')])
+        wanted = {self.image('/mnt', '1.jpg'): True, self.image('/mnt', '3.jpg'): False}
+        self.assertEqual(store.apply(self.json_path, 'alice', wanted), 1)
+        self.assertEqual(store.apply(self.json_path, 'alice', wanted), 0)
+        self.assertEqual(store.version(self.json_path, 'alice'), 1)
+        with open(store.path(self.json_path, 'alice'), 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['liked'], [self.image('/photos', '1.jpg')])
+        # 重新加载时应用替换规则，其他用户互不影响
+        reloaded = LikeOverlays(self.overlay_dir, [('/photos', '/mnt')])
+        self.assertEqual(reloaded.liked(self.json_path, 'alice'), {self.image('/mnt', '1.jpg')})
+        self.assertEqual(reloaded.liked(self.json_path, 'bob'), set())
+
+    def test_merge_consensus_votes(self):
+        store = LikeOverlays(self.overlay_dir, [])
+        store.apply(self.json_path, 'alice', {self.image('/photos', '1.jpg'): True, self.image('/photos', '3.jpg'): True})
+        store.apply(self.json_path, 'bob', {self.image('/photos', '1.jpg'): True})
+        votes = count_votes(self.overlay_dir, self.json_path)
+        self.assertEqual(votes[self.image('/photos', '1.jpg')], 2)
+        self.assertEqual(count_votes(self.overlay_dir, self.json_path, ['bob'])[self.image('/photos', '3.jpg')], 0)
+        tree = self.data['img']['/photos']['cat']
+        self.assertEqual(merge_votes(self.data['img'], votes, 2), {'liked': 1, 'unliked': 0})
+        self.assertTrue(tree['1.jpg']['like'])
+        self.assertTrue(tree['2.jpg']['like'])
+        self.assertEqual(merge_votes(self.data['img'], votes, 2, reset=True), {'liked': 0, 'unliked': 1})
+        self.assertFalse(tree['2.jpg']['like'])
+
+    def test_cli(self):
+        LikeOverlays(self.overlay_dir, []).apply(self.json_path, 'alice', {self.image('/photos', '3.jpg'): True})
+        argv = ['overlays.py', '--input_json', self.json_path, '--overlay_dir', self.overlay_dir]
+        with patch.object(sys, 'argv', argv), patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            overlays.main()
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            tree = json.load(f)['img']['/photos']['cat']
+        self.assertTrue(tree['3.jpg']['like'])
+        self.assertIn("'liked': 1", stdout.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
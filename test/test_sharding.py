@@ -0,0 +1,114 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import threading
+from collections import OrderedDict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_index import ImageIndex
+from sharding import ShardedIndex, split_json, is_manifest
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        self.data = {
+            'version': 1,
+            'img': {
+                self.base: {
+                    'root.jpg': {'face_scores': [0.5]},
+                    'a': {
+                        'a1.jpg': {'face_scores': [0.7]},
+                        'deep': {'d1.jpg': {'face_scores': [0.1], 'like': True}}
+                    },
+                    'b': {
+                        'b1.jpg': {'face_scores': [0.9], 'like': True},
+                        'unscored.jpg': {'face_scores': []}
+                    },
+                    'c': {'only_unscored.jpg': {'face_scores': []}}
+                }
+            }
+        }
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+        self.reads = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_json(self, path):
+        self.reads.append(os.path.basename(path))
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def make_index(self, by='top', max_bytes=0, busy=lambda path: False):
+        manifest_path = split_json(self.json_path, os.path.join(self.tmp.name, 'out'), by)
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.assertTrue(is_manifest(manifest))
+        return ShardedIndex(manifest_path, manifest, self.read_json, threading.Lock(), busy, max_bytes)
+
+    def test_split_by_top_level_directory(self):
+        index = self.make_index()
+        self.assertEqual(index.raw_data['shards'], [f'shards/{i:05d}.json' for i in range(4)])
+        self.assertEqual(index.raw_data['meta'], {'version': 1})
+        # 只有未评分图片的目录不作为分类，但仍写入分片
+        self.assertEqual(list(index.category_map), ['photos', 'a', 'a/deep', 'b'])
+        self.assertEqual(self.reads, [])
+
+    def test_lazy_maps_match_memory_index(self):
+        expected = ImageIndex(self.data)
+        for by in ('top', 'category'):
+            self.reads = []
+            index = self.make_index(by)
+            self.assertEqual(index.category_map['b'], expected.category_map['b'])
+            self.assertEqual(len(self.reads), 1)
+            self.assertEqual(dict(index.category_map), dict(expected.category_map))
+            self.assertEqual(dict(index.file_map), expected.file_map)
+            self.assertEqual(index.image_count(), expected.image_count())
+            self.assertEqual(index.category_map.first_image('a')['filename'], 'a1.jpg')
+            self.assertEqual(index.category_map.first_image('a')['path'], expected.category_map['a'][0]['path'])
+
+    def test_shards_for_path(self):
+        index = self.make_index('category')
+        shard = index.shards_for_path(os.path.join(self.base, 'a', 'deep', 'd1.jpg'))
+        self.assertEqual(shard, [index.shard_path(index.raw_data['shards'][2])])
+        self.assertEqual(index.shards_for_path('/elsewhere/x.jpg'), [])
+
+    def test_loaded_shards_bounded(self):
+        busy = set()
+        index = self.make_index('category', max_bytes=1, busy=lambda path: path in busy)
+        index.category_map['a']
+        busy.add(index.shards_for_path(os.path.join(self.base, 'a', 'a1.jpg'))[0])
+        index.category_map['b']
+        index.category_map['photos']
+        # 超出上限时逐出最久未使用的分片，有待保存数据的分片保留
+        self.assertEqual(len(index.shards), 2)
+        self.assertIn(next(iter(busy)), index.shards)
+
+    def test_shard_evicted_during_fast_path_reloaded(self):
+        index = self.make_index('category')
+        index.category_map['b']
+        shard_path = index.shards_for_path(os.path.join(self.base, 'b', 'b1.jpg'))[0]
+
+        class EvictingShards(OrderedDict):
+            # 模拟另一线程在 get 与 move_to_end 之间逐出分片
+            def get(self, key, default=None):
+                value = super().get(key, default)
+                if value is not None and not evicted:
+                    evicted.append(self.pop(key))
+                return value
+
+        evicted = []
+        index.shards = EvictingShards(index.shards)
+        self.reads = []
+        shard = index.load_shard(shard_path)
+        self.assertEqual(len(evicted), 1)
+        self.assertEqual(self.reads, [os.path.basename(shard_path)])
+        self.assertIs(index.shards[shard_path], shard)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sprites import SpriteCache
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+@unittest.skipIf(Image is None, 'Pillow is not installed')
+class TestSpriteCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = SpriteCache(os.path.join(self.tmp.name, 'sprites'), max_bytes=0, workers=1, tile=20, columns=3)
+        self.addCleanup(self.cache.executor.shutdown)
+        colors = ['red', 'green', 'blue', 'yellow']
+        self.sources = [self.make_image(f'{color}.jpg', color) for color in colors]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_image(self, name, color, size=(80, 40)):
+        path = os.path.join(self.tmp.name, name)
+        Image.new('RGB', size, color).save(path, format='JPEG')
+        return path
+
+    def build(self, sources):
+        self.assertIsNone(self.cache.lookup(sources))
+        self.cache.wait_idle()
+        return self.cache.lookup(sources)
+
+    def test_sprite_layout(self):
+        sources = self.sources + [os.path.join(self.tmp.name, 'gone.jpg')]
+        sprite = self.build(sources)
+        self.assertEqual(sprite['tiles'][0], {'size': '300% 200%', 'position': '0% 0%'})
+        self.assertEqual(sprite['tiles'][2]['position'], '100% 0%')
+        self.assertEqual(sprite['tiles'][3]['position'], '0% 100%')
+        # 不存在的缩略图位置留空，页面中单独请求
+        self.assertIsNone(sprite['tiles'][4])
+        with Image.open(os.path.join(self.cache.cache_dir, sprite['name'])) as sheet:
+            self.assertEqual(sheet.size, (60, 40))
+            # 居中裁剪为正方形瓦片
+            red, green = sheet.getpixel((10, 10)), sheet.getpixel((30, 10))
+            self.assertGreater(red[0], 200)
+            self.assertGreater(green[1], 100)
+            self.assertLess(green[0], 50)
+
+    def test_changed_thumbnail_invalidates_sprite(self):
+        sprite = self.build(self.sources)
+        self.assertEqual(self.cache.lookup(self.sources), sprite)
+        self.make_image('red.jpg', 'black', (90, 40))
+        self.assertIsNone(self.cache.lookup(self.sources))
+        self.cache.wait_idle()
+        self.assertNotEqual(self.cache.lookup(self.sources)['name'], sprite['name'])
+        # 分类顺序变化（翻页、分类增删）也对应不同的拼图
+        self.assertIsNone(self.cache.lookup(self.sources[::-1]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import threading
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_index import ImageIndex
+import sqlite_store
+from sqlite_store import SqliteStore
+
+class TestSqliteStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        self.data = {
+            'version': 1,
+            'img': {
+                self.base: {
+                    'root.jpg': {'face_scores': [0.5], 'face_landmark_scores_68': [0.1]},
+                    'b': {
+                        'b1.jpg': {'face_scores': [0.9], 'like': True, 'extra': 'x'},
+                        'empty.jpg': {'face_scores': []},
+                        'b2.jpg': {'face_scores': [0.3], 'like': False}
+                    },
+                    'a': {'a1.jpg': {'face_scores': [0.7]}}
+                }
+            },
+            'date_updated': '2025-03-18T13:51:59+00:00'
+        }
+        self.write_json(self.data)
+        self.store = SqliteStore(os.path.join(self.tmp.name, 'store.db'))
+        self.reads = 0
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def write_json(self, data):
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def read_json(self, json_path):
+        self.reads += 1
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_import_reused_until_file_changes(self):
+        file_id = self.store.import_json(self.json_path, self.read_json, [])
+        self.assertEqual(self.store.import_json(self.json_path, self.read_json, []), file_id)
+        self.assertEqual(self.reads, 1)
+        # 替换规则变化或文件被改写时重新导入
+        self.store.import_json(self.json_path, self.read_json, [('x', 'y')])
+        self.assertEqual(self.reads, 2)
+        self.data['img'][self.base]['c.jpg'] = {'face_scores': [0.2]}
+        self.write_json(self.data)
+        file_id = self.store.import_json(self.json_path, self.read_json, [('x', 'y')])
+        self.assertEqual(self.reads, 3)
+        self.assertEqual(self.store.image_count(file_id), 5)
+
+    def test_pages_match_memory_index(self):
+        file_id = self.store.import_json(self.json_path, self.read_json, [])
+        index = ImageIndex(self.read_json(self.json_path))
+        self.assertEqual(self.store.categories(file_id), sorted(index.category_map))
+        self.assertEqual(self.store.page_images(file_id, 'b', 1, 20)[0], index.category_map['b'])
+        all_images = [img for cat in sorted(index.category_map) for img in index.category_map[cat]]
+        self.assertEqual(self.store.page_images(file_id, None, 2, 2), (all_images[2:4], 4))
+        self.assertEqual(self.store.first_image(file_id, 'photos')['filename'], 'root.jpg')
+        self.assertFalse(self.store.has_category(file_id, 'missing'))
+
+    def test_shuffled_pages_stable_per_seed(self):
+        self.data['img'][self.base]['c'] = {f'c{i}.jpg': {'face_scores': [0.5]} for i in range(30)}
+        self.write_json(self.data)
+        file_id = self.store.import_json(self.json_path, self.read_json, [])
+        all_images, total = self.store.page_images(file_id, '_unfavorites', 1, 100, seed='42')
+        self.assertEqual(total, 33)
+        unseeded = self.store.page_images(file_id, '_unfavorites', 1, 100)[0]
+        self.assertCountEqual([img['path'] for img in all_images], [img['path'] for img in unseeded])
+        self.assertNotEqual(all_images, unseeded)
+        # 同一种子下逐页读取与一次读取的顺序相同，不同种子顺序不同
+        pages = [img for page in range(1, 5) for img in self.store.page_images(file_id, '_unfavorites', page, 10,
+                                                                               seed='42')[0]]
+        self.assertEqual(pages, all_images)
+        self.assertNotEqual(self.store.page_images(file_id, '_unfavorites', 1, 100, seed='7')[0], all_images)
+        self.assertEqual(self.store.page_images(file_id, '_unfavorites', 1, 100, seed='abc')[0],
+                         self.store.page_images(file_id, '_unfavorites', 1, 100, seed='abc')[0])
+
+    def test_set_like_updates_single_row(self):
+        file_id = self.store.import_json(self.json_path, self.read_json, [])
+        root = os.path.join(self.base, 'root.jpg')
+        found, not_found = self.store.set_like(file_id, [root, '/missing.jpg'], True, '2026-01-01T00:00:00')
+        self.assertEqual((found, not_found), ([root], ['/missing.jpg']))
+        favorites, total = self.store.page_images(file_id, '_favorites', 1, 20)
+        self.assertEqual(total, 2)
+        self.assertEqual({img['filename'] for img in favorites}, {'root.jpg', 'b1.jpg'})
+
+    def test_export_round_trip_reverses_replace_rules(self):
+        rules = [(self.base, '/srv/photos')]
+        replaced = json.loads(json.dumps(self.data).replace(self.base, '/srv/photos'))
+        file_id = self.store.import_json(self.json_path, lambda path: replaced, rules)
+        self.store.set_like(file_id, ['/srv/photos/b/b2.jpg'], True, '2026-01-01T00:00:00')
+        output = os.path.join(self.tmp.name, 'out.json')
+        self.store.export_json(self.json_path, output, rules)
+        with open(output, 'r', encoding='utf-8') as f:
+            exported = json.load(f)
+        expected = json.loads(json.dumps(self.data))
+        expected['img'][self.base]['b']['b2.jpg']['like'] = True
+        expected['date_updated'] = '2026-01-01T00:00:00'
+        self.assertEqual(exported, expected)
+        self.assertEqual(list(exported), list(self.data))
+        self.assertEqual(list(exported['img'][self.base]), ['root.jpg', 'b', 'a'])
+
+    def test_export_in_place_does_not_trigger_reimport(self):
+        self.store.import_json(self.json_path, self.read_json, [])
+        self.store.export_json(self.json_path, self.json_path, [])
+        self.store.import_json(self.json_path, self.read_json, [])
+        self.assertEqual(self.reads, 1)
+
+    def test_reimport_keeps_unexported_likes(self):
+        file_id = self.store.import_json(self.json_path, self.read_json, [])
+        root = os.path.join(self.base, 'root.jpg')
+        b1 = os.path.join(self.base, 'b', 'b1.jpg')
+        self.store.set_like(file_id, [root], True, '2026-01-01T00:00:00')
+        self.store.set_like(file_id, [b1], False, '2026-01-01T00:00:00')
+        # JSON 被外部改写后重新导入，数据库中未导出的点赞不丢失
+        self.data['img'][self.base]['c.jpg'] = {'face_scores': [0.2], 'like': True}
+        self.data['img'][self.base]['b']['b2.jpg']['like'] = True
+        self.write_json(self.data)
+        file_id = self.store.import_json(self.json_path, self.read_json, [])
+        self.assertEqual(self.reads, 2)
+        favorites = self.store.page_images(file_id, '_favorites', 1, 20)[0]
+        self.assertEqual({img['filename'] for img in favorites}, {'root.jpg', 'b2.jpg', 'c.jpg'})
+        # 导出回原文件后不再视为未导出，之后的重新导入以 JSON 为准
+        self.store.export_json(self.json_path, self.json_path, [])
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            exported = json.load(f)
+        exported['img'][self.base]['root.jpg']['like'] = False
+        exported['extra'] = 1
+        self.write_json(exported)
+        file_id = self.store.import_json(self.json_path, self.read_json, [])
+        favorites = self.store.page_images(file_id, '_favorites', 1, 20)[0]
+        self.assertEqual({img['filename'] for img in favorites}, {'b2.jpg', 'c.jpg'})
+
+    def test_connections_reused_across_threads(self):
+        """测试每个请求一个线程时复用池中的连接，并发连接数不超过上限"""
+        file_id = self.store.import_json(self.json_path, self.read_json, [])
+        store = SqliteStore(self.store.db_path, pool_size=2)
+        self.addCleanup(store.close)
+        opened = []
+        connect = sqlite_store.sqlite3.connect
+        with patch.object(sqlite_store.sqlite3, 'connect',
+                          side_effect=lambda *a, **kw: opened.append(1) or connect(*a, **kw)):
+            for _ in range(5):
+                thread = threading.Thread(target=store.page_images, args=(file_id, None, 1, 2))
+                thread.start()
+                thread.join()
+            self.assertEqual(len(opened), 0)
+            threads = [threading.Thread(target=store.page_images, args=(file_id, '_favorites', 1, 2, 'x'))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertLessEqual(len(opened), 1)
+        self.assertEqual(store.page_images(file_id, 'b', 1, 10)[1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
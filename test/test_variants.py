@@ -0,0 +1,100 @@
+import unittest
+import sys
+import os
+import tempfile
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from variants import VariantCache, VARIANT_FORMATS, available_formats
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+WEBP = [fmt for fmt in VARIANT_FORMATS if fmt[0] == 'webp']
+
+
+def accept(value):
+    return parse_accept_header(value, MIMEAccept)
+
+
+class TestVariantCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, 'variants')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_cache(self, formats=VARIANT_FORMATS, max_bytes=0):
+        cache = VariantCache(self.cache_dir, max_bytes=max_bytes, workers=2, formats=list(formats))
+        self.addCleanup(cache.executor.shutdown)
+        return cache
+
+    def make_image(self, name, size=(256, 256)):
+        path = os.path.join(self.tmp.name, name)
+        # 噪声图片的 PNG 体积大，WebP 有损编码一定更小
+        Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(path, format='PNG')
+        return path
+
+    def test_negotiate_uses_explicit_types_only(self):
+        cache = self.make_cache()
+        self.assertEqual(cache.negotiate(accept('image/avif,image/webp,*/*'))[0], 'avif')
+        self.assertEqual(cache.negotiate(accept('image/webp,image/avif;q=0'))[0], 'webp')
+        self.assertIsNone(cache.negotiate(accept('image/*,*/*;q=0.8')))
+        self.assertIsNone(self.make_cache(WEBP).negotiate(accept('image/avif')))
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_variant_generated_in_background(self):
+        cache = self.make_cache(WEBP)
+        source = self.make_image('noise.png')
+        # 首次请求发送原图，转码完成后发送变体
+        self.assertIsNone(cache.lookup(source, accept('image/webp')))
+        cache.wait_idle()
+        name, mimetype = cache.lookup(source, accept('image/webp'))
+        self.assertEqual(mimetype, 'image/webp')
+        with Image.open(os.path.join(self.cache_dir, name)) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (256, 256)))
+        self.assertIsNone(cache.lookup(source, accept('image/png')))
+        # 原图修改后变体失效
+        self.make_image('noise.png', (128, 128))
+        self.assertIsNone(cache.lookup(source, accept('image/webp')))
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_unusable_source_writes_marker(self):
+        cache = self.make_cache(WEBP)
+        source = os.path.join(self.tmp.name, 'broken.jpg')
+        with open(source, 'wb') as f:
+            f.write(b'not an image')
+        cache.lookup(source, accept('image/webp'))
+        cache.wait_idle()
+        self.assertEqual(list(cache.entries.values()), [0])
+        self.assertIsNone(cache.lookup(source, accept('image/webp')))
+        self.assertEqual(cache.pending, set())
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_cache_bounded_and_reloaded(self):
+        cache = self.make_cache(WEBP, max_bytes=1)
+        sources = [self.make_image(f'noise{i}.png', (64, 64)) for i in range(3)]
+        for source in sources:
+            cache.lookup(source, accept('image/webp'))
+            cache.wait_idle()
+        # 超出上限时清理最久未使用的变体
+        self.assertEqual(len(cache.entries), 1)
+        self.assertEqual(os.listdir(self.cache_dir), list(cache.entries))
+        self.assertIsNotNone(cache.lookup(sources[-1], accept('image/webp')))
+        # 重启后沿用磁盘上的变体
+        self.assertIsNotNone(self.make_cache(WEBP).lookup(sources[-1], accept('image/webp')))
+
+    def test_available_formats(self):
+        formats = available_formats(['webp'])
+        if Image is None:
+            self.assertEqual(formats, [])
+        else:
+            self.assertEqual([fmt[0] for fmt in formats], ['webp'])
+
+if __name__ == '__main__':
+    unittest.main()
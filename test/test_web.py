@@ -6,11 +6,17 @@ from flask import json as flask_json, Response
 import argparse
 from collections import defaultdict
 from urllib.parse import quote
+import io
 import json
 import threading
+import tempfile
+import time
 from queue import Queue, Empty
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import web
+import image_index
+import sidecar
 from web import WebApp
 
 class BaseTestCase(unittest.TestCase):
@@ -383,6 +389,44 @@ class TestWebAppImageLiking(BaseTestCase):
                 self.web_app.cached_raw_data[json_path]['img'][mock_base]['image.jpg']['like']
             )
 
+    def test_like_image_batched_changes(self):
+        """测试前端合并的批量修改：同一路径以最后一次为准，只排队一次保存"""
+        json_path = 'test.json'
+        mock_base = os.path.abspath('mock_base')
+        self.web_app.cached_raw_data[json_path] = {
+            'img': {mock_base: {'a.jpg': {'like': False}, 'b.jpg': {'like': True}}}
+        }
+        a_path, b_path = os.path.join(mock_base, 'a.jpg'), os.path.join(mock_base, 'b.jpg')
+        with patch.object(self.web_app, 'queue_save') as mock_save:
+            with self.web_app.app.test_client() as client:
+                response = client.post('/like_image', json={'changes': [
+                    {'path': a_path, 'like': True},
+                    {'path': b_path, 'like': False},
+                    {'path': a_path, 'like': False},
+                    {'path': a_path, 'like': True},
+                    {'path': os.path.join(mock_base, 'gone.jpg'), 'like': True}
+                ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['action'], 'batch')
+        self.assertEqual(response.json['found'], [a_path, b_path])
+        self.assertEqual(len(response.json['not_found']), 1)
+        img = self.web_app.cached_raw_data[json_path]['img'][mock_base]
+        self.assertEqual((img['a.jpg']['like'], img['b.jpg']['like']), (True, False))
+        mock_save.assert_called_once()
+
+    def test_like_image_invalid_changes(self):
+        """测试格式错误的批量修改"""
+        with self.web_app.app.test_client() as client:
+            response = client.post('/like_image', json={'changes': [{'like': True}]})
+            self.assertEqual(response.status_code, 400)
+            # 路径不是字符串（不可哈希）或 like 不是布尔值时同样返回 400，而不是 500
+            for change in ({'path': ['a.jpg'], 'like': True}, {'path': {'p': 1}, 'like': True},
+                           {'path': 1, 'like': True}, {'path': 'a.jpg'}, {'path': 'a.jpg', 'like': 'yes'}):
+                response = client.post('/like_image', json={'changes': [change]})
+                self.assertEqual(response.status_code, 400, change)
+            response = client.post('/like_image', json={'changes': ['a.jpg']})
+            self.assertEqual(response.status_code, 400)
+
     def test_concurrent_like_requests(self):
         """模拟并发点赞请求验证线程安全"""
         json_path = 'test.json'
@@ -1193,6 +1237,67 @@ class TestWebAppConcurrency(BaseTestCase):
             self.web_app.cached_raw_data[json_path]['img'][mock_base]['image.jpg']['like']
         )
 
+    def test_reads_not_blocked_by_writer(self):
+        """测试写线程持有data_lock（如保存中）时读请求仍可并行完成"""
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, 'a.jpg'), 'wb') as f:
+                f.write(b'x' * 10)
+            self.web_app.cached_raw_data['test.json'] = {'img': {tmp: {'a.jpg': {'face_scores': [1]}}}}
+            url = f'/image/{os.path.basename(tmp)}/a.jpg'
+            with self.web_app.app.test_request_context():
+                self.web_app.load_image_data()
+            statuses = []
+
+            def reader():
+                client = self.web_app.app.test_client()
+                for _ in range(20):
+                    response = client.get(url)
+                    statuses.append(response.status_code)
+                    response.close()
+
+            with self.web_app.data_lock:
+                threads = [threading.Thread(target=reader) for _ in range(4)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join(timeout=5)
+                self.assertFalse(any(t.is_alive() for t in threads))
+            self.assertEqual(statuses, [200] * 80)
+
+    def test_queued_saves_coalesced(self):
+        """测试同一文件排队的多次保存只写入最后一次"""
+        self.web_app.save_thread_running = False
+        self.web_app.save_consumer_thread.join()
+        mock_base = os.path.abspath('mock_base')
+        self.web_app.cached_raw_data['test.json'] = {
+            'img': {mock_base: {f'{i}.jpg': {'face_scores': [1], 'like': False} for i in range(5)}}
+        }
+        with self.web_app.app.test_client() as client:
+            for i in range(5):
+                client.post('/like_image', json={'path': os.path.join(mock_base, f'{i}.jpg')})
+        with patch.object(self.web_app, 'write_json_file') as mock_write:
+            self.web_app.save_thread_running = True
+            consumer = threading.Thread(target=self.web_app.save_consumer, daemon=True)
+            consumer.start()
+            self.web_app.save_queue.join()
+            self.web_app.save_thread_running = False
+            mock_write.assert_called_once()
+            saved = mock_write.call_args[0][1]
+            self.assertTrue(all(node['like'] for node in saved['img'][mock_base].values()))
+        self.assertEqual(self.web_app.saves_coalesced.get(), 4)
+        self.assertEqual(self.web_app.pending_saves['test.json'], 0)
+
+    def test_write_json_file_reverses_rules_outside_lock(self):
+        """测试保存时替换规则被还原并原子写入"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.json')
+            self.web_app.write_json_file(path, {'key': 'new value', '名称': '中文'})
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            self.assertEqual(json.loads(text), {'key': 'old value', '名称': '中文'})
+            self.assertIn('中文', text)
+            self.assertFalse(os.path.exists(path + '.tmp'))
+
 
 class TestWebAppTemplateData(BaseTestCase):
     @patch('web.render_template')
@@ -1208,5 +1313,1422 @@ class TestWebAppTemplateData(BaseTestCase):
             self.assertEqual(kwargs['total_images'], 25)
 
 
+class TestWebAppWarmup(BaseTestCase):
+    def write_json(self, directory, name, base):
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {base: {'img.jpg': {'face_scores': [0.9]}}}}, f)
+        return path
+
+    def test_warmup_loads_all_files(self):
+        """测试启动预热并行加载所有JSON文件"""
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [self.write_json(tmp, f'{i}.json', f'base{i}') for i in range(3)]
+            args = argparse.Namespace(per_page=20, input_json=paths, replace=None, warmup_workers=2)
+            web_app = WebApp(args)
+            deadline = time.time() + 5
+            while time.time() < deadline and any(
+                    web_app.warmup_state.get(p) != 'ready' for p in paths):
+                time.sleep(0.01)
+            for path in paths:
+                self.assertEqual(web_app.warmup_state[path], 'ready')
+                self.assertIn(path, web_app.index_cache)
+            with web_app.app.test_client() as client:
+                response = client.get('/ready')
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.json['ready'])
+                self.assertEqual(response.json['loaded'], 3)
+
+    def test_warming_file_returns_503(self):
+        """测试预热中的文件快速返回503而不阻塞"""
+        del self.web_app.cached_raw_data['test.json']
+        self.web_app.warmup_state['test.json'] = 'loading'
+        with self.web_app.app.test_client() as client:
+            response = client.get('/all')
+            self.assertEqual(response.status_code, 503)
+            self.assertIn('Retry-After', response.headers)
+            response = client.get('/ready')
+            self.assertEqual(response.status_code, 503)
+            self.assertFalse(response.json['ready'])
+
+    def test_concurrent_load_returns_warming(self):
+        """测试预热期间同一文件正在加载时其他请求返回预热中"""
+        del self.web_app.cached_raw_data['test.json']
+        self.web_app.warmup_state['test.json'] = 'loading'
+        load_lock = self.web_app.load_locks.setdefault('test.json', threading.Lock())
+        with load_lock:
+            with patch.object(self.web_app, 'get_image_index', side_effect=self.web_app.load_image_index):
+                with self.web_app.app.test_client() as client:
+                    response = client.post('/like_image', json={'path': 'a.jpg'})
+                    self.assertEqual(response.status_code, 503)
+
+    def test_concurrent_load_waits_after_warmup(self):
+        """测试预热关闭或已结束时，同一文件正在加载的其他请求等待加载完成而不是返回503"""
+        del self.web_app.cached_raw_data['test.json']
+        for state in (None, 'ready'):
+            self.web_app.warmup_state.pop('test.json', None)
+            if state:
+                self.web_app.warmup_state['test.json'] = state
+            load_lock = self.web_app.load_locks.setdefault('test.json', threading.Lock())
+            self.web_app.cached_raw_data.pop('test.json', None)
+            self.web_app.index_cache.pop('test.json', None)
+            load_lock.acquire()
+
+            def finish_load():
+                # 模拟另一个线程完成加载后释放锁
+                self.web_app.cached_raw_data['test.json'] = {'img': {'/base': {'a.jpg': {'face_scores': [0.9]}}}}
+                load_lock.release()
+
+            timer = threading.Timer(0.1, finish_load)
+            timer.start()
+            with self.web_app.app.test_client() as client:
+                response = client.post('/like_image', json={'path': '/base/a.jpg'})
+            timer.join()
+            self.assertEqual(response.status_code, 200)
+
+    def test_index_reused_between_requests(self):
+        """测试索引构建一次后被复用，点赞同步更新索引"""
+        mock_base = os.path.abspath('mock_base')
+        self.web_app.cached_raw_data['test.json'] = {
+            'img': {mock_base: {'image.jpg': {'face_scores': [1], 'like': False}}}
+        }
+        with self.web_app.app.test_request_context():
+            first, _ = self.web_app.load_image_data()
+            second, _ = self.web_app.load_image_data()
+        self.assertIs(first, second)
+        with self.web_app.app.test_client() as client:
+            client.post('/like_image', json={'path': os.path.join(mock_base, 'image.jpg')})
+        self.assertTrue(first['mock_base'][0]['like'])
+
+
+class TestWebAppMetrics(BaseTestCase):
+    def test_metrics_endpoint_counts_routes(self):
+        """测试/metrics输出按路由统计的请求数与延迟直方图"""
+        self.web_app.load_image_data = MagicMock(return_value=(defaultdict(list), {}))
+        with self.web_app.app.test_client() as client:
+            client.get('/all')
+            client.get('/all?page=2')
+            client.get('/image/cat/missing.jpg')
+            response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('img_display_http_requests_total{route="/all",method="GET",status="200"} 2', text)
+        self.assertIn('route="/image/<category>/<path:filename>",method="GET",status="404"', text)
+        self.assertIn('img_display_http_request_duration_seconds_count{route="/all"} 2', text)
+        self.assertIn('img_display_save_queue_depth 0', text)
+
+    def test_metrics_track_index_cache_and_bytes(self):
+        """测试索引缓存命中、加载耗时与图片发送字节数"""
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, 'a.jpg'), 'wb') as f:
+                f.write(b'x' * 100)
+            self.web_app.cached_raw_data['test.json'] = {'img': {tmp: {'a.jpg': {'face_scores': [1]}}}}
+            category = os.path.basename(tmp)
+            with self.web_app.app.test_client() as client:
+                client.get(f'/image/{category}/a.jpg').close()
+                client.get(f'/image/{category}/a.jpg').close()
+        self.assertEqual(self.web_app.cache_requests.get(cache='index', result='miss'), 1)
+        self.assertEqual(self.web_app.cache_requests.get(cache='index', result='hit'), 1)
+        self.assertEqual(self.web_app.index_build_seconds.get(), 1)
+        self.assertEqual(self.web_app.image_bytes_served.get(), 200)
+
+
+class TestWebAppProfiling(BaseTestCase):
+    def make_profiled_app(self, profile_dir, threshold_ms=0, secret=None, keep=50, sample_rate=1):
+        args = argparse.Namespace(per_page=20, input_json=['test.json'], replace=None,
+                                  profile_dir=profile_dir, profile_threshold_ms=threshold_ms,
+                                  profile_secret=secret, profile_keep=keep, profile_sample_rate=sample_rate)
+        web_app = WebApp(args)
+        web_app.app.testing = True
+        web_app.load_image_data = MagicMock(return_value=(defaultdict(list), {}))
+        return web_app
+
+    def test_slow_request_profile_saved_with_route(self):
+        """测试超过阈值的请求保存分析文件，文件名包含路由与参数"""
+        with tempfile.TemporaryDirectory() as tmp:
+            web_app = self.make_profiled_app(tmp, threshold_ms=0, secret='s3cret')
+            with web_app.app.test_client() as client:
+                client.get('/all?page=2')
+                response = client.get('/_profiles', headers={'X-Profile-Secret': 's3cret'})
+                self.assertEqual(response.status_code, 200)
+            names = os.listdir(tmp)
+            self.assertEqual(len(names), 1)
+            self.assertIn('_all_page=2_', names[0])
+            self.assertIn(names[0], response.get_data(as_text=True))
+
+    def test_fast_request_skipped_unless_secret(self):
+        """测试快速请求不记录，携带密钥头时强制记录"""
+        with tempfile.TemporaryDirectory() as tmp:
+            web_app = self.make_profiled_app(tmp, threshold_ms=60000, secret='s3cret')
+            with web_app.app.test_client() as client:
+                client.get('/all')
+                self.assertEqual(os.listdir(tmp), [])
+                client.get('/all', headers={'X-Profile-Secret': 's3cret'})
+                self.assertEqual(len(os.listdir(tmp)), 1)
+                self.assertEqual(client.get('/_profiles').status_code, 403)
+                # 密钥只接受请求头，查询参数中的密钥会出现在日志与 Referer 中
+                self.assertEqual(client.get('/_profiles?secret=s3cret').status_code, 403)
+                self.assertEqual(client.get('/_profiles', headers={'X-Profile-Secret': 's3cre'}).status_code, 403)
+                response = client.get('/_profiles/' + os.listdir(tmp)[0] + '?format=text',
+                                      headers={'X-Profile-Secret': 's3cret'})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('function calls', response.get_data(as_text=True))
+
+    def test_unsampled_request_not_profiled(self):
+        """测试未抽样的请求不运行 cProfile，携带密钥头时仍然分析"""
+        with tempfile.TemporaryDirectory() as tmp:
+            web_app = self.make_profiled_app(tmp, threshold_ms=0, secret='s3cret', sample_rate=0)
+            with patch.object(web_app.profiler, 'start', wraps=web_app.profiler.start) as mock_start:
+                with web_app.app.test_client() as client:
+                    client.get('/all')
+                    self.assertEqual(mock_start.call_count, 0)
+                    client.get('/all', headers={'X-Profile-Secret': 's3cret'})
+                    self.assertEqual(mock_start.call_count, 1)
+            self.assertEqual(len(os.listdir(tmp)), 1)
+
+    def test_profiles_page_requires_secret(self):
+        """测试未设置密钥时不注册管理页面"""
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertLogs(level='WARNING'):
+                web_app = self.make_profiled_app(tmp, threshold_ms=0)
+            with web_app.app.test_client() as client:
+                client.get('/all')
+                self.assertEqual(len(os.listdir(tmp)), 1)
+                self.assertEqual(client.get('/_profiles').status_code, 404)
+                self.assertEqual(client.get('/_profiles/' + os.listdir(tmp)[0]).status_code, 404)
+
+    def test_profiles_rotate(self):
+        """测试分析目录只保留最近的文件"""
+        with tempfile.TemporaryDirectory() as tmp:
+            web_app = self.make_profiled_app(tmp, threshold_ms=0, keep=2)
+            with web_app.app.test_client() as client:
+                for page in range(4):
+                    client.get(f'/all?page={page}')
+            self.assertEqual(len(os.listdir(tmp)), 2)
+
+    def test_profiling_disabled_by_default(self):
+        with self.web_app.app.test_client() as client:
+            self.assertEqual(client.get('/_profiles').status_code, 404)
+
+
+class TestWebAppCacheBudget(BaseTestCase):
+    def make_budget_app(self, tmp, count=3, sidecar=True):
+        paths = []
+        for i in range(count):
+            path = os.path.join(tmp, f'{i}.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'img': {f'/base{i}': {f'img{n}.jpg': {'face_scores': [0.5]} for n in range(10)}}}, f)
+            paths.append(path)
+        args = argparse.Namespace(per_page=20, input_json=paths, replace=None, cache_mb=0,
+                                  sidecar_dir=os.path.join(tmp, 'sidecar') if sidecar else None)
+        web_app = WebApp(args)
+        # 预算只够容纳一个文件
+        web_app.cache_budget = int(web_app.get_image_index(paths[0]).approx_bytes * 1.5)
+        return web_app, paths
+
+    def test_lru_file_evicted_over_budget(self):
+        """测试超出内存预算时逐出最久未使用的文件"""
+        with tempfile.TemporaryDirectory() as tmp:
+            web_app, paths = self.make_budget_app(tmp)
+            web_app.get_image_index(paths[1])
+            self.assertNotIn(paths[0], web_app.cached_raw_data)
+            self.assertIn(paths[1], web_app.index_cache)
+            self.assertEqual(web_app.cache_evictions.get(), 1)
+            self.assertEqual(list(web_app.cache_lru), [paths[1]])
+
+    def test_evicted_file_reloaded_from_sidecar(self):
+        """测试被逐出的文件按需从旁路文件重新加载"""
+        with tempfile.TemporaryDirectory() as tmp:
+            web_app, paths = self.make_budget_app(tmp)
+            web_app.get_image_index(paths[1])
+            with patch.object(web_app, 'read_json_file') as mock_read:
+                index = web_app.get_image_index(paths[0])
+                mock_read.assert_not_called()
+            self.assertEqual(index.image_count(), 10)
+            self.assertEqual(web_app.cache_reloads.get(source='sidecar'), 1)
+            self.assertNotIn(paths[1], web_app.cached_raw_data)
+
+    def test_sidecar_written_outside_data_lock(self):
+        """测试逐出时在数据锁外写旁路文件，JSON随后被改写则旁路文件失效"""
+        with tempfile.TemporaryDirectory() as tmp:
+            web_app, paths = self.make_budget_app(tmp)
+            real_write = sidecar.write_sidecar
+            held = []
+
+            def write_after_change(*args):
+                held.append(web_app.data_lock.locked())
+                with open(paths[0], 'w', encoding='utf-8') as f:
+                    json.dump({'img': {'/base0': {'new.jpg': {'face_scores': [0.5]}}}}, f)
+                real_write(*args)
+
+            with patch('sidecar.write_sidecar', side_effect=write_after_change):
+                web_app.get_image_index(paths[1])
+            self.assertEqual(held, [False])
+            self.assertEqual(web_app.get_image_index(paths[0]).image_count(), 1)
+            self.assertEqual(web_app.cache_reloads.get(source='json'), 1)
+
+    def test_reload_after_external_rewrite_changes_etag(self):
+        """测试被逐出的文件在外部改写后重新加载，条件请求不再返回旧 ETag 的 304"""
+        for sidecar in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                web_app, paths = self.make_budget_app(tmp, sidecar=sidecar)
+                web_app.app.testing = True
+                url = f"/d/{web.json_file_id(paths[0])}/all"
+                with web_app.app.test_client() as client:
+                    old = client.get(url)
+                    self.assertIn('img0.jpg', old.get_data(as_text=True))
+                    web_app.get_image_index(paths[1])
+                    self.assertNotIn(paths[0], web_app.index_cache)
+                    with open(paths[0], 'w', encoding='utf-8') as f:
+                        json.dump({'img': {'/base0': {'new.jpg': {'face_scores': [0.5]}}}}, f)
+                    response = client.get(url, headers={'If-None-Match': old.headers['ETag']})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotEqual(response.headers['ETag'], old.headers['ETag'])
+                    self.assertIn('new.jpg', response.get_data(as_text=True))
+                    self.assertNotIn('img0.jpg', response.get_data(as_text=True))
+
+    def test_stale_sidecar_ignored(self):
+        """测试JSON文件被改写后旁路文件失效"""
+        with tempfile.TemporaryDirectory() as tmp:
+            web_app, paths = self.make_budget_app(tmp)
+            web_app.get_image_index(paths[1])
+            with open(paths[0], 'w', encoding='utf-8') as f:
+                json.dump({'img': {'/base0': {'new.jpg': {'face_scores': [0.5]}}}}, f)
+            index = web_app.get_image_index(paths[0])
+            self.assertEqual(index.image_count(), 1)
+            self.assertEqual(web_app.cache_reloads.get(source='json'), 1)
+
+    def test_pending_save_blocks_eviction(self):
+        """测试有待保存数据的文件不会被逐出"""
+        with tempfile.TemporaryDirectory() as tmp:
+            web_app, paths = self.make_budget_app(tmp, sidecar=False)
+            web_app.pending_saves[paths[0]] = 1
+            web_app.get_image_index(paths[1])
+            self.assertIn(paths[0], web_app.cached_raw_data)
+            self.assertEqual(web_app.cache_evictions.get(), 0)
+
+
+class TestWebAppSqliteStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        os.makedirs(os.path.join(self.base, 'cat'))
+        with open(os.path.join(self.base, 'cat', 'a.jpg'), 'wb') as f:
+            f.write(b'jpeg')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: {'cat': {
+                'a.jpg': {'face_scores': [0.5]},
+                'b.jpg': {'face_scores': [0.6], 'like': True}
+            }}}}, f)
+        args = argparse.Namespace(per_page=1, input_json=[self.json_path], replace=None,
+                                  sqlite_db=os.path.join(self.tmp.name, 'store.db'))
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    @patch('web.render_template', return_value='')
+    def test_views_served_from_store(self, mock_render):
+        """测试SQLite后端按页查询分类与图片"""
+        with self.web_app.app.test_client() as client:
+            self.assertEqual(client.get('/').status_code, 200)
+            self.assertEqual(mock_render.call_args[1]['categories'][0]['name'], 'cat')
+            self.assertEqual(client.get('/category/cat?page=2').status_code, 200)
+            kwargs = mock_render.call_args[1]
+            self.assertEqual([img['filename'] for img in kwargs['images']], ['b.jpg'])
+            self.assertEqual((kwargs['total_pages'], kwargs['total_images']), (2, 2))
+            self.assertEqual(client.get('/category/missing').status_code, 404)
+            response = client.get('/image/cat/a.jpg')
+            self.assertEqual(response.data, b'jpeg')
+            response.close()
+            self.assertEqual(client.get('/image/cat/c.jpg').status_code, 404)
+
+    def test_like_updates_store_without_json_save(self):
+        """测试SQLite后端点赞只更新数据库，不排队重写JSON"""
+        with patch.object(self.web_app, 'queue_save') as mock_save:
+            with self.web_app.app.test_client() as client:
+                response = client.post('/like_image', json={'path': os.path.join(self.base, 'cat', 'a.jpg')})
+                self.assertEqual(response.status_code, 200)
+                response = client.post('/like_image', json={'path': os.path.join(self.base, 'missing.jpg')})
+                self.assertEqual(response.status_code, 404)
+            mock_save.assert_not_called()
+        file_id = self.web_app.store_files[self.json_path]
+        images, total = self.web_app.store.page_images(file_id, '_favorites', 1, 10)
+        self.assertEqual(total, 2)
+
+    def test_missing_file_validation_disabled(self):
+        """测试SQLite后端不支持缺失校验，启动时警告并关闭"""
+        args = argparse.Namespace(per_page=1, input_json=[self.json_path], replace=None, validate_interval=60,
+                                  hide_missing=True, sqlite_db=os.path.join(self.tmp.name, 'store.db'))
+        with self.assertLogs(level='WARNING') as logs:
+            web_app = WebApp(args)
+        web_app.save_thread_running = False
+        self.assertEqual((web_app.validate_interval, web_app.hide_missing), (0, False))
+        self.assertTrue(any('--hide_missing disabled' in line for line in logs.output))
+        self.assertNotIn(self.json_path, self.web_app.cached_raw_data)
+
+    def test_batched_changes_in_store(self):
+        """测试SQLite后端按期望状态分组应用批量修改"""
+        a_path, b_path = os.path.join(self.base, 'cat', 'a.jpg'), os.path.join(self.base, 'cat', 'b.jpg')
+        with self.web_app.app.test_client() as client:
+            response = client.post('/like_image', json={'changes': [
+                {'path': a_path, 'like': True}, {'path': b_path, 'like': False}]})
+            self.assertEqual(sorted(response.json['found']), [a_path, b_path])
+        file_id = self.web_app.store_files[self.json_path]
+        images, _ = self.web_app.store.page_images(file_id, '_favorites', 1, 10)
+        self.assertEqual([img['filename'] for img in images], ['a.jpg'])
+
+    def test_export_from_store(self):
+        """测试SQLite后端逐行导出"""
+        def export(query):
+            response = client.get(f'/export?{query}')
+            return [(r['filename'], r['like']) for r in map(json.loads, response.get_data(as_text=True).splitlines())]
+
+        with self.web_app.app.test_client() as client:
+            self.assertEqual(export('view=_unfavorites'), [('a.jpg', False)])
+            client.post('/like_image', json={'path': os.path.join(self.base, 'cat', 'a.jpg')})
+            self.assertEqual(export('view=_unfavorites'), [])
+            self.assertEqual(export('view=cat'), [('a.jpg', True), ('b.jpg', True)])
+            self.assertEqual(client.get('/export?view=nope').status_code, 404)
+
+    def test_import_likes_into_store(self):
+        """测试SQLite后端在一个事务中导入点赞"""
+        a_path = os.path.join(self.base, 'cat', 'a.jpg')
+        body = '\n'.join([a_path, json.dumps({'path': os.path.join(self.base, 'cat', 'b.jpg'), 'action': 'unlike'}),
+                          os.path.join(self.base, 'nope.jpg')])
+        with self.web_app.app.test_client() as client:
+            summary = client.post('/import_likes', data=body).get_json()
+        self.assertEqual((summary['applied'], summary['liked'], summary['unliked'], summary['unknown']), (2, 1, 1, 1))
+        file_id = self.web_app.store_files[self.json_path]
+        images, _ = self.web_app.store.page_images(file_id, '_favorites', 1, 10)
+        self.assertEqual([img['filename'] for img in images], ['a.jpg'])
+
+    @patch('web.render_template', return_value='')
+    def test_tree_from_store(self, mock_render):
+        """测试SQLite后端的目录树计数与子树分页"""
+        with self.web_app.app.test_client() as client:
+            children = client.get('/tree/children').get_json()['children']
+            self.assertEqual([(c['path'], c['images'], c['likes']) for c in children], [('cat', 2, 1)])
+            client.get('/subtree/cat?page=2')
+            self.assertEqual([img['filename'] for img in mock_render.call_args[1]['images']], ['b.jpg'])
+
+    def test_readiness_reports_store_images(self):
+        """测试预热完成后 /ready 返回数据库中的图片数"""
+        with self.web_app.app.test_client() as client:
+            client.get('/')
+            data = client.get('/ready').get_json()
+        self.assertEqual(data['files'][0]['images'], 2)
+        self.assertEqual(data['files'][0]['state'], 'ready')
+
+
+class TestWebAppSharding(unittest.TestCase):
+    def setUp(self):
+        from sharding import split_json
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {'/old/photos': {
+                f'dir{i}': {f'{n}.jpg': {'face_scores': [0.5]} for n in range(3)} for i in range(5)
+            }}}, f)
+        self.manifest = split_json(json_path, os.path.join(self.tmp.name, 'sharded'))
+        args = argparse.Namespace(per_page=20, input_json=[self.manifest], replace=[('/old/photos', self.base)])
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    def shard_file(self, number):
+        return os.path.join(self.tmp.name, 'sharded', 'shards', f'{number:05d}.json')
+
+    @patch('web.render_template', return_value='')
+    def test_views_load_only_opened_category(self, mock_render):
+        """测试分片模式下启动只读清单，打开分类时才加载对应分片"""
+        with self.web_app.app.test_client() as client:
+            self.assertEqual(client.get('/').status_code, 200)
+            self.assertEqual(len(mock_render.call_args[1]['categories']), 5)
+            self.assertEqual(self.web_app.shard_loads.get(), 0)
+            self.assertEqual(client.get('/category/dir3').status_code, 200)
+            self.assertEqual(len(mock_render.call_args[1]['images']), 3)
+            self.assertEqual(mock_render.call_args[1]['images'][0]['path'], os.path.join(self.base, 'dir3', '0.jpg'))
+            self.assertEqual(client.get('/category/missing').status_code, 404)
+        self.assertEqual(self.web_app.shard_loads.get(), 1)
+
+    def test_like_rewrites_only_owning_shard(self):
+        """测试点赞只重写所属分片，并还原替换规则"""
+        mtimes = {i: os.stat(self.shard_file(i)).st_mtime_ns for i in range(5)}
+        with self.web_app.app.test_client() as client:
+            response = client.post('/like_image', json={'paths': [os.path.join(self.base, 'dir1', '2.jpg'),
+                                                                  os.path.join(self.base, 'nowhere.jpg')]})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['not_found'], [os.path.join(self.base, 'nowhere.jpg')])
+        self.web_app.save_queue.join()
+        with open(self.shard_file(1), 'r', encoding='utf-8') as f:
+            shard = json.load(f)
+        self.assertTrue(shard['img']['/old/photos']['dir1']['2.jpg']['like'])
+        self.assertEqual([i for i in range(5) if os.stat(self.shard_file(i)).st_mtime_ns != mtimes[i]], [1])
+        self.assertTrue(self.web_app.index_cache[self.manifest].category_map['dir1'][2]['like'])
+
+    @patch('web.render_template', return_value='')
+    def test_all_images_loads_only_page_shards(self, mock_render):
+        """测试分片模式下"所有分类"按清单计数跳过分类，只加载当前页涉及的分片"""
+        self.web_app.app.config['PER_PAGE'] = 4
+        with self.web_app.app.test_client() as client:
+            self.assertEqual(client.get('/all?page=2').status_code, 200)
+        kwargs = mock_render.call_args[1]
+        self.assertEqual([(img['category'], img['filename']) for img in kwargs['images']],
+                         [('dir1', '1.jpg'), ('dir1', '2.jpg'), ('dir2', '0.jpg'), ('dir2', '1.jpg')])
+        self.assertEqual((kwargs['total_images'], kwargs['total_pages']), (15, 4))
+        self.assertEqual(self.web_app.shard_loads.get(), 2)
+
+    @patch('web.render_template', return_value='')
+    def test_favorites_paged_without_full_list(self, mock_render):
+        """测试分片模式下收藏/未收藏页逐个分片计数，带种子时顺序固定且逐页不重复"""
+        self.web_app.app.config['PER_PAGE'] = 4
+        liked = [os.path.join(self.base, 'dir1', '2.jpg'), os.path.join(self.base, 'dir3', '0.jpg')]
+        with self.web_app.app.test_client() as client:
+            client.post('/like_image', json={'paths': liked})
+            client.get('/category/_favorites?seed=1')
+            kwargs = mock_render.call_args[1]
+            self.assertEqual(sorted(img['path'] for img in kwargs['images']), sorted(liked))
+            self.assertEqual(kwargs['total_images'], 2)
+            pages = []
+            for page in range(1, 5):
+                client.get(f'/category/_unfavorites?seed=7&page={page}')
+                pages.extend(img['path'] for img in mock_render.call_args[1]['images'])
+            self.assertEqual(mock_render.call_args[1]['total_images'], 13)
+            self.assertEqual(len(pages), 13)
+            self.assertEqual(len(set(pages)), 13)
+            self.assertFalse(set(pages) & set(liked))
+            client.get('/category/_unfavorites?seed=7&page=1')
+            self.assertEqual([img['path'] for img in mock_render.call_args[1]['images']], pages[:4])
+
+    def test_evicted_shard_reload_changes_version(self):
+        """测试被逐出的分片重新加载时索引版本改变，首次加载不改变"""
+        index = self.web_app.get_image_index(self.manifest)
+        shard_path = index.categories['dir3']['shards'][0]
+        version = self.web_app.index_version(self.manifest)
+        index.load_shard(shard_path)
+        self.assertEqual(self.web_app.index_version(self.manifest), version)
+        with self.web_app.data_lock:
+            index.shards.pop(shard_path)
+        index.load_shard(shard_path)
+        self.assertNotEqual(self.web_app.index_version(self.manifest), version)
+
+
+class TestWebAppCrawler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        os.makedirs(os.path.join(self.base, 'cat'))
+        for name in ('a.jpg', 'new.jpg'):
+            with open(os.path.join(self.base, 'cat', name), 'wb') as f:
+                f.write(b'x')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {'/old/photos': {'cat': {'a.jpg': {'face_scores': [0.5]}}}}}, f)
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=[('/old/photos', self.base)])
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    def test_refresh_adds_unscored_images(self):
+        """测试刷新后新图片以未评分状态显示，并写回JSON与爬虫状态"""
+        with self.web_app.app.test_client() as client:
+            data = client.post('/refresh').get_json()
+            self.assertEqual((data['added'], data['dirs_rescanned']), (1, 2))
+            category_map = self.web_app.get_image_index(self.json_path).category_map
+            self.assertEqual([img['unscored'] for img in category_map['cat']], [False, True])
+            self.web_app.save_queue.join()
+            data = client.post('/refresh').get_json()
+            self.assertEqual((data['added'], data['dirs_rescanned']), (0, 0))
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        self.assertTrue(saved['img']['/old/photos']['cat']['new.jpg']['unscored'])
+        self.assertTrue(os.path.exists(self.json_path + '.crawl.json'))
+        self.assertEqual(self.web_app.crawl_changes.get(change='added'), 1)
+
+    @patch('web.render_template', return_value='')
+    def test_unscored_images_rendered(self, mock_render):
+        """测试未评分图片出现在分类页中"""
+        self.web_app.refresh_json_file(self.json_path)
+        with self.web_app.app.test_client() as client:
+            client.get('/category/cat')
+        self.assertEqual([img['filename'] for img in mock_render.call_args[1]['images']], ['a.jpg', 'new.jpg'])
+
+    def test_reload_during_scan_keeps_likes(self):
+        """测试扫描期间文件被逐出并重新加载、新数据上有点赞时，刷新不再保存旧数据"""
+        original_scan = web.scan_bases
+        liked_path = os.path.join(self.base, 'cat', 'a.jpg')
+        reloads = []
+
+        def scan_with_reload(*args, **kwargs):
+            if not reloads:
+                self.web_app.evict_json_file(self.json_path)
+                reloads.append(self.web_app.get_image_index(self.json_path))
+                with self.web_app.app.test_client() as client:
+                    client.post('/like_image', json={'path': liked_path})
+            return original_scan(*args, **kwargs)
+
+        with patch('web.scan_bases', side_effect=scan_with_reload):
+            counts = self.web_app.refresh_json_file(self.json_path)
+        self.assertEqual(counts['added'], 1)
+        self.web_app.save_queue.join()
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            cat = json.load(f)['img']['/old/photos']['cat']
+        self.assertTrue(cat['a.jpg']['like'])
+        self.assertIn('new.jpg', cat)
+        index = self.web_app.get_image_index(self.json_path)
+        self.assertIsNot(index, reloads[0])
+        self.assertTrue(index.path_map[liked_path]['like'])
+
+    def test_rebuild_outside_lock_sees_concurrent_likes(self):
+        """测试索引在锁外重建，重建期间的点赞不会在新索引中丢失"""
+        liked_path = os.path.join(self.base, 'cat', 'a.jpg')
+        original_index = web.ImageIndex
+        builds = []
+
+        def build_with_like(raw_data, img_data=None):
+            builds.append(self.web_app.data_lock.locked())
+            new_index = original_index(raw_data, img_data)
+            if len(builds) == 1:
+                with self.web_app.app.test_client() as client:
+                    client.post('/like_image', json={'path': liked_path})
+            return new_index
+
+        self.web_app.get_image_index(self.json_path)
+        with patch('web.ImageIndex', side_effect=build_with_like):
+            self.web_app.refresh_json_file(self.json_path)
+        self.assertEqual(builds, [False, False])
+        index = self.web_app.get_image_index(self.json_path)
+        self.assertTrue(index.path_map[liked_path]['like'])
+        self.assertEqual(len(index.path_map), 2)
+
+    def test_rebuild_survives_concurrent_tree_changes(self):
+        """测试锁外重建遍历的是目录快照，期间原始数据增加目录不会导致重建失败"""
+        self.web_app.get_image_index(self.json_path)
+        raw_data = self.web_app.cached_raw_data[self.json_path]
+        original_listed = image_index.is_listed
+        calls = []
+
+        def listed_with_insert(node):
+            if not calls:
+                raw_data['img'][self.base]['new_dir'] = {}
+            calls.append(node)
+            return original_listed(node)
+
+        with patch('image_index.is_listed', side_effect=listed_with_insert):
+            self.web_app.refresh_json_file(self.json_path)
+        self.web_app.save_queue.join()
+        self.assertTrue(calls)
+        index = self.web_app.get_image_index(self.json_path)
+        self.assertEqual(len(index.path_map), 2)
+        self.assertIs(index.raw_data, raw_data)
+
+    def test_like_unknown_path_leaves_raw_data_unchanged(self):
+        """测试对未知路径点赞只查找不创建，原始数据中不会出现空目录"""
+        self.web_app.get_image_index(self.json_path)
+        before = json.dumps(self.web_app.cached_raw_data[self.json_path], sort_keys=True)
+        with self.web_app.app.test_client() as client:
+            for path in (os.path.join(self.base, 'x', 'y', 'z.jpg'), os.path.join(self.base, 'cat', 'a.jpg', 'q.jpg')):
+                response = client.post('/like_image', json={'path': path})
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.dumps(self.web_app.cached_raw_data[self.json_path], sort_keys=True), before)
+
+    def test_refresh_rejected_for_sqlite_store(self):
+        """测试SQLite后端不支持目录刷新"""
+        self.web_app.store = MagicMock()
+        with self.web_app.app.test_client() as client:
+            self.assertEqual(client.post('/refresh').status_code, 409)
+
+
+class TestWebAppValidator(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        os.makedirs(os.path.join(self.base, 'cat'))
+        for name in ('a.jpg', 'b.jpg'):
+            with open(os.path.join(self.base, 'cat', name), 'wb') as f:
+                f.write(b'x')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: {'cat': {
+                name: {'face_scores': [0.5]} for name in ('gone.jpg', 'a.jpg', 'b.jpg')
+            }}}}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_app(self, **kwargs):
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=None, **kwargs)
+        web_app = WebApp(args)
+        web_app.app.testing = True
+        self.addCleanup(setattr, web_app, 'save_thread_running', False)
+        return web_app
+
+    def test_validate_flags_missing_files(self):
+        """测试后台校验标记缺失文件，缺失图片直接返回404且不访问磁盘"""
+        web_app = self.make_app(validate_workers=2)
+        index = web_app.get_image_index(self.json_path)
+        self.assertEqual(web_app.validate_index(index), 1)
+        self.assertEqual([img['missing'] for img in index.category_map['cat']], [True, False, False])
+        self.assertEqual(web_app.missing_paths, {os.path.join(self.base, 'cat', 'gone.jpg')})
+        with web_app.app.test_client() as client:
+            with patch('web.send_from_directory') as mock_send:
+                self.assertEqual(client.get('/image/cat/gone.jpg').status_code, 404)
+                mock_send.assert_not_called()
+            self.assertEqual(client.get('/ready').get_json()['files'][0]['missing'], 1)
+            self.assertIn('img_display_missing_images 1', client.get('/metrics').get_data(as_text=True))
+        # 文件恢复后重新校验清除标记
+        with open(os.path.join(self.base, 'cat', 'gone.jpg'), 'wb') as f:
+            f.write(b'x')
+        self.assertEqual(web_app.validate_index(index), 0)
+        self.assertEqual(web_app.missing_paths, set())
+
+    @patch('web.render_template', return_value='')
+    def test_hide_missing(self, mock_render):
+        """测试开启 --hide_missing 后缺失图片不显示也不计入总数"""
+        web_app = self.make_app(hide_missing=True)
+        web_app.validate_index(web_app.get_image_index(self.json_path))
+        with web_app.app.test_client() as client:
+            client.get('/category/cat')
+            kwargs = mock_render.call_args[1]
+            self.assertEqual([img['filename'] for img in kwargs['images']], ['a.jpg', 'b.jpg'])
+            self.assertEqual(kwargs['total_images'], 2)
+            client.get('/')
+            self.assertEqual(mock_render.call_args[1]['categories'][0]['thumb_url'], '/image/cat/a.jpg')
+
+    def test_validator_checks_new_index(self):
+        """测试后台校验线程在索引加载后立即校验"""
+        web_app = self.make_app(validate_interval=60)
+        index = web_app.get_image_index(self.json_path)
+        deadline = time.time() + 5
+        while index.validated_at is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(index.missing_count, 1)
+
+
+
+class TestWebAppVariants(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        os.makedirs(os.path.join(self.base, 'cat'))
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: {'cat': {'a.png': {'face_scores': [0.5]}}}}}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_app(self, **kwargs):
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=None,
+                                  variant_cache_dir=os.path.join(self.tmp.name, 'variants'), **kwargs)
+        web_app = WebApp(args)
+        web_app.app.testing = True
+        self.addCleanup(setattr, web_app, 'save_thread_running', False)
+        return web_app
+
+    def test_variant_served_by_accept(self):
+        """测试按 Accept 发送 WebP 变体，转码完成前发送原图"""
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest('Pillow is not installed')
+        Image.frombytes('RGB', (128, 128), os.urandom(128 * 128 * 3)).save(
+            os.path.join(self.base, 'cat', 'a.png'), format='PNG')
+        web_app = self.make_app(variant_formats=['webp'])
+        with web_app.app.test_client() as client:
+            headers = {'Accept': 'image/webp,image/*,*/*;q=0.8'}
+            response = client.get('/image/cat/a.png', headers=headers)
+            self.assertEqual(response.mimetype, 'image/png')
+            self.assertIn('accept', response.vary)
+            response.close()
+            web_app.variants.wait_idle()
+            response = client.get('/image/cat/a.png', headers=headers)
+            self.assertEqual(response.mimetype, 'image/webp')
+            response.close()
+            response = client.get('/image/cat/a.png', headers={'Accept': '*/*'})
+            self.assertEqual(response.mimetype, 'image/png')
+            response.close()
+            metrics = client.get('/metrics').get_data(as_text=True)
+            self.assertIn('img_display_variant_requests_total{result="hit"} 1', metrics)
+            self.assertIn('img_display_variant_requests_total{result="original"} 1', metrics)
+
+    def test_variants_disabled_without_pillow(self):
+        """测试未安装 Pillow 时不启用变体"""
+        with patch('variants.available_formats', return_value=[]):
+            web_app = self.make_app()
+        self.assertIsNone(web_app.variants)
+        with open(os.path.join(self.base, 'cat', 'a.png'), 'wb') as f:
+            f.write(b'x')
+        with web_app.app.test_client() as client:
+            response = client.get('/image/cat/a.png', headers={'Accept': 'image/webp'})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('Accept', response.headers.get('Vary', ''))
+            response.close()
+
+
+
+class TestWebAppSprites(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        tree = {}
+        for cat in ('a', 'b', 'c'):
+            os.makedirs(os.path.join(self.base, cat))
+            tree[cat] = {'1.jpg': {'face_scores': [0.5]}}
+            with open(os.path.join(self.base, cat, '1.jpg'), 'wb') as f:
+                f.write(b'x')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: tree}}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch('web.render_template', return_value='')
+    def test_categories_use_sprite(self, mock_render):
+        """测试分类页使用拼图，拼图生成前逐张请求缩略图"""
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest('Pillow is not installed')
+        for cat in ('a', 'c'):
+            Image.new('RGB', (40, 40), 'red').save(os.path.join(self.base, cat, '1.jpg'), format='JPEG')
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=None,
+                                  sprite_cache_dir=os.path.join(self.tmp.name, 'sprites'), sprite_tile=16)
+        web_app = WebApp(args)
+        web_app.app.testing = True
+        self.addCleanup(setattr, web_app, 'save_thread_running', False)
+        with web_app.app.test_client() as client:
+            client.get('/')
+            self.assertNotIn('sprite', mock_render.call_args[1]['categories'][0])
+            web_app.sprites.wait_idle()
+            client.get('/')
+            categories = mock_render.call_args[1]['categories']
+            sprite_url = categories[0]['sprite']['url']
+            self.assertEqual(categories[2]['sprite']['position'], '22.2222% 0%')
+            # 无法解码的缩略图仍在拼图中占位
+            self.assertIn('sprite', categories[1])
+            response = client.get(sprite_url)
+            self.assertEqual(response.mimetype, 'image/jpeg')
+            self.assertIn('immutable', response.headers['Cache-Control'])
+            response.close()
+            self.assertEqual(client.get('/sprite/unknown.jpg').status_code, 404)
+
+    def test_fallback_page_not_cached(self):
+        """测试拼图生成前的分类页不带 ETag，拼图就绪后的页面按版本缓存"""
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest('Pillow is not installed')
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=None,
+                                  sprite_cache_dir=os.path.join(self.tmp.name, 'sprites'), sprite_tile=16)
+        web_app = WebApp(args)
+        web_app.app.testing = True
+        self.addCleanup(setattr, web_app, 'save_thread_running', False)
+        url = f"/d/{web.json_file_id(self.json_path)}/"
+        with web_app.app.test_client() as client:
+            first = client.get(url, headers={'Accept-Encoding': 'gzip'})
+            self.assertNotIn('ETag', first.headers)
+            self.assertIn('no-store', first.headers['Cache-Control'])
+            web_app.sprites.wait_idle()
+            second = client.get(url, headers={'Accept-Encoding': 'gzip'})
+            self.assertIn('ETag', second.headers)
+            self.assertEqual(client.get(url, headers={'If-None-Match': second.headers['ETag']}).status_code, 304)
+        self.assertEqual(len(web_app.compressed_cache.entries), 1)
+
+
+class TestWebAppLikeImport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: {'cat': {
+                f'{i}.jpg': {'face_scores': [0.5], 'like': i == 0} for i in range(50)
+            }}}}, f)
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=None)
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    def image_path(self, i):
+        return os.path.join(self.base, 'cat', f'{i}.jpg')
+
+    def test_import_applies_batch_with_one_save(self):
+        """测试整批导入只写入一次并只保存一次"""
+        lines = [self.image_path(i) for i in range(1, 40)]
+        lines += [json.dumps({'path': self.image_path(0), 'like': False}), self.image_path(99), 'not json {', '{"oops": 1}']
+        with self.web_app.app.test_client() as client:
+            client.get('/')
+            with patch.object(self.web_app, 'queue_save', wraps=self.web_app.queue_save) as mock_save:
+                response = client.post('/import_likes', data='\n'.join(lines), content_type='text/plain')
+            summary = response.get_json()
+            self.assertEqual(response.status_code, 200)
+            mock_save.assert_called_once()
+            self.assertEqual((summary['applied'], summary['liked'], summary['unliked']), (40, 39, 1))
+            # 不以 { 开头的行按路径处理
+            self.assertEqual((summary['unknown'], summary['invalid']), (2, 1))
+            self.assertEqual(summary['unknown_paths'], [self.image_path(99), 'not json {'])
+            self.web_app.save_queue.join()
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)['img'][self.base]['cat']
+        self.assertEqual(sum(1 for node in saved.values() if node.get('like')), 39)
+        self.assertFalse(saved['0.jpg']['like'])
+        index = self.web_app.index_cache[self.json_path]
+        self.assertEqual(sum(1 for img in index.path_map.values() if img['like']), 39)
+
+    def test_import_uploaded_file(self):
+        """测试以 multipart 上传文件导入，页面版本随之改变"""
+        with self.web_app.app.test_client() as client:
+            client.get('/')
+            version = self.web_app.index_version(self.json_path)
+            upload = (io.BytesIO(f"{self.image_path(5)}\n".encode('utf-8')), 'likes.txt')
+            summary = client.post('/import_likes', data={'file': upload},
+                                  content_type='multipart/form-data').get_json()
+            self.assertEqual(summary['applied'], 1)
+            self.assertNotEqual(self.web_app.index_version(self.json_path), version)
+            self.assertTrue(self.web_app.index_cache[self.json_path].path_map[self.image_path(5)]['like'])
+            self.assertIn('img_display_imported_likes_total{result="applied"} 1',
+                          client.get('/metrics').get_data(as_text=True))
+
+
+class TestWebAppOverlays(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: {'cat': {
+                'a.jpg': {'face_scores': [0.5], 'like': True},
+                'b.jpg': {'face_scores': [0.6]}
+            }}}}, f)
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=None,
+                                  overlay_dir=os.path.join(self.tmp.name, 'overlays'), user_header='X-Remote-User')
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+        self.prefix = f"/d/{web.json_file_id(self.json_path)}"
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    def image_path(self, name):
+        return os.path.join(self.base, 'cat', name)
+
+    @patch('web.render_template', return_value='')
+    def test_likes_go_to_user_overlay(self, mock_render):
+        """测试已识别用户的点赞只写入自己的覆盖层，收藏页按用户合并"""
+        alice = {'X-Remote-User': 'alice'}
+        with self.web_app.app.test_client() as client:
+            with patch.object(self.web_app, 'queue_save') as mock_save:
+                response = client.post('/like_image', headers=alice, json={'changes': [
+                    {'path': self.image_path('b.jpg'), 'like': True}, {'path': self.image_path('x.jpg'), 'like': True}]})
+                self.assertEqual(response.json['not_found'], [self.image_path('x.jpg')])
+                mock_save.assert_not_called()
+            client.get('/category/_favorites?seed=1', headers=alice)
+            self.assertEqual([(img['filename'], img['like']) for img in mock_render.call_args[1]['images']],
+                             [('b.jpg', True)])
+            client.get('/category/cat', headers=alice)
+            self.assertEqual([img['like'] for img in mock_render.call_args[1]['images']], [False, True])
+            # 共享索引与其他用户不受影响
+            client.get('/category/_favorites?seed=1', headers={'X-Remote-User': 'bob'})
+            self.assertEqual(mock_render.call_args[1]['images'], [])
+            client.get('/category/_favorites?seed=1')
+            self.assertEqual([img['filename'] for img in mock_render.call_args[1]['images']], ['a.jpg'])
+            exported = client.get('/export?view=_favorites', headers=alice).get_data(as_text=True).splitlines()
+            self.assertEqual([json.loads(line)['filename'] for line in exported], ['b.jpg'])
+        index = self.web_app.index_cache[self.json_path]
+        self.assertFalse(index.path_map[self.image_path('b.jpg')]['like'])
+        self.assertEqual(self.web_app.overlays.liked(self.json_path, 'alice'), {self.image_path('b.jpg')})
+
+    def test_user_pages_cached_per_user(self):
+        """测试用户页面使用带用户版本的 ETag 并只允许私有缓存"""
+        alice = {'X-Remote-User': 'alice'}
+        with self.web_app.app.test_client() as client:
+            response = client.get(f'{self.prefix}/category/cat', headers=alice)
+            etag = response.headers['ETag']
+            self.assertTrue(response.cache_control.private)
+            self.assertIn('X-Remote-User', response.headers['Vary'])
+            self.assertNotEqual(client.get(f'{self.prefix}/category/cat').headers['ETag'], etag)
+            self.assertEqual(client.get(f'{self.prefix}/category/cat',
+                                        headers=dict(alice, **{'If-None-Match': etag})).status_code, 304)
+            client.post(f'{self.prefix}/like_image', headers=alice, json={'path': self.image_path('b.jpg')})
+            response = client.get(f'{self.prefix}/category/cat', headers=dict(alice, **{'If-None-Match': etag}))
+            self.assertEqual(response.status_code, 200)
+
+    def test_user_cookie_and_import(self):
+        """测试没有代理请求头时使用 Cookie 中的用户名，批量导入写入该用户的覆盖层"""
+        with self.web_app.app.test_client() as client:
+            self.assertEqual(client.get('/user?name=bad/name').status_code, 400)
+            response = client.get('/user?name=carol')
+            self.assertEqual(response.status_code, 302)
+            self.assertIn('img_display_user=carol', response.headers['Set-Cookie'])
+            summary = client.post('/import_likes', data=f"{self.image_path('b.jpg')}\n").get_json()
+            self.assertEqual(summary['applied'], 1)
+            self.assertEqual(self.web_app.overlays.liked(self.json_path, 'carol'), {self.image_path('b.jpg')})
+            self.assertIn('img_display_overlay_writes_total 1', client.get('/metrics').get_data(as_text=True))
+            client.get('/user?name=')
+            client.post('/like_image', json={'path': self.image_path('b.jpg')})
+        self.assertTrue(self.web_app.index_cache[self.json_path].path_map[self.image_path('b.jpg')]['like'])
+
+
+class TestWebAppCategoryTree(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: {
+                'root.jpg': {'face_scores': [0.5]},
+                'a': {
+                    '1.jpg': {'face_scores': [0.5], 'like': True},
+                    'b': {f'{i}.jpg': {'face_scores': [0.5]} for i in range(3)},
+                    'c': {'d': {'x.jpg': {'face_scores': [0.5], 'like': True}}}
+                }
+            }}}, f)
+        args = argparse.Namespace(per_page=2, input_json=[self.json_path], replace=None)
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+        self.prefix = f"/d/{web.json_file_id(self.json_path)}"
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    def test_tree_page_and_lazy_children(self):
+        """测试目录树页面只包含第一层，子目录按需以JSON加载并带子树计数"""
+        with self.web_app.app.test_client() as client:
+            html = client.get(f'{self.prefix}/tree').get_data(as_text=True)
+            self.assertIn('(6P · ❤ 2)', html)
+            self.assertIn(f'href="{self.prefix}/subtree/a"', html)
+            self.assertIn(f'data-children-url="{self.prefix}/tree/children?path=a"', html)
+            self.assertNotIn('subtree/a/b', html)
+            children = client.get(f'{self.prefix}/tree/children?path=a').get_json()['children']
+            self.assertEqual([(c['name'], c['images'], c['likes'], c['has_children']) for c in children],
+                             [('b', 3, 0, False), ('c', 1, 1, True)])
+            self.assertEqual(children[1]['children_url'], f'{self.prefix}/tree/children?path=a/c')
+            self.assertEqual(client.get(f'{self.prefix}/tree/children?path=nope').status_code, 404)
+            # 点赞后子树点赞数随版本更新
+            client.post(f'{self.prefix}/like_image', json={'path': os.path.join(self.base, 'a', 'b', '0.jpg')})
+            children = client.get(f'{self.prefix}/tree/children?path=a').get_json()['children']
+            self.assertEqual(children[0]['likes'], 1)
+            self.assertIn('(6P · ❤ 3)', client.get(f'{self.prefix}/tree').get_data(as_text=True))
+
+    @patch('web.render_template', return_value='')
+    def test_subtree_pages(self, mock_render):
+        """测试子树视图按目录先序分页，只取当前页的切片"""
+        with self.web_app.app.test_client() as client:
+            pages = []
+            for page in (1, 2, 3):
+                self.assertEqual(client.get(f'/subtree/a?page={page}').status_code, 200)
+                kwargs = mock_render.call_args[1]
+                pages.append([f"{img['category']}/{img['filename']}" for img in kwargs['images']])
+            self.assertEqual(pages, [['a/1.jpg', 'a/b/0.jpg'], ['a/b/1.jpg', 'a/b/2.jpg'], ['a/c/d/x.jpg']])
+            self.assertEqual((kwargs['total_pages'], kwargs['total_images'], kwargs['subtree']), (3, 5, 'a'))
+            self.assertEqual(client.get('/subtree/nope').status_code, 404)
+
+    def test_subtree_pagination_links(self):
+        """测试子树页面的分页链接指向子树视图"""
+        with self.web_app.app.test_client() as client:
+            html = client.get(f'{self.prefix}/subtree/a/b').get_data(as_text=True)
+        self.assertIn(f'href="{self.prefix}/subtree/a/b?page=2"', html)
+        self.assertIn('a/b/', html)
+
+
+class TestWebAppDimensions(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        os.makedirs(os.path.join(self.base, 'cat'))
+        with open(os.path.join(self.base, 'cat', 'a.gif'), 'wb') as f:
+            f.write(b'GIF89a' + (64).to_bytes(2, 'little') + (48).to_bytes(2, 'little') + b'\0' * 10)
+        with open(os.path.join(self.base, 'cat', 'b.jpg'), 'wb') as f:
+            f.write(b'broken')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: {'cat': {
+                'a.gif': {'face_scores': [0.5]},
+                'b.jpg': {'face_scores': [0.5]}
+            }}}}, f)
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=None,
+                                  probe_workers=1, probe_wait_ms=5000)
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    def test_page_carries_dimensions(self):
+        """测试页面等待当前页的尺寸探测，<img> 带上宽高属性"""
+        with self.web_app.app.test_client() as client:
+            html = client.get('/category/cat').get_data(as_text=True)
+        self.assertIn('width="64" height="48"', html)
+        self.assertEqual(html.count('width="'), 1)
+        self.assertEqual(self.web_app.dimension_probes.get(result='probed'), 1)
+        self.assertIn('img_display_dimension_probe_queue', self.web_app.metrics.render())
+
+    def test_late_probe_invalidates_cached_page(self):
+        """测试页面先于探测完成返回时，探测结果写入后 ETag 改变，缓存的页面不再被复用"""
+        import dimensions
+        original_read = dimensions.read_dimensions
+        self.web_app.probe_wait = 0.01
+        release = threading.Event()
+
+        def slow_read(path):
+            release.wait(5)
+            return original_read(path)
+
+        url = f"/d/{web.json_file_id(self.json_path)}/category/cat"
+        with patch('dimensions.read_dimensions', side_effect=slow_read), \
+                self.web_app.app.test_client() as client:
+            first = client.get(url)
+            self.assertNotIn(b'width="64"', first.data)
+            generation = self.web_app.prober.generation(self.json_path)
+            release.set()
+            deadline = time.time() + 5
+            while self.web_app.prober.generation(self.json_path) == generation and time.time() < deadline:
+                time.sleep(0.01)
+            second = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertIn('width="64" height="48"', second.get_data(as_text=True))
+
+    def test_disabled_for_sqlite_store(self):
+        """测试SQLite后端不启用尺寸探测"""
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=None, probe_workers=1,
+                                  sqlite_db=os.path.join(self.tmp.name, 'data.db'))
+        web_app = WebApp(args)
+        self.assertIsNone(web_app.prober)
+        web_app.save_thread_running = False
+
+
+class TestWebAppImageAdmission(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        os.makedirs(os.path.join(self.base, 'cat'))
+        with open(os.path.join(self.base, 'cat', 'a.jpg'), 'wb') as f:
+            f.write(b'x' * 100)
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: {'cat': {'a.jpg': {'face_scores': [0.5]}}}}}, f)
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=None,
+                                  max_image_sends=1, image_queue_depth=0, image_queue_timeout=1)
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    def test_slot_held_until_response_closed(self):
+        """测试图片名额在响应关闭后归还，名额用尽且排队已满时立即返回503"""
+        gate = self.web_app.image_gate
+        with self.web_app.app.test_client() as client:
+            response = client.get('/image/cat/a.jpg', buffered=False)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(gate.active, 1)
+            busy = client.get('/image/cat/a.jpg')
+            self.assertEqual(busy.status_code, 503)
+            self.assertEqual(busy.headers['Retry-After'], '1')
+            # 前端用 HEAD 请求区分繁忙与永久错误；不存在的图片在排队前就返回404
+            self.assertEqual(client.head('/image/cat/a.jpg').status_code, 503)
+            self.assertEqual(client.head('/image/cat/nope.jpg').status_code, 404)
+            # 页面与点赞请求不受图片名额限制
+            self.assertEqual(client.get('/category/cat').status_code, 200)
+            response.close()
+            self.assertEqual(gate.active, 0)
+            with client.get('/image/cat/a.jpg') as response:
+                self.assertEqual(response.data, b'x' * 100)
+            with client.head('/image/cat/a.jpg') as response:
+                self.assertEqual(response.status_code, 200)
+            self.assertEqual(client.get('/image/cat/nope.jpg').status_code, 404)
+        self.assertEqual(gate.active, 0)
+        self.assertEqual(self.web_app.image_rejections.get(reason='full'), 2)
+        self.assertEqual(self.web_app.image_queue_seconds.get(), 3)
+
+
+class TestWebAppBundle(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        os.makedirs(os.path.join(self.base, 'cat'))
+        for name, data in (('a.jpg', b'jpeg-a'), ('b.png', b'png-b')):
+            with open(os.path.join(self.base, 'cat', name), 'wb') as f:
+                f.write(data)
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: {'cat': {
+                'a.jpg': {'face_scores': [0.5]},
+                'b.png': {'face_scores': [0.5]},
+                'gone.jpg': {'face_scores': [0.5]}
+            }}}}, f)
+        args = argparse.Namespace(per_page=20, input_json=[self.json_path], replace=None, bundle_images=True,
+                                  max_image_sends=1, image_queue_depth=0)
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+        self.prefix = f"/d/{web.json_file_id(self.json_path)}"
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    @staticmethod
+    def parse_frames(data):
+        frames = []
+        while data:
+            length = int.from_bytes(data[:4], 'big')
+            header = json.loads(data[4:4 + length])
+            data = data[4 + length:]
+            frames.append((header, data[:header['size']]))
+            data = data[header['size']:]
+        return frames
+
+    def test_bundle_streams_frames(self):
+        """测试 /bundle 按页面顺序返回当前页各图片的帧，整个打包只占用一个图片名额"""
+        with self.web_app.app.test_client() as client:
+            response = client.get(f'{self.prefix}/bundle?category=cat&page=1', buffered=False)
+            self.assertEqual(response.mimetype, 'application/x-img-display-bundle')
+            self.assertEqual(self.web_app.image_gate.active, 1)
+            self.assertEqual(client.get('/image/cat/a.jpg').status_code, 503)
+            frames = self.parse_frames(response.get_data())
+            response.close()
+            self.assertEqual(self.web_app.image_gate.active, 0)
+            self.assertEqual(client.get('/bundle?category=cat&page=2').get_data(), b'')
+        self.assertEqual([(h['i'], h['name'], h['status'], h['type']) for h, _ in frames],
+                         [(0, 'cat/a.jpg', 200, 'image/jpeg'), (1, 'cat/b.png', 200, 'image/png'),
+                          (2, 'cat/gone.jpg', 404, None)])
+        self.assertEqual([body for _, body in frames], [b'jpeg-a', b'png-b', b''])
+        self.assertEqual(self.web_app.bundle_images_sent.get(status='200'), 2)
+        self.assertEqual(self.web_app.bundle_images_sent.get(status='404'), 1)
+        self.assertEqual(self.web_app.image_bytes_served.get(), 11)
+
+    def test_bundle_revalidated_by_etag(self):
+        """测试打包可以缓存：文件未变化时按 ETag 返回 304 且不占用名额，文件被改写后 ETag 变化"""
+        url = f'{self.prefix}/bundle?category=cat&page=1'
+        with self.web_app.app.test_client() as client:
+            response = client.get(url)
+            response.close()
+            etag = response.headers['ETag']
+            self.assertIn('no-cache', response.headers['Cache-Control'])
+            with patch.object(self.web_app.image_gate, 'acquire') as acquire:
+                response = client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            acquire.assert_not_called()
+            self.assertEqual(self.web_app.bundle_images_sent.get(status='200'), 2)
+            # 同一页的其他种子或分类使用不同的 ETag
+            response = client.get(f'{self.prefix}/bundle?page=1&seed=1')
+            response.close()
+            self.assertNotEqual(response.headers['ETag'], etag)
+            with open(os.path.join(self.base, 'cat', 'a.jpg'), 'wb') as f:
+                f.write(b'jpeg-a2')
+            response = client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers['ETag'], etag)
+            self.assertEqual(self.parse_frames(response.get_data())[0][1], b'jpeg-a2')
+            response.close()
+
+    def test_page_defers_images_to_bundle(self):
+        """测试开启打包后页面中的图片不带 src，由 main.js 通过当前页的 /bundle 地址加载"""
+        with self.web_app.app.test_client() as client:
+            html = client.get(f'{self.prefix}/category/cat').get_data(as_text=True)
+        self.assertIn(f'data-bundle-url="{self.prefix}/bundle?category=cat&amp;page=1"', html)
+        self.assertIn(f'data-src="{self.prefix}/image/cat/a.jpg"', html)
+        self.assertIn('data-category="cat" data-filename="a.jpg"', html)
+        self.assertNotIn(' src="/d/', html)
+
+
+class TestWebAppDatasetUrls(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        os.makedirs(os.path.join(self.base, 'cat'))
+        with open(os.path.join(self.base, 'cat', 'a.jpg'), 'wb') as f:
+            f.write(b'jpeg')
+        self.json_paths = []
+        for name in ('one.json', 'two.json'):
+            json_path = os.path.join(self.tmp.name, name)
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump({'img': {self.base: {'cat': {'a.jpg': {'face_scores': [0.5]}}}}}, f)
+            self.json_paths.append(json_path)
+        args = argparse.Namespace(per_page=20, input_json=self.json_paths, replace=None)
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+        self.prefix = f"/d/{web.json_file_id(self.json_paths[1])}"
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    def test_dataset_from_url_without_session(self):
+        """测试 /d/<json_id> 页面不读写 session，链接保持在同一数据集下"""
+        with self.web_app.app.test_client() as client:
+            response = client.get(f'{self.prefix}/category/cat')
+            html = response.get_data(as_text=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('Set-Cookie', response.headers)
+            self.assertNotIn('Cookie', response.headers.get('Vary', ''))
+            self.assertIn(f'src="{self.prefix}/image/cat/a.jpg"', html)
+            self.assertIn(f'data-base-url="{self.prefix}/"', html)
+            self.assertIn(f'value="{self.prefix}/" selected', html)
+            self.assertIn(self.json_paths[1], self.web_app.cached_raw_data)
+            self.assertNotIn(self.json_paths[0], self.web_app.cached_raw_data)
+            self.assertEqual(client.get('/d/unknown/').status_code, 404)
+            # 切换数据集跳转到对应的地址
+            response = client.get('/select_json/1')
+            self.assertEqual(response.headers['Location'], f'{self.prefix}/')
+
+    def test_etag_follows_index_version(self):
+        """测试页面 ETag 随索引版本变化，未变化时直接返回304"""
+        with self.web_app.app.test_client() as client:
+            response = client.get(f'{self.prefix}/')
+            etag = response.headers['ETag']
+            self.assertEqual(set(response.cache_control), {'public', 'no-cache'})
+            with patch.object(self.web_app, 'render_category_view') as mock_render:
+                response = client.get(f'{self.prefix}/all', headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304)
+                mock_render.assert_not_called()
+            response = client.get(f'{self.prefix}/image/cat/a.jpg')
+            self.assertEqual(set(response.cache_control), {'public', 'no-cache'})
+            response.close()
+            client.post(f'{self.prefix}/like_image', json={'path': os.path.join(self.base, 'cat', 'a.jpg')})
+            self.assertTrue(self.web_app.cached_raw_data[self.json_paths[1]]['img'][self.base]['cat']['a.jpg']['like'])
+            response = client.get(f'{self.prefix}/all', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers['ETag'], etag)
+            # 无前缀地址仍使用 session，不设置缓存头
+            self.assertNotIn('ETag', client.get('/').headers)
+
+
+    def test_compressed_page_cached_per_version(self):
+        """测试页面按 Accept-Encoding 压缩，同一版本的压缩结果直接从缓存发送"""
+        import gzip
+        headers = {'Accept-Encoding': 'gzip'}
+        with self.web_app.app.test_client() as client:
+            response = client.get(f'{self.prefix}/category/cat', headers=headers)
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertIn('accept-encoding', response.vary)
+            html = gzip.decompress(response.data).decode('utf-8')
+            self.assertIn('a.jpg', html)
+            with patch.object(self.web_app, 'render_category_view') as mock_render:
+                cached = client.get(f'{self.prefix}/category/cat', headers=headers)
+                mock_render.assert_not_called()
+            self.assertEqual(cached.data, response.data)
+            self.assertEqual(cached.headers['ETag'], response.headers['ETag'])
+            # 不接受压缩的客户端得到原文
+            response = client.get(f'{self.prefix}/category/cat', headers={'Accept-Encoding': 'identity'})
+            self.assertNotIn('Content-Encoding', response.headers)
+            self.assertEqual(response.get_data(as_text=True), html)
+            # 小于阈值的 JSON 不压缩
+            response = client.get('/ready', headers=headers)
+            self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_export_streams_view(self):
+        """测试 /export 流式导出视图，筛选与格式生效"""
+        with self.web_app.app.test_client() as client:
+            response = client.get(f'{self.prefix}/export?view=cat&format=csv', buffered=False)
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(response.mimetype, 'text/csv')
+            self.assertIn("two-cat.csv", response.headers['Content-Disposition'])
+            lines = response.get_data(as_text=True).splitlines()
+            response.close()
+            self.assertEqual(len(lines), 2)
+            self.assertTrue(lines[1].startswith(os.path.join(self.base, 'cat', 'a.jpg')))
+            response = client.get(f'{self.prefix}/export?view=_favorites')
+            self.assertEqual(response.get_data(as_text=True), '')
+            response = client.get(f'{self.prefix}/export?min_score=0.4&max_score=0.6')
+            self.assertEqual(json.loads(response.get_data(as_text=True))['face_score_max'], 0.5)
+            self.assertEqual(client.get(f'{self.prefix}/export?view=nope').status_code, 404)
+            self.assertEqual(client.get(f'{self.prefix}/export?format=xml').status_code, 400)
+            self.assertIn('img_display_exported_records_total{format="ndjson"} 1',
+                          client.get('/metrics').get_data(as_text=True))
+
+    def test_hashed_static_assets(self):
+        """测试静态文件地址带内容哈希，预压缩文件优先发送"""
+        import gzip
+        assets = self.web_app.assets
+        url = f"/assets/{assets.digest('js/main.js')}/js/main.js"
+        with self.web_app.app.test_client() as client:
+            html = client.get(f'{self.prefix}/category/cat').get_data(as_text=True)
+            self.assertIn(f'src="{url}"', html)
+            gz_path = os.path.join(assets.static_dir, 'js', 'main.js.gz')
+            with open(os.path.join(assets.static_dir, 'js', 'main.js'), 'rb') as f:
+                source = f.read()
+            self.addCleanup(os.remove, gz_path)
+            with open(gz_path, 'wb') as f:
+                f.write(gzip.compress(source))
+            response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(response.mimetype, 'text/javascript')
+            self.assertEqual(gzip.decompress(response.data), source)
+            self.assertIn('immutable', response.headers['Cache-Control'])
+            response.close()
+            response = client.get('/assets/stale/js/main.js')
+            self.assertEqual(response.data, source)
+            self.assertNotIn('immutable', response.headers['Cache-Control'])
+            response.close()
+
+
+
+class TestWebAppStreaming(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'photos')
+        self.json_path = os.path.join(self.tmp.name, 'data.json')
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'img': {self.base: {'cat': {
+                f'{i:04d}.jpg': {'face_scores': [0.5]} for i in range(300)}}}}, f)
+        args = argparse.Namespace(per_page=100, input_json=[self.json_path], replace=None, stream_min_images=50)
+        self.web_app = WebApp(args)
+        self.web_app.app.testing = True
+
+    def tearDown(self):
+        self.web_app.save_thread_running = False
+        self.tmp.cleanup()
+
+    def test_page_window(self):
+        self.assertEqual(list(WebApp.page_window(1, 1000)), [1, 2, 3])
+        self.assertEqual(list(WebApp.page_window(500, 1000)), [498, 499, 500, 501, 502])
+        self.assertEqual(list(WebApp.page_window(1, 0)), [])
+
+    def test_large_page_streamed_in_chunks(self):
+        """测试图片数达到阈值的页面流式发送，内容与一次性渲染相同"""
+        import zlib
+        with self.web_app.app.test_client() as client:
+            response = client.get('/category/cat?page=2', buffered=False)
+            self.assertTrue(response.is_streamed)
+            chunks = list(response.response)
+            response.close()
+            self.assertGreater(len(chunks), 2)
+            self.assertIn(b'<header>', chunks[0])
+            html = b''.join(chunks).decode('utf-8')
+            self.assertEqual(html.count('class="image-wrapper'), 100)
+            self.assertIn('0199.jpg', html)
+            self.assertEqual(html.count('class="page-link'), 3 + 4)
+            self.web_app.stream_min_images = 0
+            self.assertEqual(client.get('/category/cat?page=2').get_data(as_text=True), html)
+            self.web_app.stream_min_images = 50
+            # 流式压缩的结果可以完整解压
+            response = client.get('/category/cat?page=2', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(zlib.decompress(response.data, 16 + zlib.MAX_WBITS).decode('utf-8'), html)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
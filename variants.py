@@ -0,0 +1,153 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, List, Tuple
+
+# 按 Accept 协商的 AVIF/WebP 变体：首次请求时在后台线程池中转码，转码完成前直接发送原图。
+# 变体以 (源文件路径, 大小, mtime, 格式) 为键保存在有上限的磁盘缓存中，按最近最少使用顺序清理。
+# 转码后不比原图小或无法转码时写入空文件作为标记，之后总是发送原图。
+# Pillow 为可选依赖，未安装时不启用。
+
+# (扩展名, MIME 类型, Pillow 格式名, 编码参数)，按优先顺序排列
+VARIANT_FORMATS = (
+    ('avif', 'image/avif', 'AVIF', {'quality': 50}),
+    ('webp', 'image/webp', 'WEBP', {'quality': 80, 'method': 4}),
+)
+
+
+def available_formats(wanted: List[str]) -> List[Tuple]:
+    try:
+        from PIL import Image
+    except ImportError:
+        return []
+    Image.init()
+    return [fmt for fmt in VARIANT_FORMATS if fmt[0] in wanted and fmt[2] in Image.SAVE]
+
+
+def encode_variant(source_path: str, target_path: str, pil_format: str, options: dict) -> int:
+    # 返回写入的字节数；不值得转码时写入空文件
+    from PIL import Image, ImageOps
+    tmp_path = f"{target_path}.tmp"
+    try:
+        with Image.open(source_path) as image:
+            if getattr(image, 'is_animated', False):
+                raise ValueError('animated images are not transcoded')
+            # 变体不带 EXIF，先按方向信息旋转
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+            image.save(tmp_path, format=pil_format, **options)
+        if os.path.getsize(tmp_path) >= os.path.getsize(source_path):
+            open(tmp_path, 'wb').close()
+    except Exception:
+        open(tmp_path, 'wb').close()
+    os.replace(tmp_path, target_path)
+    return os.path.getsize(target_path)
+
+
+class DiskCache:
+    # 有上限的磁盘缓存：文件在后台线程池中生成，按最近最少使用顺序清理，重启后沿用已有文件
+    def __init__(self, cache_dir: str, max_bytes: int, workers: int, thread_name_prefix: str):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes  # 0 表示不限制
+        self.executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix=thread_name_prefix)
+        self.lock = threading.Lock()
+        self.pending = set()  # 正在生成的文件名
+        self.entries = OrderedDict()  # {文件名: 字节数}，最近使用的在末尾
+        os.makedirs(cache_dir, exist_ok=True)
+        existing = []
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                existing.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(existing):
+            self.entries[name] = size
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(list(self.entries.values()))
+
+    def get_or_schedule(self, name: str, generate: Callable, *args):
+        # 返回已缓存文件的字节数；不存在时安排后台生成并返回 None
+        with self.lock:
+            size = self.entries.get(name)
+            if size is not None:
+                self.entries.move_to_end(name)
+                return size
+            if name in self.pending:
+                return None
+            self.pending.add(name)
+        self.executor.submit(self.run, name, generate, *args)
+        return None
+
+    def run(self, name: str, generate: Callable, *args):
+        try:
+            size = generate(os.path.join(self.cache_dir, name), *args)
+            with self.lock:
+                self.entries[name] = size
+                self.evict()
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.pending.discard(name)
+
+    def evict(self):
+        # 调用方需持有 lock
+        if self.max_bytes <= 0:
+            return
+        total = self.total_bytes
+        while total > self.max_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            total -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def wait_idle(self, timeout: float = 10):
+        # 测试与基准使用：等待所有后台任务完成
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+class VariantCache(DiskCache):
+    def __init__(self, cache_dir: str, max_bytes: int, workers: int, formats: List[Tuple], encode_seconds=None):
+        super().__init__(cache_dir, max_bytes, workers, 'variant')
+        self.formats = formats
+        self.encode_seconds = encode_seconds
+
+    def negotiate(self, accept) -> Tuple:
+        # 只使用浏览器明确声明支持的格式，Accept: */* 的客户端仍然得到原图
+        accepted = {value for value, quality in accept if quality > 0}
+        for fmt in self.formats:
+            if fmt[1] in accepted:
+                return fmt
+        return None
+
+    @staticmethod
+    def variant_name(source_path: str, stat: os.stat_result, ext: str) -> str:
+        key = f"{os.path.abspath(source_path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]}.{ext}"
+
+    def lookup(self, source_path: str, accept) -> Tuple[str, str]:
+        # 返回 (变体文件名, MIME 类型)；变体未就绪时安排后台转码并返回 None
+        fmt = self.negotiate(accept)
+        if fmt is None:
+            return None
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return None
+        name = self.variant_name(source_path, stat, fmt[0])
+        size = self.get_or_schedule(name, self.generate, source_path, fmt)
+        return (name, fmt[1]) if size else None
+
+    def generate(self, target_path: str, source_path: str, fmt: Tuple) -> int:
+        with self.encode_seconds.time() if self.encode_seconds is not None else nullcontext():
+            return encode_variant(source_path, target_path, fmt[2], fmt[3])
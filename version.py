@@ -1,31 +1,76 @@
 # version.py
+import os
 import subprocess
+import sys
+from functools import lru_cache
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+GIT_DIR = os.path.join(ROOT_DIR, '.git')
+# git describe 结果缓存在 .git 目录内，HEAD 或标签变化时失效
+VERSION_CACHE = os.path.join(GIT_DIR, 'img_display_version')
 
 def get_git_version():
     try:
-        version = subprocess.check_output(['git', 'describe', '--tags']).strip().decode('utf-8')
+        version = subprocess.check_output(['git', 'describe', '--tags'], cwd=ROOT_DIR,
+                                          stderr=subprocess.DEVNULL).strip().decode('utf-8')
         return version
     except (subprocess.CalledProcessError, FileNotFoundError):
         return None
 
-# 在打包时使用这个版本信息
-try:
-    # 如果是打包后的环境，版本信息会被写入到 _MEIPASS 目录下的 version.txt 文件中
-    import sys
-    if hasattr(sys, '_MEIPASS'):
-        import os
-        version_file = os.path.join(sys._MEIPASS, 'version.txt')
-        if os.path.exists(version_file):
-            with open(version_file, 'r') as f:
-                version = f.read().strip()
-                __version__ = version
-        else:
-            __version__ = 'unknown'
-    else:
-        version = get_git_version()
-        if version:
-            __version__ = version
-        else:
-            __version__ = 'unknown'
-except Exception:
-    __version__ = 'unknown'
\ No newline at end of file
+def get_git_state():
+    # 读取 HEAD 指向的提交及标签的修改时间，作为缓存键，不启动 git 进程
+    with open(os.path.join(GIT_DIR, 'HEAD'), 'r') as f:
+        head = f.read().strip()
+    if head.startswith('ref: '):
+        ref_path = os.path.join(GIT_DIR, head[5:])
+        if os.path.exists(ref_path):
+            with open(ref_path, 'r') as f:
+                head = f.read().strip()
+    tag_mtimes = []
+    for path in (os.path.join(GIT_DIR, 'refs', 'tags'), os.path.join(GIT_DIR, 'packed-refs')):
+        if os.path.exists(path):
+            tag_mtimes.append(str(os.stat(path).st_mtime_ns))
+    return ' '.join([head] + tag_mtimes)
+
+def get_cached_git_version():
+    if not os.path.isdir(GIT_DIR):
+        return get_git_version()
+    try:
+        state = get_git_state()
+    except OSError:
+        return get_git_version()
+    try:
+        with open(VERSION_CACHE, 'r') as f:
+            cached_state, cached_version = f.read().split('\n', 1)
+        if cached_state == state:
+            return cached_version.strip() or None
+    except (OSError, ValueError):
+        pass
+    version = get_git_version()
+    try:
+        with open(VERSION_CACHE, 'w') as f:
+            f.write(f"{state}\n{version or ''}")
+    except OSError:
+        pass
+    return version
+
+@lru_cache(maxsize=None)
+def get_version():
+    # 每个进程只解析一次
+    try:
+        # 如果是打包后的环境，版本信息会被写入到 _MEIPASS 目录下的 version.txt 文件中
+        if hasattr(sys, '_MEIPASS'):
+            version_file = os.path.join(sys._MEIPASS, 'version.txt')
+            if os.path.exists(version_file):
+                with open(version_file, 'r') as f:
+                    return f.read().strip()
+            return 'unknown'
+        return get_cached_git_version() or 'unknown'
+    except Exception:
+        return 'unknown'
+
+def __getattr__(name):
+    # 兼容 from version import __version__，首次访问时才解析
+    if name == '__version__':
+        return get_version()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,22 +1,76 @@
+import hashlib
 import json
 import os
 import math
 from functools import lru_cache
-from flask import Flask, render_template, send_from_directory, abort, request, url_for, jsonify, Response, redirect, session
+from flask import Flask, render_template, stream_template, send_from_directory, abort, request, url_for, jsonify, Response, redirect, session, g
 from urllib.parse import quote, unquote
 import threading
+import time
 from typing import Tuple, Dict, List, Any
 from queue import Queue, Empty
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
+from itertools import islice
+import heapq
+import zlib
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from config import get_config
 import random
-from werkzeug.exceptions import BadRequest
+import shutil
+import tempfile
+from werkzeug.exceptions import BadRequest, HTTPException, NotFound, ServiceUnavailable
+from werkzeug.wsgi import ClosingIterator
+from image_index import ImageIndex, snapshot_tree
+from metrics import MetricsRegistry
+from sharding import ShardedIndex, ShardedCategoryMap, is_manifest
+from crawler import DirectoryCrawler, scan_bases, apply_scans, load_crawl_state, save_crawl_state
+from like_import import new_summary, iter_changes, count_change, collect_changes, apply_changes
+from category_tree import CategoryTree
+from admission import AdmissionGate, Rejected
+from bundle import BUNDLE_MIMETYPE, iter_frames
+from export import EXPORT_FORMATS, iter_view, iter_records, export_lines, batch_lines
+from compression import (CompressedCache, StaticAssets, COMPRESSIBLE_TYPES, available_encodings, compress,
+                         compress_stream, buffer_chunks, guess_mimetype)
+# 默认关闭的功能（SQLite、性能分析、旁路文件、变体、拼图、覆盖层、尺寸探测）在启用时才导入对应模块，
+# 无界面启动不加载 sqlite3、cProfile、pstats、pickle 等
+
+class DataWarmingUp(ServiceUnavailable):
+    description = '数据文件正在预热加载中，请稍后刷新页面。'
+
+class ImagesBusy(ServiceUnavailable):
+    description = '图片请求过多，请稍后重试。'
+
+# 数据集相关的路由同时注册在 /d/<json_id> 前缀下，这些地址不依赖 session，可被代理或CDN缓存
+DATASET_ENDPOINTS = ('show_categories', 'show_all_images', 'category_view', 'like_image', 'serve_image',
+                     'refresh_view', 'export_view', 'import_likes_view', 'tree_view', 'tree_children', 'subtree_view',
+                     'bundle_view')
+# 按索引版本生成 ETag 的页面
+CACHEABLE_ENDPOINTS = ('show_categories', 'show_all_images', 'category_view', 'tree_view', 'tree_children',
+                       'subtree_view')
+USER_COOKIE = 'img_display_user'
+
+
+def json_file_id(json_path: str) -> str:
+    # 由文件的真实路径得出的稳定编号，重启或调整 --input_json 顺序后不变
+    return hashlib.sha1(os.path.realpath(json_path).encode('utf-8')).hexdigest()[:12]
+
 
 class WebApp:
     def __init__(self, args):
         self.args = args
         self.json_files = args.input_json  # 存储多个JSON文件路径
+        self.json_ids = {}  # {编号: JSON文件路径}
+        for json_path in self.json_files:
+            self.json_ids.setdefault(json_file_id(json_path), json_path)
+        self.boot_id = f"{int(time.time()):x}"  # 区分进程重启前后的版本号
+        self.data_versions = defaultdict(int)  # 各JSON文件数据的修改次数 {path: n}
+        self.missing_version = 0  # 后台校验改变缺失标记的次数
+        self.cache_max_age = getattr(args, 'cache_max_age', 0)
+        self.compress_min_bytes = getattr(args, 'compress_min_bytes', 1024)  # 小于 0 表示关闭压缩
+        self.compress_encodings = available_encodings() if self.compress_min_bytes >= 0 else []
+        self.stream_min_images = getattr(args, 'stream_min_images', 0)  # 0 表示不使用流式渲染
+        self.compressed_cache = CompressedCache(int((getattr(args, 'compress_cache_mb', 32) or 0) * 1024 * 1024))
         self.replace_rules = args.replace if args.replace else []
         self.app = Flask(__name__)
         self.app.secret_key = os.urandom(24)  # 启用session
@@ -25,9 +79,85 @@ class WebApp:
         self.save_queue = Queue()
         self.save_thread_running = True
         self.cached_raw_data = {}  # 缓存各JSON文件数据 {path: data}
+        self.index_cache = {}  # 缓存各JSON文件的图片索引 {path: ImageIndex}
+        self.load_locks = {}  # 各JSON文件的加载锁 {path: Lock}
+        self.warmup_workers = getattr(args, 'warmup_workers', 0)
+        self.warmup_state = {}  # 预热状态 {path: pending/loading/ready/failed}
+        self.cache_budget = int((getattr(args, 'cache_mb', 0) or 0) * 1024 * 1024)  # 0 表示不限制
+        self.sidecar_dir = getattr(args, 'sidecar_dir', None)
+        self.cache_lru = OrderedDict()  # {path: 近似字节数}，最近使用的在末尾
+        self.cache_lock = threading.Lock()
+        self.pending_saves = defaultdict(int)  # 尚未落盘的保存数 {path: count}
+        self.save_generation = defaultdict(int)  # 各文件最新一次保存的序号
+        self.evicted_files = set()
+        self.loaded_shards = set()  # 加载过的分片，再次加载说明曾被逐出
+        self.store = None  # 可选的 SQLite 存储后端
+        self.store_files = {}  # 已导入的JSON文件 {path: file_id}
+        if getattr(args, 'sqlite_db', None):
+            from sqlite_store import SqliteStore
+            self.store = SqliteStore(args.sqlite_db)
+        self.crawler = DirectoryCrawler(getattr(args, 'crawl_workers', 8))
+        self.crawl_interval = getattr(args, 'crawl_interval', 0)
+        self.crawl_lock = threading.Lock()
+        self.crawl_states = {}  # 最近一次的爬虫状态 {path: state}
+        self.pending_crawl_states = {}  # 等待随JSON一起落盘的爬虫状态 {path: state}
+        self.validate_interval = getattr(args, 'validate_interval', 0)
+        self.validate_workers = getattr(args, 'validate_workers', 8)
+        self.hide_missing = getattr(args, 'hide_missing', False)
+        if self.store is not None and (self.validate_interval > 0 or self.hide_missing):
+            # 校验器只检查内存索引，SQLite 中的行不会被标记为缺失
+            self.app.logger.warning("Missing-file validation is not supported with --sqlite_db, "
+                                    "--validate_interval and --hide_missing disabled")
+            self.validate_interval = 0
+            self.hide_missing = False
+        self.missing_paths = set()  # 已确认缺失的图片路径，serve_image 直接返回404
+        self.trees = {}  # 目录树索引 {path: (索引或 file_id, CategoryTree)}
+        self.tree_likes = {}  # 子树点赞数 {path: (版本键, {节点路径: 点赞数})}
+        self.validate_event = threading.Event()
+        self.setup_metrics()
+        self.overlays = None  # 按用户的点赞覆盖层
+        self.user_header = getattr(args, 'user_header', None)
+        if getattr(args, 'overlay_dir', None):
+            if self.store is not None:
+                self.app.logger.warning("Per-user like overlays are not supported with --sqlite_db, overlays disabled")
+            else:
+                from overlays import LikeOverlays
+                self.overlays = LikeOverlays(args.overlay_dir, self.replace_rules)
+        self.prober = None  # 后台读取图片文件头得到宽高
+        self.probe_wait = (getattr(args, 'probe_wait_ms', 50) or 0) / 1000
+        if getattr(args, 'probe_workers', 0) > 0:
+            if self.store is not None:
+                self.app.logger.warning("Image dimension probing is not supported with --sqlite_db, probing disabled")
+            else:
+                self.setup_prober(args.probe_workers)
+        self.bundle_images = getattr(args, 'bundle_images', False)  # 页面图片通过 /bundle 一次取回
+        self.image_gate = None  # 图片发送的准入控制
+        if getattr(args, 'max_image_sends', 0) > 0:
+            self.setup_image_gate(args.max_image_sends)
+        self.variants = None
+        if getattr(args, 'variant_cache_dir', None):
+            self.setup_variants()
+        self.sprites = None
+        if getattr(args, 'sprite_cache_dir', None):
+            self.setup_sprites()
+        self.profiler = None
+        if getattr(args, 'profile_dir', None):
+            from profiler import RequestProfiler
+            self.profiler = RequestProfiler(
+                args.profile_dir,
+                threshold_ms=getattr(args, 'profile_threshold_ms', 500),
+                secret=getattr(args, 'profile_secret', None),
+                keep=getattr(args, 'profile_keep', 50),
+                sample_rate=getattr(args, 'profile_sample_rate', 0.01)
+            )
         self.save_consumer_thread = threading.Thread(target=self.save_consumer, daemon=True)
         self.save_consumer_thread.start()
         self.setup_routes()
+        self.start_warmup()
+        if self.crawl_interval > 0:
+            threading.Thread(target=self.run_crawler, daemon=True).start()
+        if self.validate_interval > 0:
+            threading.Thread(target=self.run_validator, daemon=True).start()
 
     def apply_replace_rules(self, data):
         if not self.replace_rules:
@@ -46,66 +176,881 @@ class WebApp:
         return json.loads(data_str)
 
     def setup_routes(self):
-        self.app.route('/')(self.show_categories)
-        self.app.route('/all')(self.show_all_images)
-        self.app.route('/category/<path:category>')(self.category_view)
-        self.app.route('/like_image', methods=['POST'])(self.like_image)
+        self.add_dataset_route('/', self.show_categories)
+        self.add_dataset_route('/all', self.show_all_images)
+        self.add_dataset_route('/category/<path:category>', self.category_view)
+        self.add_dataset_route('/like_image', self.like_image, methods=['POST'])
         self.app.route('/shutdown', methods=['GET', 'POST'])(self.shutdown)
-        self.app.route('/image/<category>/<path:filename>')(self.serve_image)
+        self.add_dataset_route('/image/<category>/<path:filename>', self.serve_image)
         self.app.route('/select_json/<int:json_index>')(self.select_json)
+        self.app.route('/ready')(self.readiness)
+        self.app.route('/metrics')(self.metrics_view)
+        self.add_dataset_route('/refresh', self.refresh_view, methods=['POST'])
+        self.app.route('/sprite/<name>')(self.serve_sprite)
+        self.add_dataset_route('/export', self.export_view)
+        self.add_dataset_route('/import_likes', self.import_likes_view, methods=['POST'])
+        self.add_dataset_route('/tree', self.tree_view)
+        self.add_dataset_route('/tree/children', self.tree_children)
+        self.add_dataset_route('/subtree/<path:path>', self.subtree_view)
+        self.add_dataset_route('/bundle', self.bundle_view)
+        self.app.route('/assets/<digest>/<path:filename>')(self.serve_asset)
+        self.assets = StaticAssets(self.app.static_folder)
+        self.app.add_template_global(self.asset_url, 'asset_url')
+        self.app.url_value_preprocessor(self.pull_json_id)
+        self.app.url_defaults(self.add_json_id)
+        self.app.route('/user')(self.select_user)
+        self.app.context_processor(lambda: {'dataset_urls': [
+            url_for('show_categories', json_id=json_file_id(path)) for path in self.json_files],
+            'current_user': self.current_user(),
+            'bundle_images': self.bundle_images,
+            'user_form': self.overlays is not None and not self.user_header})
+        self.app.before_request(self.start_request_timer)
+        self.app.before_request(self.check_not_modified)
+        # after_request 按注册的相反顺序执行：先设置缓存头，再压缩，最后记录指标
+        self.app.after_request(self.record_request_metrics)
+        self.app.after_request(self.compress_response)
+        self.app.after_request(self.add_cache_headers)
+        if self.profiler is not None:
+            # 分析文件包含请求路径与参数，没有密钥时不提供管理页面，只能在服务器上查看分析目录
+            if self.profiler.secret:
+                self.app.route('/_profiles')(self.list_profiles)
+                self.app.route('/_profiles/<path:name>')(self.download_profile)
+            else:
+                self.app.logger.warning("/_profiles requires --profile_secret, profiles are only written to "
+                                        f"{self.profiler.profile_dir}")
+            self.app.before_request(self.start_profiling)
+            self.app.after_request(self.finish_profiling)
+
+    def add_dataset_route(self, rule: str, view, **options):
+        # 无前缀的地址使用 session 中选择的数据集（兼容旧链接），/d/<json_id> 地址由 URL 指定数据集
+        self.app.route(rule, **options)(view)
+        self.app.route(f'/d/<json_id>{rule}', **options)(view)
+
+    def pull_json_id(self, endpoint, values):
+        if values and 'json_id' in values:
+            json_id = values.pop('json_id')
+            if json_id not in self.json_ids:
+                abort(404, description="Unknown dataset")
+            g.json_id = json_id
+
+    def add_json_id(self, endpoint, values):
+        # /d/<json_id> 页面中生成的链接保持在同一数据集下
+        if endpoint in DATASET_ENDPOINTS and 'json_id' not in values and g.get('json_id') is not None:
+            values['json_id'] = g.json_id
+
+    def index_version(self, json_path: str) -> str:
+        # 页面内容随本进程的数据修改、从磁盘或旁路文件（重新）加载、缺失标记和探测到的图片尺寸变化
+        version = f"{self.boot_id}.{self.data_versions[json_path]}.{self.missing_version}"
+        if self.prober is not None:
+            version += f".{self.prober.generation(json_path)}"
+        return version
+
+    def bump_version(self, json_path: str):
+        self.data_versions[json_path] += 1
+
+    def dataset_etag(self) -> str:
+        etag = f"{g.json_id}-{self.index_version(self.json_ids[g.json_id])}"
+        user = self.current_user()
+        if user is not None:
+            # 用户的点赞覆盖层单独计版本，不同用户的页面互不复用
+            etag += f"-{user}.{self.overlays.version(self.json_ids[g.json_id], user)}"
+        return etag
+
+    def is_cacheable_page(self) -> bool:
+        # 视图可以设置 g.page_uncacheable，表示内容还会在版本不变的情况下变化（如拼图尚未生成）
+        return (g.get('json_id') is not None and request.endpoint in CACHEABLE_ENDPOINTS and request.method == 'GET'
+                and not g.get('page_uncacheable'))
+
+    def check_not_modified(self):
+        # 索引版本未变化时直接返回 304 或缓存的压缩页面，不加载数据也不渲染模板。
+        # 版本在渲染前取得，渲染期间数据变化只会使下次请求多渲染一次，不会缓存过期内容
+        if not self.is_cacheable_page():
+            return None
+        json_path = self.json_ids[g.json_id]
+        if self.store is None and json_path not in self.index_cache:
+            # 文件未加载或已被逐出，期间JSON可能被外部改写：先加载（加载会改变版本），再比较版本
+            self.get_image_index(json_path)
+        g.dataset_etag = self.dataset_etag()
+        if request.if_none_match.contains_weak(g.dataset_etag):
+            response = Response(status=304)
+            response.set_etag(g.dataset_etag, weak=True)
+            self.set_cache_control(response, page=True)
+            return response
+        encoding = self.negotiate_encoding()
+        cached = self.compressed_cache.get((request.full_path, g.dataset_etag, encoding)) if encoding else None
+        self.compressed_cache_requests.inc(result='hit' if cached else 'miss')
+        if cached is None:
+            return None
+        body, content_type = cached
+        response = Response(body, content_type=content_type)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def negotiate_encoding(self) -> str:
+        return request.accept_encodings.best_match(self.compress_encodings) if self.compress_encodings else None
+
+    def compress_response(self, response: Response) -> Response:
+        # 只压缩完整的 HTML/JSON 响应，文件与流式响应保持原样
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES
+                or not self.compress_encodings):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate_encoding()
+        data = response.get_data()
+        if encoding is None or len(data) < self.compress_min_bytes:
+            return response
+        body = compress(data, encoding)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        self.compressed_responses.inc(encoding=encoding)
+        self.compressed_bytes_saved.inc(len(data) - len(body))
+        if self.is_cacheable_page() and 'dataset_etag' in g:
+            self.compressed_cache.put((request.full_path, g.dataset_etag, encoding), body, response.content_type)
+        return response
+
+    def add_cache_headers(self, response: Response) -> Response:
+        if g.get('json_id') is None or request.method != 'GET' or response.status_code != 200:
+            return response
+        if g.get('page_uncacheable'):
+            response.cache_control.no_store = True
+        elif request.endpoint in CACHEABLE_ENDPOINTS:
+            # 同一版本的压缩与未压缩内容使用同一个弱 ETag
+            response.set_etag(g.get('dataset_etag') or self.dataset_etag(), weak=True)
+            self.set_cache_control(response, page=True)
+        elif request.endpoint == 'serve_image':
+            self.set_cache_control(response)  # 图片使用文件自身的 ETag/Last-Modified
+        return response
+
+    def set_cache_control(self, response: Response, page: bool = False):
+        if page and self.overlays is not None:
+            # 启用覆盖层时页面随用户变化，已识别用户的页面只允许浏览器缓存
+            response.vary.add('Cookie')
+            if self.user_header:
+                response.vary.add(self.user_header)
+        if page and self.current_user() is not None:
+            response.cache_control.private = True
+        else:
+            response.cache_control.public = True
+        if self.cache_max_age > 0:
+            response.cache_control.max_age = self.cache_max_age
+        else:
+            response.cache_control.no_cache = True  # 可以缓存，但每次使用前按 ETag 重新验证
+
+    def setup_metrics(self):
+        # 所有指标在请求路径上增量更新，抓取时不遍历任何数据
+        self.metrics = MetricsRegistry()
+        self.request_count = self.metrics.counter(
+            'img_display_http_requests_total', 'HTTP requests by route, method and status.',
+            ('route', 'method', 'status'))
+        self.request_latency = self.metrics.histogram(
+            'img_display_http_request_duration_seconds', 'HTTP request latency by route.', ('route',))
+        self.json_load_seconds = self.metrics.histogram(
+            'img_display_json_load_duration_seconds', 'Time spent reading and parsing input JSON files.')
+        self.index_build_seconds = self.metrics.histogram(
+            'img_display_index_build_duration_seconds', 'Time spent building the image index of a JSON file.')
+        self.save_seconds = self.metrics.histogram(
+            'img_display_save_duration_seconds', 'Time spent writing a JSON file back to disk.')
+        self.saves_coalesced = self.metrics.counter(
+            'img_display_saves_coalesced_total', 'Queued saves skipped because a newer save of the same file was queued.')
+        self.save_failures = self.metrics.counter(
+            'img_display_save_failures_total', 'Failed asynchronous JSON saves.')
+        self.cache_requests = self.metrics.counter(
+            'img_display_cache_requests_total', 'Cache lookups by cache and result (hit/miss).',
+            ('cache', 'result'))
+        self.image_bytes_served = self.metrics.counter(
+            'img_display_image_bytes_served_total', 'Bytes sent by serve_image and /bundle.')
+        self.bundle_images_sent = self.metrics.counter(
+            'img_display_bundle_images_total', 'Images requested through /bundle, by status (200/404).', ('status',))
+        self.compressed_responses = self.metrics.counter(
+            'img_display_compressed_responses_total', 'HTML/JSON responses compressed on the fly.', ('encoding',))
+        self.compressed_bytes_saved = self.metrics.counter(
+            'img_display_compressed_bytes_saved_total', 'Bytes saved by compressing responses.')
+        self.streamed_pages = self.metrics.counter(
+            'img_display_streamed_pages_total', 'Image pages rendered with template streaming.')
+        self.exported_records = self.metrics.counter(
+            'img_display_exported_records_total', 'Records streamed by /export.', ('format',))
+        self.imported_likes = self.metrics.counter(
+            'img_display_imported_likes_total', 'Lines processed by /import_likes, by result.', ('result',))
+        self.overlay_writes = self.metrics.counter(
+            'img_display_overlay_writes_total', 'Per-user like overlay files rewritten.')
+        self.compressed_cache_requests = self.metrics.counter(
+            'img_display_compressed_cache_requests_total', 'Compressed page cache lookups by result.', ('result',))
+        self.metrics.gauge(
+            'img_display_compressed_cache_bytes', 'Bytes held in the compressed page cache.'
+        ).set_function(lambda: self.compressed_cache.total_bytes)
+        self.metrics.gauge(
+            'img_display_save_queue_depth', 'Pending saves in save_queue.'
+        ).set_function(lambda: self.save_queue.qsize())
+        self.metrics.gauge(
+            'img_display_cached_json_files', 'Input JSON files held in memory.'
+        ).set_function(lambda: len(self.cached_raw_data))
+        self.cache_evictions = self.metrics.counter(
+            'img_display_cache_evictions_total', 'JSON files evicted from memory by the cache budget.')
+        self.crawl_seconds = self.metrics.histogram(
+            'img_display_crawl_duration_seconds', 'Time spent refreshing a JSON file from the image directories.')
+        self.crawl_changes = self.metrics.counter(
+            'img_display_crawl_changes_total', 'Images changed by directory refreshes, by change.', ('change',))
+        self.validate_seconds = self.metrics.histogram(
+            'img_display_validate_duration_seconds', 'Time spent checking that indexed image files exist.')
+        self.metrics.gauge(
+            'img_display_missing_images', 'Indexed images whose files were not found on disk.'
+        ).set_function(lambda: sum(index.missing_count for index in self.loaded_indexes()))
+        self.shard_loads = self.metrics.counter(
+            'img_display_shard_loads_total', 'Shards of sharded JSON files loaded on demand.')
+        self.cache_reloads = self.metrics.counter(
+            'img_display_cache_reloads_total', 'Evicted JSON files loaded again, by source.', ('source',))
+        self.metrics.gauge(
+            'img_display_cache_bytes', 'Approximate memory held by cached JSON files and indexes.'
+        ).set_function(lambda: sum(list(self.cache_lru.values())))
+        self.metrics.gauge(
+            'img_display_indexed_images', 'Images in all published indexes.'
+        ).set_function(lambda: sum(index.image_count() for index in list(self.index_cache.values())))
+
+    def setup_variants(self):
+        from variants import VariantCache, available_formats
+        formats = available_formats(getattr(self.args, 'variant_formats', None) or ['avif', 'webp'])
+        if not formats:
+            self.app.logger.warning("Pillow is not installed or supports none of the requested formats, "
+                                    "image variants disabled")
+            return
+        self.variant_requests = self.metrics.counter(
+            'img_display_variant_requests_total', 'Negotiated image requests by result (hit/original).', ('result',))
+        self.variant_encode_seconds = self.metrics.histogram(
+            'img_display_variant_encode_duration_seconds', 'Time spent transcoding an image variant.')
+        self.variants = VariantCache(
+            self.args.variant_cache_dir,
+            max_bytes=int((getattr(self.args, 'variant_cache_mb', 512) or 0) * 1024 * 1024),
+            workers=getattr(self.args, 'variant_workers', 2),
+            formats=formats,
+            encode_seconds=self.variant_encode_seconds
+        )
+        self.metrics.gauge(
+            'img_display_variant_cache_bytes', 'Bytes held in the image variant disk cache.'
+        ).set_function(lambda: self.variants.total_bytes)
+
+    def setup_sprites(self):
+        from sprites import SpriteCache, pillow_available
+        if not pillow_available():
+            self.app.logger.warning("Pillow is not installed, category sprites disabled")
+            return
+        self.sprite_build_seconds = self.metrics.histogram(
+            'img_display_sprite_build_duration_seconds', 'Time spent composing a category contact sheet.')
+        self.sprites = SpriteCache(
+            self.args.sprite_cache_dir,
+            max_bytes=int((getattr(self.args, 'sprite_cache_mb', 128) or 0) * 1024 * 1024),
+            workers=1,
+            tile=getattr(self.args, 'sprite_tile', 250),
+            build_seconds=self.sprite_build_seconds
+        )
+
+    def setup_prober(self, workers: int):
+        from dimensions import DimensionProber
+        self.dimension_probes = self.metrics.counter(
+            'img_display_dimension_probes_total', 'Image headers checked for dimensions, by result.', ('result',))
+        self.prober = DimensionProber(workers, probes=self.dimension_probes)
+        self.metrics.gauge(
+            'img_display_dimension_probe_queue', 'Batches of images waiting for dimension probing.'
+        ).set_function(self.prober.pending)
+
+    def setup_image_gate(self, limit: int):
+        self.image_gate = AdmissionGate(limit,
+                                        max_waiting=getattr(self.args, 'image_queue_depth', 64),
+                                        timeout=getattr(self.args, 'image_queue_timeout', 10))
+        self.image_queue_seconds = self.metrics.histogram(
+            'img_display_image_queue_wait_duration_seconds', 'Time image requests waited for a send slot.')
+        self.image_rejections = self.metrics.counter(
+            'img_display_image_rejections_total', 'Image requests answered with 503, by reason (full/timeout).',
+            ('reason',))
+        self.metrics.gauge(
+            'img_display_image_sends_active', 'Image files being sent.'
+        ).set_function(lambda: self.image_gate.active)
+        self.metrics.gauge(
+            'img_display_image_sends_waiting', 'Image requests queued for a send slot.'
+        ).set_function(lambda: self.image_gate.waiting)
+
+    def schedule_probe(self, json_path: str, index, previous=None):
+        # 分片文件的分片按需加载，只在显示页面时探测
+        if self.prober is not None and isinstance(index, ImageIndex):
+            self.prober.schedule(index, previous, key=json_path)
+
+    def probe_page(self, json_path: str, images: List[Dict]):
+        if self.prober is not None:
+            self.prober.fill(images, self.probe_wait, key=json_path)
+
+    def start_request_timer(self):
+        g.request_start = time.perf_counter()
+
+    def record_request_metrics(self, response: Response) -> Response:
+        start = g.pop('request_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            self.request_latency.observe(time.perf_counter() - start, route=route)
+            self.request_count.inc(route=route, method=request.method, status=response.status_code)
+        return response
+
+    def metrics_view(self) -> Response:
+        return Response(self.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    def start_profiling(self):
+        if request.endpoint in ('static', 'serve_asset', 'list_profiles', 'download_profile', 'metrics_view'):
+            return
+        forced = self.profiler.has_secret(request.headers)
+        if not forced and not self.profiler.is_sampled():
+            return
+        g.profile_forced = forced
+        g.profile_state = self.profiler.start()
+
+    def finish_profiling(self, response: Response) -> Response:
+        state = g.pop('profile_state', None)
+        if state is not None:
+            query = request.query_string.decode('utf-8', errors='replace')
+            path = self.profiler.stop(state, request.path, query, g.pop('profile_forced', False))
+            if path:
+                self.app.logger.info(f"Profile saved: {path}")
+        return response
+
+    def check_profile_secret(self):
+        if not self.profiler.has_secret(request.headers):
+            abort(403, description="Invalid profile secret")
+
+    def list_profiles(self) -> str:
+        self.check_profile_secret()
+        return render_template('profiles.html',
+                            profiles=self.profiler.list_profiles(),
+                            threshold_ms=self.profiler.threshold_ms,
+                            keep=self.profiler.keep)
+
+    def download_profile(self, name: str):
+        self.check_profile_secret()
+        if request.args.get('format') == 'text':
+            if not os.path.isfile(os.path.join(self.profiler.profile_dir, os.path.basename(name))):
+                abort(404, description="Profile not found")
+            return Response(self.profiler.summary(os.path.basename(name)), mimetype='text/plain')
+        return send_from_directory(self.profiler.profile_dir, name, as_attachment=True)
 
     def get_current_json_path(self):
+        if g.get('json_id') is not None:
+            return self.json_ids[g.json_id]
         current_index = session.get('current_json_index', 0)
         if current_index >= len(self.json_files):
             current_index = 0
             session['current_json_index'] = current_index
         return self.json_files[current_index]
 
+    def current_user(self) -> str:
+        # 启用覆盖层时识别当前用户：优先使用反向代理设置的请求头，否则使用 /user 设置的 Cookie
+        if self.overlays is None:
+            return None
+        from overlays import valid_user
+        user = (request.headers.get(self.user_header) if self.user_header else None) or request.cookies.get(USER_COOKIE)
+        return user if user and valid_user(user) else None
+
+    def user_likes(self, json_path: str):
+        # 当前用户的点赞路径集合；未启用覆盖层或未识别用户时返回 None，使用共享的 like 字段
+        user = self.current_user()
+        return self.overlays.liked(json_path, user) if user is not None else None
+
+    def select_user(self):
+        # 没有反向代理认证时由审阅人自己填写名字，保存在 Cookie 中；名字为空时退出
+        if self.overlays is None:
+            abort(404)
+        from overlays import valid_user
+        name = request.args.get('name', '').strip()
+        if name and not valid_user(name):
+            abort(400, description="User names may only contain letters, digits, '_', '.', '@' and '-'")
+        response = redirect(request.referrer or url_for('show_categories'))
+        if name:
+            response.set_cookie(USER_COOKIE, name, max_age=365 * 24 * 3600, samesite='Lax')
+        else:
+            response.delete_cookie(USER_COOKIE)
+        return response
+
+    def existing_paths(self, json_path: str, paths: List[str]) -> Tuple[List[str], List[str]]:
+        # 通过索引判断图片是否存在，返回 (找到的路径, 未找到的路径)
+        index = self.get_image_index(json_path)
+        if index is None:
+            abort(500, description=f"Load data failed for {json_path}")
+        found_paths, not_found_paths = [], []
+        for req_path in paths:
+            abs_path = os.path.normpath(req_path)
+            if isinstance(index, ShardedIndex):
+                exists = any(abs_path in index.load_shard(p).path_map for p in index.shards_for_path(abs_path))
+            else:
+                exists = abs_path in index.path_map
+            (found_paths if exists else not_found_paths).append(req_path)
+        return found_paths, not_found_paths
+
+    def current_json_index(self) -> int:
+        if g.get('json_id') is not None:
+            return self.json_files.index(self.json_ids[g.json_id])
+        return session.get('current_json_index', 0)
+
+    def read_json_file(self, json_path: str) -> Dict:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            raw_data = json.load(f)
+        return self.apply_replace_rules(raw_data)
+
+    def acquire_load_lock(self, json_path: str, wait: bool) -> threading.Lock:
+        # 同一文件只允许一个线程加载。预热尚未完成时其余请求直接返回预热中而不是排队等待；
+        # 预热关闭或已结束（如逐出后重新加载）时等待正在进行的加载，一页图片不会同时收到一批 503
+        load_lock = self.load_locks.setdefault(json_path, threading.Lock())
+        wait = wait or self.warmup_state.get(json_path) not in ('pending', 'loading')
+        if not load_lock.acquire(blocking=wait):
+            raise DataWarmingUp(retry_after=2)
+        return load_lock
+
+    def load_image_index(self, json_path: str, wait: bool = False) -> ImageIndex:
+        load_lock = self.acquire_load_lock(json_path, wait)
+        try:
+            index = self.index_cache.get(json_path)
+            raw_data = self.cached_raw_data.get(json_path)
+            if index is not None and index.raw_data is raw_data:
+                return index
+
+            if raw_data is None:
+                source = 'sidecar'
+                if self.sidecar_dir:
+                    from sidecar import read_sidecar
+                    with self.json_load_seconds.time():
+                        raw_data = read_sidecar(self.sidecar_dir, json_path, self.replace_rules)
+                if raw_data is None:
+                    source = 'json'
+                    try:
+                        with self.json_load_seconds.time():
+                            raw_data = self.read_json_file(json_path)
+                    except Exception as e:
+                        self.app.logger.error(f"Load data failed for {json_path}: {str(e)}")
+                        return None
+                if json_path in self.evicted_files:
+                    self.evicted_files.discard(json_path)
+                    self.cache_reloads.inc(source=source)
+                    self.app.logger.info(f"Reloaded evicted {json_path} from {source}")
+
+            with self.data_lock:
+                if json_path not in self.cached_raw_data:
+                    # 从磁盘或旁路文件读到的数据可能已被外部修改，之前缓存的页面全部失效
+                    self.cached_raw_data[json_path] = raw_data
+                    self.bump_version(json_path)
+                raw_data = self.cached_raw_data[json_path]
+                with self.index_build_seconds.time():
+                    index = self.build_index(json_path, raw_data)
+                self.index_cache[json_path] = index
+            with self.cache_lock:
+                self.cache_lru[json_path] = index.approx_bytes
+                self.cache_lru.move_to_end(json_path)
+        finally:
+            load_lock.release()
+        self.enforce_cache_budget(keep=json_path)
+        self.schedule_validation()
+        self.schedule_probe(json_path, index)
+        return index
+
+    def build_index(self, json_path: str, raw_data: Dict):
+        # 分片清单只构建分类列表，分片在访问分类时才加载，已加载分片同样受 --cache_mb 限制
+        if is_manifest(raw_data):
+            return ShardedIndex(json_path, raw_data, lambda shard_path: self.read_shard(json_path, shard_path),
+                                self.data_lock, lambda path: self.pending_saves.get(path), self.cache_budget)
+        return ImageIndex(raw_data)
+
+    def read_shard(self, json_path: str, shard_path: str) -> Dict:
+        self.shard_loads.inc()
+        with self.json_load_seconds.time():
+            data = self.read_json_file(shard_path)
+        if shard_path in self.loaded_shards:
+            # 被逐出的分片重新加载，文件可能已被外部改写
+            with self.data_lock:
+                self.bump_version(json_path)
+        self.loaded_shards.add(shard_path)
+        return data
+
+    def touch_cache(self, json_path: str):
+        with self.cache_lock:
+            if json_path in self.cache_lru:
+                self.cache_lru.move_to_end(json_path)
+
+    def enforce_cache_budget(self, keep: str = None):
+        # 按最近最少使用顺序逐出没有待保存数据的文件，直到总量回到预算内
+        if self.cache_budget <= 0:
+            return
+        with self.cache_lock:
+            total = sum(self.cache_lru.values())
+            candidates = [path for path in self.cache_lru if path != keep]
+        for json_path in candidates:
+            if total <= self.cache_budget:
+                break
+            total -= self.evict_json_file(json_path)
+
+    def evict_json_file(self, json_path: str) -> int:
+        with self.data_lock:
+            if self.pending_saves.get(json_path):
+                return 0
+            raw_data = self.cached_raw_data.pop(json_path, None)
+            self.index_cache.pop(json_path, None)
+            with self.cache_lock:
+                size = self.cache_lru.pop(json_path, 0)
+            if raw_data is None:
+                return size
+            # 无待保存数据时内存内容与磁盘一致；在锁内记下JSON的状态，释放锁后再序列化
+            header = None
+            if self.sidecar_dir:
+                from sidecar import sidecar_header
+                try:
+                    header = sidecar_header(json_path, self.replace_rules)
+                except OSError as e:
+                    self.app.logger.error(f"Write sidecar failed for {json_path}: {str(e)}")
+        # 已移出缓存的数据不会再被修改，写旁路文件供下次快速加载，不阻塞点赞和其他文件的加载
+        if header is not None:
+            from sidecar import write_sidecar
+            try:
+                write_sidecar(self.sidecar_dir, json_path, self.replace_rules, raw_data, header)
+            except Exception as e:
+                self.app.logger.error(f"Write sidecar failed for {json_path}: {str(e)}")
+        self.evicted_files.add(json_path)
+        self.cache_evictions.inc()
+        self.app.logger.info(f"Evicted {json_path} (~{size / 1024 / 1024:.1f} MB) from cache")
+        return size
+
+    def get_image_index(self, json_path: str) -> ImageIndex:
+        # 已发布的索引直接返回，无需加锁
+        index = self.index_cache.get(json_path)
+        if index is not None and index.raw_data is self.cached_raw_data.get(json_path):
+            self.cache_requests.inc(cache='index', result='hit')
+            if self.cache_budget:
+                self.touch_cache(json_path)
+            return index
+        self.cache_requests.inc(cache='index', result='miss')
+        if self.warmup_state.get(json_path) in ('pending', 'loading'):
+            raise DataWarmingUp(retry_after=2)
+        return self.load_image_index(json_path)
+
+    def load_store_file(self, json_path: str, wait: bool = False) -> int:
+        # 与 load_image_index 相同的加载锁语义，导入完成后记录 file_id
+        load_lock = self.acquire_load_lock(json_path, wait)
+        try:
+            file_id = self.store_files.get(json_path)
+            if file_id is not None:
+                return file_id
+            try:
+                with self.json_load_seconds.time():
+                    file_id = self.store.import_json(json_path, self.read_json_file, self.replace_rules)
+            except Exception as e:
+                self.app.logger.error(f"Load data failed for {json_path}: {str(e)}")
+                return None
+            self.store_files[json_path] = file_id
+            return file_id
+        finally:
+            load_lock.release()
+
+    def get_store_file(self, json_path: str) -> int:
+        file_id = self.store_files.get(json_path)
+        if file_id is not None:
+            return file_id
+        if self.warmup_state.get(json_path) in ('pending', 'loading'):
+            raise DataWarmingUp(retry_after=2)
+        file_id = self.load_store_file(json_path)
+        if file_id is None:
+            abort(500, description=f"Load data failed for {json_path}")
+        return file_id
+
     def load_image_data(self) -> Tuple[Dict[str, List[Dict]], Dict[str, str]]:
         json_path = self.get_current_json_path()
-        
-        with self.data_lock:
-            if json_path not in self.cached_raw_data:
+        index = self.get_image_index(json_path)
+        if index is None:
+            return defaultdict(list), {}
+        return index.category_map, index.file_map
+
+    def loaded_indexes(self) -> List[ImageIndex]:
+        # 所有已加载的 ImageIndex，分片文件展开为已加载的分片
+        indexes = []
+        for index in list(self.index_cache.values()):
+            if isinstance(index, ShardedIndex):
+                indexes.extend(list(index.shards.values()))
+            else:
+                indexes.append(index)
+        return indexes
+
+    def schedule_validation(self):
+        if self.validate_interval > 0:
+            self.validate_event.set()
+
+    def validate_index(self, index: ImageIndex) -> int:
+        # 在有界线程池中 stat 索引中的所有图片，结果写回 missing 标记并缓存缺失路径
+        def find_missing(chunk):
+            return [path for path in chunk if not os.path.isfile(path)]
+
+        paths = list(index.path_map)
+        chunks = [paths[i:i + 256] for i in range(0, len(paths), 256)]
+        with self.validate_seconds.time():
+            with ThreadPoolExecutor(max_workers=self.validate_workers) as executor:
+                missing = {path for result in executor.map(find_missing, chunks) for path in result}
+        if any(index.path_map[path].get('missing', False) != (path in missing) for path in paths):
+            self.missing_version += 1
+        for path in paths:
+            index.path_map[path]['missing'] = path in missing
+        index.missing_count = len(missing)
+        index.validated_at = time.time()
+        self.missing_paths = (self.missing_paths - set(paths)) | missing
+        return len(missing)
+
+    def run_validator(self):
+        # 新加载的索引立即校验，之后每隔 validate_interval 秒重新校验全部
+        next_full = 0
+        while self.save_thread_running:
+            self.validate_event.clear()
+            full = time.monotonic() >= next_full
+            if full:
+                next_full = time.monotonic() + self.validate_interval
+            for index in self.loaded_indexes():
+                if not full and index.validated_at is not None:
+                    continue
                 try:
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        raw_data = json.load(f)
-                        self.cached_raw_data[json_path] = self.apply_replace_rules(raw_data)
+                    missing = self.validate_index(index)
                 except Exception as e:
-                    self.app.logger.error(f"Load data failed for {json_path}: {str(e)}")
-                    return defaultdict(list), {}
-
-            img_data = self.cached_raw_data[json_path].get('img', {})
-            category_map = defaultdict(list)
-            file_map = {}
-
-            def walk_tree(node, current_rel_path, base_abs):
-                for key, value in node.items():
-                    if isinstance(value, dict):
-                        if 'face_scores' in value:
-                            if not value.get('face_scores'):
-                                continue
-
-                            abs_path = os.path.normpath(os.path.join(base_abs, current_rel_path, key))
-                            parent_relative_dir = current_rel_path.replace('\\', '/')
-                            dir_name = os.path.basename(base_abs) if parent_relative_dir == "" else parent_relative_dir
-                            img_info = {
-                                'filename': key,
-                                'category': dir_name,
-                                'path': abs_path,
-                                'face_scores': value.get('face_scores', []),
-                                'landmark_scores': value.get('face_landmark_scores_68', []),
-                                'like': value.get('like', False)
-                            }
-                            category_map[dir_name].append(img_info)
-                            file_map[f"{dir_name}/{key}"] = abs_path
-                        else:
-                            walk_tree(value, os.path.join(current_rel_path, key), base_abs)
-
-            for base in img_data:
-                base_abs = os.path.abspath(os.path.normpath(base))
-                walk_tree(img_data[base], "", base_abs)
-
-            return category_map, file_map
+                    self.app.logger.error(f"Validate failed: {str(e)}")
+                    continue
+                if missing:
+                    self.app.logger.warning(f"{missing} of {index.image_count()} indexed images are missing on disk")
+            self.validate_event.wait(max(next_full - time.monotonic(), 0))
+
+    def start_warmup(self):
+        if self.warmup_workers <= 0 or not self.json_files:
+            return
+        for json_path in self.json_files:
+            self.warmup_state[json_path] = 'pending'
+        threading.Thread(target=self.run_warmup, daemon=True).start()
+
+    def run_warmup(self):
+        json_paths = list(dict.fromkeys(self.json_files))
+        total = len(json_paths)
+        finished = 0
+        print(f"开始预热 {total} 个JSON文件（{self.warmup_workers} 个线程）...")
+        with ThreadPoolExecutor(max_workers=min(self.warmup_workers, total)) as executor:
+            futures = {executor.submit(self.warm_json_file, path): path for path in json_paths}
+            for future in as_completed(futures):
+                finished += 1
+                json_path = futures[future]
+                print(f"预热进度 [{finished}/{total}] {json_path}: {self.warmup_state.get(json_path)}")
+        print("预热完成")
+
+    def warm_json_file(self, json_path: str):
+        self.warmup_state[json_path] = 'loading'
+        load = self.load_store_file if self.store is not None else self.load_image_index
+        try:
+            index = load(json_path, wait=True)
+        except Exception as e:
+            self.app.logger.error(f"Warm up failed for {json_path}: {str(e)}")
+            index = None
+        self.warmup_state[json_path] = 'ready' if index is not None else 'failed'
+
+    def readiness(self) -> Response:
+        files = []
+        for json_path in self.json_files:
+            state = self.warmup_state.get(json_path)
+            missing = 0
+            if self.store is not None:
+                file_id = self.store_files.get(json_path)
+                loaded = file_id is not None
+                images = self.store.image_count(file_id) if loaded else 0
+            else:
+                index = self.index_cache.get(json_path)
+                loaded = index is not None
+                images = index.image_count() if loaded else 0
+                if isinstance(index, ShardedIndex):
+                    missing = sum(shard.missing_count for shard in list(index.shards.values()))
+                elif loaded:
+                    missing = index.missing_count
+            if state is None:
+                state = 'ready' if loaded else 'lazy'
+            files.append({
+                'path': json_path,
+                'state': state,
+                'images': images,
+                'missing': missing
+            })
+        loading = sum(1 for f in files if f['state'] in ('pending', 'loading'))
+        response = {
+            'ready': loading == 0,
+            'total': len(files),
+            'loaded': sum(1 for f in files if f['state'] == 'ready'),
+            'files': files
+        }
+        return jsonify(response), (200 if loading == 0 else 503)
+
+    def refresh_json_file(self, json_path: str, full: bool = False) -> Dict:
+        # 扫描目录与重建索引都不持有 data_lock，只有合并和替换索引在锁内；仅支持普通JSON文件
+        if self.store is not None:
+            return None
+        with self.crawl_lock, self.crawl_seconds.time():
+            for _ in range(3):
+                index = self.get_image_index(json_path)
+                if index is None or isinstance(index, ShardedIndex):
+                    return None
+                raw_data = index.raw_data
+                with self.data_lock:
+                    img_data = dict(raw_data.get('img', {}))
+                crawl_state = self.crawl_states.get(json_path)
+                if crawl_state is None:
+                    crawl_state = load_crawl_state(json_path)
+                scans = scan_bases(img_data, crawl_state, self.crawler, full)
+                with self.data_lock:
+                    # 扫描期间文件可能被逐出并重新加载，之后的点赞写在新数据上；
+                    # 此时合并并保存旧数据会覆盖这些点赞，重新扫描
+                    if (self.index_cache.get(json_path) is not index
+                            or self.cached_raw_data.get(json_path) is not raw_data):
+                        continue
+                    new_state, counts = apply_scans(raw_data.setdefault('img', {}), crawl_state, scans)
+                    changes = {key: counts[key] for key in ('added', 'removed', 'missing', 'restored', 'modified')}
+                    if any(changes.values()):
+                        raw_data['date_updated'] = datetime.now().astimezone().isoformat()
+                        # 爬虫状态在JSON成功写入后才落盘，保存失败时重启后会重新发现这些变化
+                        self.pending_crawl_states[json_path] = new_state
+                        self.queue_save(json_path, raw_data.copy())
+                        self.bump_version(json_path)
+                    version = self.data_versions[json_path]
+                break
+            else:
+                self.app.logger.warning(f"Refresh of {json_path} skipped: the file was reloaded during every scan")
+                return None
+            self.crawl_states[json_path] = new_state
+            if not any(changes.values()) and new_state != crawl_state:
+                save_crawl_state(json_path, new_state)
+        if any(changes.values()):
+            new_index = self.publish_rebuilt_index(json_path, index, version)
+            if new_index is not None:
+                self.schedule_validation()
+                self.schedule_probe(json_path, new_index, previous=index)
+        for change, count in changes.items():
+            if count:
+                self.crawl_changes.inc(count, change=change)
+        return counts
+
+    def publish_rebuilt_index(self, json_path: str, index: ImageIndex, version: int) -> ImageIndex:
+        # 在锁内复制目录结构，在锁外用快照重建索引，只在锁内比较并替换：索引已被替换（逐出或重新加载）时放弃；
+        # 构建期间有点赞（版本变化）时新索引中的点赞状态可能过期，重新构建，最后一次在锁内构建
+        raw_data = index.raw_data
+        for attempt in range(3):
+            if attempt < 2:
+                with self.data_lock:
+                    img_data = snapshot_tree(raw_data.get('img', {}))
+                with self.index_build_seconds.time():
+                    new_index = ImageIndex(raw_data, img_data)
+            with self.data_lock:
+                if self.index_cache.get(json_path) is not index:
+                    return None
+                if attempt == 2:
+                    with self.index_build_seconds.time():
+                        new_index = ImageIndex(raw_data)
+                elif self.data_versions[json_path] != version:
+                    version = self.data_versions[json_path]
+                    continue
+                self.index_cache[json_path] = new_index
+                # 替换前渲染的页面来自旧索引，换新版本号使其 ETag 失效
+                self.bump_version(json_path)
+                with self.cache_lock:
+                    if json_path in self.cache_lru:
+                        self.cache_lru[json_path] = new_index.approx_bytes
+                return new_index
+
+    def run_crawler(self):
+        # 定期增量刷新已加载的JSON文件
+        while self.save_thread_running:
+            time.sleep(self.crawl_interval)
+            for json_path in list(self.index_cache):
+                try:
+                    counts = self.refresh_json_file(json_path)
+                except Exception as e:
+                    self.app.logger.error(f"Refresh failed for {json_path}: {str(e)}")
+                    continue
+                if counts and counts['dirs_rescanned']:
+                    self.app.logger.info(f"Refreshed {json_path}: {counts}")
+
+    def refresh_view(self) -> Response:
+        json_path = self.get_current_json_path()
+        counts = self.refresh_json_file(json_path, full=request.args.get('full') == '1')
+        if counts is None:
+            return jsonify({'success': False, 'message': 'Refresh is only supported for plain JSON files'}), 409
+        return jsonify({'success': True, 'path': json_path, **counts})
+
+    def export_view(self) -> Response:
+        # 流式导出：逐条生成记录并分块发送，不构建列表也不持有 data_lock
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            abort(400, description="Unsupported export format")
+        view = request.args.get('view') or None
+        min_score = request.args.get('min_score', type=float)
+        max_score = request.args.get('max_score', type=float)
+        json_path = self.get_current_json_path()
+        if self.store is not None:
+            file_id = self.get_store_file(json_path)
+            if view not in (None, '_favorites', '_unfavorites') and not self.store.has_category(file_id, view):
+                abort(404, description="Category not found")
+            images = self.store.iter_images(file_id, view)
+        else:
+            category_map, _ = self.load_image_data()
+            if view not in (None, '_favorites', '_unfavorites') and view not in category_map:
+                abort(404, description="Category not found")
+            images = iter_view(category_map, view, self.user_likes(json_path))
+        if self.hide_missing:
+            images = (img for img in images if not img.get('missing'))
+
+        def generate():
+            for record in iter_records(images, min_score, max_score):
+                self.exported_records.inc(format=fmt)
+                yield record
+
+        name = f"{os.path.splitext(os.path.basename(json_path))[0]}-{(view or 'all').strip('_').replace('/', '_')}.{fmt}"
+        response = Response(batch_lines(export_lines(generate(), fmt)), mimetype=EXPORT_FORMATS[fmt])
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(name)}"
+        return response
+
+    def import_likes_view(self) -> Response:
+        # 批量导入点赞：逐行读取请求体或上传的文件，整批在一次写入、一次保存中完成
+        json_path = self.get_current_json_path()
+        upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+        source = upload.stream if upload is not None else request.stream
+        summary = new_summary()
+        date_updated = datetime.now().astimezone().isoformat()
+        if self.store is not None:
+            file_id = self.get_store_file(json_path)
+            # 先把请求体写入临时文件，SQLite 写事务不必等待客户端上传
+            with tempfile.TemporaryFile() as spool:
+                shutil.copyfileobj(source, spool)
+                spool.seek(0)
+                applied = self.store.import_likes(file_id, iter_changes(spool, summary), date_updated,
+                                                  lambda path, liked, found: count_change(summary, path, liked, found))
+        else:
+            index = self.get_image_index(json_path)
+            if index is None:
+                return jsonify({'success': False, 'message': f"Load data failed for {json_path}"}), 500
+            if isinstance(index, ShardedIndex):
+                return jsonify({'success': False, 'message': 'Like import is not supported for sharded files'}), 409
+            # 解析与路径查找不持有 data_lock，锁内只写入已解析的节点
+            wanted = collect_changes(source, index, summary)
+            user = self.current_user()
+            if user is not None:
+                # 已识别的用户导入到自己的覆盖层
+                changes = {abs_path: liked for files in wanted.values() for abs_path, liked in files.values()}
+                if self.overlays.apply(json_path, user, changes):
+                    self.overlay_writes.inc()
+                return self.import_summary(summary)
+            with self.data_lock:
+                # 期间目录刷新重建了索引时写入新发布的索引
+                index = self.index_cache.get(json_path, index)
+                applied = apply_changes(index, wanted)
+                if applied:
+                    index.raw_data['date_updated'] = date_updated
+                    self.queue_save(json_path, index.raw_data.copy())
+        if applied:
+            self.bump_version(json_path)
+        return self.import_summary(summary)
+
+    def import_summary(self, summary: Dict) -> Response:
+        for result in ('applied', 'unknown', 'invalid'):
+            if summary[result]:
+                self.imported_likes.inc(summary[result], result=result)
+        return jsonify({'success': True, **summary})
 
     def select_json(self, json_index):
         # 有效索引范围检查
@@ -113,30 +1058,163 @@ class WebApp:
             json_index = 0
         
         session['current_json_index'] = json_index
-        return redirect(request.referrer or url_for('show_categories'))
+        # 跳转到该数据集的 /d/<json_id> 地址，之后的页面不再依赖 session
+        return redirect(url_for('show_categories', json_id=json_file_id(self.json_files[json_index])))
 
-    def serve_image(self, category: str, filename: str):
+    def find_image_path(self, category: str, filename: str) -> str:
+        if self.store is not None:
+            file_id = self.get_store_file(self.get_current_json_path())
+            return self.store.find_image(file_id, category, filename)
         category_map, file_map = self.load_image_data()
-        unique_id = f"{unquote(category)}/{filename}"
-        
-        if unique_id not in file_map:
+        return file_map.get(f"{category}/{filename}")
+
+    def serve_image(self, category: str, filename: str):
+        image_path = self.find_image_path(unquote(category), filename)
+
+        if image_path is None:
             abort(404, description="Image not found")
-            
-        return send_from_directory(
-            os.path.dirname(file_map[unique_id]),
-            os.path.basename(file_map[unique_id])
-        )
+        # 后台校验已确认缺失的文件直接返回，不再访问磁盘
+        if image_path in self.missing_paths:
+            abort(404, description="Image file missing")
+        if self.image_gate is None:
+            return self.send_image_file(image_path)
+        self.admit_image()
+        try:
+            response = self.send_image_file(image_path)
+        except Exception:
+            self.image_gate.release()
+            raise
+        # 名额在文件发送完成、响应体关闭时归还。send_file 的响应直接交给服务器迭代，
+        # 不会调用 Response.close，所以包装响应体而不是用 call_on_close
+        response.response = ClosingIterator(response.response, self.image_gate.release)
+        return response
+
+    def bundle_view(self) -> Response:
+        # GET /bundle?category=&page=&seed=：按与图片页相同的分页，按顺序流式返回当前页各图片的帧，格式见 bundle.py。
+        # ETag 由数据集、页码参数与各帧实际发送的文件（原图或变体）的大小和修改时间得出，浏览器可以缓存打包并用
+        # If-None-Match 重新验证；页面网格显示的就是原图，没有单独的缩略图，有变体时发送变体。整个打包只占用一个图片发送名额
+        page = max(request.args.get('page', 1, type=int), 1)
+        category = request.args.get('category') or None
+        seed = request.args.get('seed') or None
+        paginated, _, _ = self.select_page(page, category, seed)
+        accept = request.accept_mimetypes
+        entries = []
+        digest = hashlib.sha1(json.dumps([self.get_current_json_path(), category, page, seed]).encode('utf-8'))
+        for index, image in enumerate(paginated):
+            name = f"{image['category']}/{image['filename']}"
+            path = image['path']
+            if image.get('missing') or path in self.missing_paths:
+                entry = (index, None, None, name)
+            else:
+                variant = self.variants.lookup(path, accept) if self.variants is not None else None
+                if variant is not None:
+                    entry = (index, os.path.join(self.variants.cache_dir, variant[0]), variant[1], name)
+                else:
+                    entry = (index, path, guess_mimetype(path), name)
+            try:
+                stat = os.stat(entry[1]) if entry[1] is not None else None
+            except OSError:
+                stat, entry = None, (index, None, None, name)
+            digest.update(json.dumps([entry, stat and [stat.st_size, stat.st_mtime_ns]]).encode('utf-8'))
+            entries.append(entry)
+
+        etag = digest.hexdigest()
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            for status in (200, 404):
+                count = sum((entry[1] is not None) == (status == 200) for entry in entries)
+                if count:
+                    self.bundle_images_sent.inc(count, status=str(status))
+            body = iter_frames(entries, self.image_bytes_served)
+            if self.image_gate is not None:
+                self.admit_image()
+                body = ClosingIterator(body, self.image_gate.release)
+            response = Response(body, mimetype=BUNDLE_MIMETYPE)
+        response.set_etag(etag)
+        # 收藏页的内容随用户的点赞覆盖层变化，与页面使用相同的缓存范围
+        self.set_cache_control(response, page=True)
+        if self.variants is not None:
+            response.vary.add('Accept')
+        return response
+
+    def admit_image(self):
+        # 排队已满时立即拒绝，不再占用线程等待
+        try:
+            waited = self.image_gate.acquire()
+        except Rejected as e:
+            self.image_rejections.inc(reason=e.reason)
+            raise ImagesBusy(retry_after=1)
+        self.image_queue_seconds.observe(waited)
+
+    def send_image_file(self, image_path: str) -> Response:
+        response = self.send_variant(image_path) if self.variants is not None else None
+        if response is None:
+            try:
+                response = send_from_directory(
+                    os.path.dirname(image_path),
+                    os.path.basename(image_path)
+                )
+            except NotFound:
+                if self.validate_interval > 0:
+                    self.missing_paths.add(image_path)  # 下次校验时若文件恢复会被清除
+                raise
+        if self.variants is not None:
+            response.vary.add('Accept')
+        self.image_bytes_served.inc(getattr(response, 'content_length', None) or 0)
+        return response
+
+    def send_variant(self, image_path: str):
+        # 变体就绪时发送变体，否则返回 None 发送原图（转码在后台进行，请求从不等待）
+        variant = self.variants.lookup(image_path, request.accept_mimetypes)
+        if variant is None:
+            if self.variants.negotiate(request.accept_mimetypes) is not None:
+                self.variant_requests.inc(result='original')
+            return None
+        name, mimetype = variant
+        try:
+            response = send_from_directory(self.variants.cache_dir, name, mimetype=mimetype)
+        except NotFound:
+            return None  # 变体刚被清理，发送原图
+        self.variant_requests.inc(result='hit')
+        return response
 
     def render_category_view(self, page: int, category: str = None, seed: str = None) -> str:
+        if self.store is not None:
+            return self.render_store_view(page, category, seed)
+        category_map, _ = self.load_image_data()
+        json_path = self.get_current_json_path()
+        liked = self.user_likes(json_path)
+        paginated, total_pages, total_images = self.select_page(page, category, seed)
+        return self.render_page(json_path, paginated, liked, page, total_pages, category, sorted(category_map.keys()),
+                                seed, total_images)
+
+    def select_page(self, page: int, category: str = None, seed: str = None) -> Tuple[List[Dict], int, int]:
+        # 返回 (当前页图片, 总页数, 总图片数)；图片页与 /bundle 使用同一分页，打包的内容与页面一致
+        per_page = self.app.config['PER_PAGE']
+        if self.store is not None:
+            file_id = self.get_store_file(self.get_current_json_path())
+            paginated, total_images = self.store.page_images(file_id, category, page, per_page, seed)
+            return paginated, self.count_pages(total_images, per_page), total_images
         category_map, _ = self.load_image_data()
-        sorted_categories = sorted(category_map.keys())
+        liked = self.user_likes(self.get_current_json_path())
+        if isinstance(category_map, ShardedCategoryMap) and category in (None, '_favorites', '_unfavorites'):
+            paginated, total_images = self.sharded_page(category_map, category, page, per_page, seed, liked)
+            return paginated, self.count_pages(total_images, per_page), total_images
 
-        if category == '_favorites':
+        if category == '_favorites' and liked is not None:
+            items = [img for cat_imgs in category_map.values() for img in cat_imgs if img['path'] in liked]
+        elif category == '_unfavorites' and liked is not None:
+            items = [img for cat_imgs in category_map.values() for img in cat_imgs if img['path'] not in liked]
+        elif category == '_favorites':
             items = [img for cat_imgs in category_map.values() for img in cat_imgs if img.get('like')]
         elif category == '_unfavorites':
             items = [img for cat_imgs in category_map.values() for img in cat_imgs if not img.get('like', False)]
         else:
-            items = category_map.get(category, []) if category else [img for cat in sorted_categories for img in category_map.get(cat, [])]
+            items = category_map.get(category, []) if category else [img for cat in sorted(category_map.keys()) for img in category_map.get(cat, [])]
+
+        if self.hide_missing:
+            items = [img for img in items if not img.get('missing')]
 
         if seed and category in ('_favorites', '_unfavorites'):
             try:
@@ -145,38 +1223,291 @@ class WebApp:
             except ValueError:
                 random.shuffle(items)
 
-        paginated, total_pages = self.paginate(items, page, self.app.config['PER_PAGE'])
-        total_images = len(items)  # 计算总图片数量
-        return render_template('index.html',
-                            images=paginated,
+        paginated, total_pages = self.paginate(items, page, per_page)
+        return paginated, total_pages, len(items)
+
+    @staticmethod
+    def count_pages(total_images: int, per_page: int) -> int:
+        if total_images == 0:
+            return 1
+        return math.ceil(total_images / per_page) if per_page > 0 else 0
+
+    def render_page(self, json_path: str, paginated: List[Dict], liked, page: int, total_pages: int,
+                    category: str, sorted_categories: List[str], seed: str, total_images: int):
+        self.probe_page(json_path, paginated)
+        if liked is not None:
+            # 只为当前页复制图片信息并合并用户的点赞状态，共享索引保持不变
+            paginated = [dict(img, like=img['path'] in liked) for img in paginated]
+        return self.render_index(images=paginated,
                             current_page=page,
                             total_pages=total_pages,
+                            page_window=self.page_window(page, total_pages),
                             category=category,
                             all_categories=sorted_categories,
                             json_files=self.json_files,
-                            current_json_index=session.get('current_json_index', 0),
+                            current_json_index=self.current_json_index(),
                             seed=seed,
                             total_images=total_images)  # 传递总图片数量
 
+    def sharded_page(self, category_map: ShardedCategoryMap, category: str, page: int, per_page: int,
+                     seed: str, liked) -> Tuple[List[Dict], int]:
+        # 分片清单的"所有分类"与收藏/未收藏页：逐个分类加载分片，只保留当前页，不构建完整列表；
+        # 已加载的分片受 --cache_mb 限制，超过内存容量的数据集也能分页
+        start = (max(page, 1) - 1) * per_page
+        if per_page <= 0:
+            start = per_page = 0
+        if category is None:
+            # 总数取自清单，整体跳过当前页之前的分类，只加载当前页涉及的分片
+            entries = category_map.index.categories
+            names = sorted(category_map)
+            selected = []
+            for name in names:
+                if len(selected) >= per_page:
+                    break
+                count = entries[name]['images']
+                if start >= count:
+                    start -= count
+                    continue
+                selected.extend(category_map[name][start:start + per_page - len(selected)])
+                start = 0
+            if self.hide_missing:
+                selected = [img for img in selected if not img.get('missing')]
+            return selected, sum(entries[name]['images'] for name in names)
+
+        # 点赞状态只有加载分片后才知道：流式遍历计数；带种子时按路径散列取前 start + per_page 个作为随机顺序
+        total = 0
+
+        def counted(images):
+            nonlocal total
+            for img in images:
+                if not (self.hide_missing and img.get('missing')):
+                    total += 1
+                    yield img
+
+        images = counted(iter_view(category_map, category, liked))
+        if seed and per_page > 0:
+            def shuffle_key(img):
+                return zlib.crc32(f"{seed}:{img['path']}".encode('utf-8'))
+            selected = heapq.nsmallest(start + per_page, images, key=shuffle_key)[start:]
+        else:
+            selected = list(islice(images, start, start + per_page))
+            deque(images, maxlen=0)  # 遍历剩余部分以统计总数
+        return selected, total
+
+    def render_index(self, **context):
+        # 图片很多的页面使用流式渲染，页头和前几行图片先发出，不在内存中拼出整个页面
+        if not (0 < self.stream_min_images <= len(context['images'])):
+            return render_template('index.html', **context)
+        chunks = buffer_chunks(stream_template('index.html', **context))
+        response = Response(chunks, mimetype='text/html')
+        encoding = self.negotiate_encoding()
+        if encoding is not None:
+            response.response = compress_stream(chunks, encoding)
+            response.headers['Content-Encoding'] = encoding
+            self.compressed_responses.inc(encoding=encoding)
+        response.vary.add('Accept-Encoding')
+        self.streamed_pages.inc()
+        return response
+
+    @staticmethod
+    def page_window(current_page: int, total_pages: int, radius: int = 2) -> range:
+        # 分页导航只显示当前页前后 radius 页，模板不再遍历全部页码
+        return range(max(current_page - radius, 1), min(current_page + radius, total_pages) + 1)
+
+    def render_store_view(self, page: int, category: str = None, seed: str = None) -> str:
+        # SQLite 后端：只查询当前页的图片，不在内存中构建完整列表
+        file_id = self.get_store_file(self.get_current_json_path())
+        paginated, total_pages, total_images = self.select_page(page, category, seed)
+        return self.render_index(images=paginated,
+                            current_page=page,
+                            total_pages=total_pages,
+                            page_window=self.page_window(page, total_pages),
+                            category=category,
+                            all_categories=self.store.categories(file_id),
+                            json_files=self.json_files,
+                            current_json_index=self.current_json_index(),
+                            seed=seed,
+                            total_images=total_images)
+
     def show_categories(self) -> str:
         page = request.args.get('page', 1, type=int)
         page = max(page, 1)
-        category_map, _ = self.load_image_data()
-        sorted_categories = sorted(category_map.keys())
+        if self.store is not None:
+            sorted_categories = self.store.categories(self.get_store_file(self.get_current_json_path()))
+        else:
+            category_map, _ = self.load_image_data()
+            sorted_categories = sorted(category_map.keys())
         categories, total_pages = self.paginate(sorted_categories, page, self.app.config['PER_PAGE'])
         
+        thumbnails = [self.get_category_thumbnail(cat) for cat in categories]
         category_list = [{
             'name': cat,
-            'thumb_url': url_for('serve_image', category=cat, filename=self.get_category_thumbnail(cat).get('filename', '')),
+            'thumb_url': url_for('serve_image', category=cat, filename=thumb.get('filename', '')),
             'url': url_for('category_view', category=cat, page=1)
-        } for cat in categories]
+        } for cat, thumb in zip(categories, thumbnails)]
+
+        # 拼图就绪时整页缩略图只需一次请求，缺失的位置仍单独请求
+        sprite = self.sprites.lookup([thumb.get('path') for thumb in thumbnails]) if self.sprites is not None else None
+        if sprite is not None:
+            sprite_url = url_for('serve_sprite', name=sprite['name'])
+            for cat_info, tile in zip(category_list, sprite['tiles']):
+                if tile is not None:
+                    cat_info['sprite'] = dict(tile, url=sprite_url)
+        elif self.sprites is not None and thumbnails:
+            # 拼图生成完成不会改变页面版本，逐张缩略图的页面不能按 ETag 缓存，否则客户端永远拿不到拼图
+            g.page_uncacheable = True
 
         return render_template('categories.html',
                             categories=category_list,
                             current_page=page,
                             total_pages=total_pages,
+                            page_window=self.page_window(page, total_pages),
                             json_files=self.json_files,
-                            current_json_index=session.get('current_json_index', 0))
+                            current_json_index=self.current_json_index())
+
+    def category_tree(self, json_path: str) -> CategoryTree:
+        # 目录树在首次使用时由各分类的图片数构建，索引重建（目录刷新、重新加载）后随之重建
+        if self.store is not None:
+            source = self.get_store_file(json_path)
+        else:
+            source = self.get_image_index(json_path)
+            if source is None:
+                abort(500, description=f"Load data failed for {json_path}")
+        cached = self.trees.get(json_path)
+        if cached is not None and cached[0] == source:
+            return cached[1]
+        if self.store is not None:
+            counts = self.store.category_counts(source)
+        elif isinstance(source, ShardedIndex):
+            counts = {name: entry['images'] for name, entry in source.categories.items()}
+        else:
+            counts = {name: len(images) for name, images in list(source.category_map.items())}
+        tree = CategoryTree(counts)
+        self.trees[json_path] = (source, tree)
+        return tree
+
+    def subtree_likes(self, json_path: str, tree: CategoryTree) -> Dict[str, int]:
+        # 子树点赞数由各分类的点赞数汇总，按数据版本和用户覆盖层版本缓存；
+        # 分片文件的点赞分布在未加载的分片中，不统计（返回 None）
+        source = self.trees[json_path][0]
+        user = self.current_user()
+        key = (tree, self.index_version(json_path), user,
+               self.overlays.version(json_path, user) if user is not None else None)
+        cached = self.tree_likes.get(json_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        if isinstance(source, ShardedIndex):
+            return None
+        if user is not None:
+            counts = defaultdict(int)
+            for path in list(self.overlays.liked(json_path, user)):
+                img = source.path_map.get(path)
+                if img is not None:
+                    counts[img['category']] += 1
+        elif self.store is not None:
+            counts = self.store.category_like_counts(source)
+        else:
+            counts = dict(source.like_counts)
+        totals = tree.subtree_totals(counts)
+        self.tree_likes[json_path] = (key, totals)
+        return totals
+
+    def tree_entry(self, tree: CategoryTree, node, likes: Dict[str, int]) -> Dict:
+        entry = tree.describe(node, likes)
+        entry['url'] = url_for('subtree_view', path=node.path)
+        entry['children_url'] = url_for('tree_children', path=node.path) if node.children else None
+        return entry
+
+    def tree_view(self) -> str:
+        # 按目录层级浏览：页面只包含第一层目录，子目录由 /tree/children 按需加载
+        json_path = self.get_current_json_path()
+        tree = self.category_tree(json_path)
+        likes = self.subtree_likes(json_path, tree)
+        return render_template('tree.html',
+                               nodes=[self.tree_entry(tree, node, likes) for node in tree.root.children.values()],
+                               total_images=tree.root.subtree_images,
+                               total_likes=likes.get('', 0) if likes is not None else None,
+                               json_files=self.json_files,
+                               current_json_index=self.current_json_index())
+
+    def tree_children(self) -> Response:
+        json_path = self.get_current_json_path()
+        tree = self.category_tree(json_path)
+        node = tree.node(request.args.get('path', ''))
+        if node is None:
+            abort(404, description="Directory not found")
+        likes = self.subtree_likes(json_path, tree)
+        return jsonify({'path': node.path,
+                        'children': [self.tree_entry(tree, child, likes) for child in node.children.values()]})
+
+    def subtree_view(self, path: str) -> str:
+        # 子树中所有图片分页显示，按图片数跳过不在当前页的子目录，只取当前页所需的切片
+        page = max(request.args.get('page', 1, type=int), 1)
+        json_path = self.get_current_json_path()
+        tree = self.category_tree(json_path)
+        node = tree.node(path)
+        if node is None or not node.path:
+            abort(404, description="Directory not found")
+        per_page = self.app.config['PER_PAGE']
+        images = []
+        if self.store is not None:
+            file_id = self.get_store_file(json_path)
+            for category, start, stop in tree.slices(node.path, (page - 1) * per_page, per_page):
+                images.extend(self.store.category_images(file_id, category, start, stop - start))
+            all_categories = self.store.categories(file_id)
+        else:
+            category_map, _ = self.load_image_data()
+            for category, start, stop in tree.slices(node.path, (page - 1) * per_page, per_page):
+                images.extend(category_map.get(category, [])[start:stop])
+            all_categories = sorted(category_map.keys())
+        if self.hide_missing:
+            images = [img for img in images if not img.get('missing')]
+        self.probe_page(json_path, images)
+        liked = self.user_likes(json_path)
+        if liked is not None:
+            images = [dict(img, like=img['path'] in liked) for img in images]
+        total_pages = max(math.ceil(node.subtree_images / per_page), 1) if per_page > 0 else 0
+        return self.render_index(images=images,
+                                 current_page=page,
+                                 total_pages=total_pages,
+                                 page_window=self.page_window(page, total_pages),
+                                 category=None,
+                                 subtree=node.path,
+                                 all_categories=all_categories,
+                                 json_files=self.json_files,
+                                 current_json_index=self.current_json_index(),
+                                 seed=None,
+                                 total_images=node.subtree_images)
+
+    def serve_sprite(self, name: str):
+        if self.sprites is None:
+            abort(404)
+        # 拼图文件名由内容决定，可以长期缓存
+        response = send_from_directory(self.sprites.cache_dir, name, mimetype='image/jpeg', max_age=31536000)
+        response.cache_control.immutable = True
+        return response
+
+    def asset_url(self, filename: str) -> str:
+        # 静态文件地址带内容哈希，文件修改后地址随之改变
+        return url_for('serve_asset', digest=self.assets.digest(filename), filename=filename)
+
+    def serve_asset(self, digest: str, filename: str):
+        # 优先发送构建时生成的 .br/.gz 预压缩文件
+        accepted = [encoding for encoding in ('br', 'gzip') if request.accept_encodings[encoding]]
+        encoded, encoding = self.assets.precompressed(filename, accepted)
+        if encoded is not None:
+            response = send_from_directory(self.app.static_folder, encoded, mimetype=guess_mimetype(filename))
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_from_directory(self.app.static_folder, filename)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        if digest == self.assets.digest(filename):
+            response.cache_control.max_age = 31536000
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True  # 旧页面引用的过期哈希
+        return response
 
     def show_all_images(self) -> str:
         page = request.args.get('page', 1, type=int)
@@ -192,10 +1523,14 @@ class WebApp:
             abort(404, description="Invalid category name")
 
         # 新增分类有效性检查
-        category_map, _ = self.load_image_data()
-        if (current_category not in ('_favorites', '_unfavorites') 
-            and current_category not in category_map):
-            abort(404, description="Category not found")
+        if current_category not in ('_favorites', '_unfavorites'):
+            if self.store is not None:
+                exists = self.store.has_category(self.get_store_file(self.get_current_json_path()), current_category)
+            else:
+                category_map, _ = self.load_image_data()
+                exists = current_category in category_map
+            if not exists:
+                abort(404, description="Category not found")
 
         seed = request.args.get('seed', default=None, type=str)
         if current_category in ('_favorites', '_unfavorites') and not seed:
@@ -208,89 +1543,100 @@ class WebApp:
         json_path = self.get_current_json_path()
         try:
             data = request.get_json()
-            # 兼容处理单个路径或多个路径
-            paths = data.get('paths', [])
-            # 如果没有提供paths，检查是否有单个path参数
-            if not paths:
-                single_path = data.get('path')
-                if single_path is not None:
-                    paths = [single_path]
-                else:
-                    return jsonify({'success': False, 'message': 'No paths provided'}), 400
-            
-            action = data.get('action', 'like')
+            # 前端合并后的批量修改：[{"path": 路径, "like": 布尔值}, ...]，同一路径以最后一次为准
+            changes = data.get('changes')
+            if changes:
+                if not isinstance(changes, list) or not all(
+                        isinstance(c, dict) and isinstance(c.get('path'), str) and isinstance(c.get('like'), bool)
+                        for c in changes):
+                    return jsonify({'success': False, 'message': 'Invalid changes'}), 400
+                action = 'batch'
+                wanted = {c['path']: c['like'] for c in changes}
+            else:
+                # 兼容处理单个路径或多个路径
+                paths = data.get('paths', [])
+                # 如果没有提供paths，检查是否有单个path参数
+                if not paths:
+                    single_path = data.get('path')
+                    if single_path is not None:
+                        paths = [single_path]
+                    else:
+                        return jsonify({'success': False, 'message': 'No paths provided'}), 400
+                action = data.get('action', 'like')
+                wanted = {req_path: action == 'like' for req_path in paths}
+            paths = list(wanted)
             found_paths = []
             not_found_paths = []
 
+            user = self.current_user()
+            if user is not None:
+                # 已识别的用户只修改自己的覆盖层文件，不重写共享JSON
+                found_paths, not_found_paths = self.existing_paths(json_path, paths)
+                if found_paths and self.overlays.apply(json_path, user, {p: wanted[p] for p in found_paths}):
+                    self.overlay_writes.inc()
+                return self.like_response(action, found_paths, not_found_paths)
+
+            if self.store is not None:
+                # SQLite 后端：每个路径只更新一行，无需重写JSON文件
+                file_id = self.get_store_file(json_path)
+                date_updated = datetime.now().astimezone().isoformat()
+                for liked in (True, False):
+                    group = [req_path for req_path in paths if wanted[req_path] == liked]
+                    if group:
+                        found, not_found = self.store.set_like(file_id, group, liked, date_updated)
+                        found_paths.extend(found)
+                        not_found_paths.extend(not_found)
+                if found_paths:
+                    self.bump_version(json_path)
+                return self.like_response(action, found_paths, not_found_paths)
+
+            # 确保数据已加载（预热中的文件直接返回503）
+            index = self.get_image_index(json_path)
+            if index is None:
+                return jsonify({'success': False, 'message': f"Load data failed for {json_path}"}), 500
+
+            # 分片文件在加锁前加载图片所属的分片，点赞只重写这些分片
+            targets = [(json_path, index)]
+            if isinstance(index, ShardedIndex):
+                shard_paths = dict.fromkeys(p for req_path in paths for p in index.shards_for_path(req_path))
+                targets = [(p, index.load_shard(p)) for p in shard_paths]
+
             with self.data_lock:
-                # 确保数据已加载
-                if json_path not in self.cached_raw_data:
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        self.cached_raw_data[json_path] = json.load(f)
-                
-                img_data = self.cached_raw_data[json_path].setdefault('img', {})
+                if isinstance(index, ShardedIndex):
+                    targets = [(p, index.install(p, shard)) for p, shard in targets]
+                updated = {}  # 需要保存的文件 {path: 索引}
                 
                 # 处理每个路径
                 for req_path in paths:
-                    req_path_norm = os.path.normpath(req_path)
-                    found = False
-                    
-                    # 遍历所有基准路径查找匹配项
-                    for base in list(img_data.keys()):
-                        base_abs = os.path.abspath(os.path.normpath(base))
-                        
-                        # 检查路径是否属于当前基准路径
-                        try:
-                            common_path = os.path.commonpath([base_abs, req_path_norm])
-                        except ValueError:
-                            continue
-                        
-                        if common_path != base_abs:
-                            continue
-                        
-                        # 计算相对路径并分割层级
-                        rel_path = os.path.relpath(req_path_norm, base_abs).replace('\\', '/')
-                        parts = rel_path.split('/')
-                        current_node = img_data[base]
-                        
-                        # 遍历目录结构
-                        for part in parts[:-1]:
-                            current_node = current_node.setdefault(part, {})
-                        
-                        # 获取文件节点
-                        filename = parts[-1]
-                        file_node = current_node.get(filename)
-                        
-                        if file_node:
-                            file_node['like'] = (action == 'like')
-                            found = True
+                    for target_path, target in targets:
+                        # 使用索引所引用的数据，即使文件在此期间被逐出也能正确保存
+                        match = self.find_file_node(target.raw_data.get('img', {}), req_path)
+                        if match:
+                            file_node, abs_path = match
+                            file_node['like'] = wanted[req_path]
+                            target.set_like(abs_path, wanted[req_path])
+                            updated[target_path] = target
                             found_paths.append(req_path)
-                            break  # 找到后跳出基准路径循环
-                    
-                    if not found:
+                            break
+                    else:
                         not_found_paths.append(req_path)
 
                 # 如果有成功更新的路径则触发保存
                 if found_paths:
-                    self.cached_raw_data[json_path]['date_updated'] = datetime.now().astimezone().isoformat()
-                    self.save_queue.put((json_path, self.cached_raw_data[json_path].copy()))
-                    
-                    response = {
-                        'success': True,
-                        'action': action,
-                        'found': found_paths,
-                        'not_found': not_found_paths
-                    }
-                    # 部分成功仍返回200，但包含未找到信息
-                    return jsonify(response), 200
-                else:
-                    return jsonify({'success': False, 'message': 'None of the images were found', 'not_found': not_found_paths}), 404
+                    date_updated = datetime.now().astimezone().isoformat()
+                    for target_path, target in updated.items():
+                        target.raw_data['date_updated'] = date_updated
+                        self.queue_save(target_path, target.raw_data.copy())
+                    self.bump_version(json_path)
+                return self.like_response(action, found_paths, not_found_paths)
 
         except BadRequest as e:
             return jsonify({
                 'success': False,
                 'message': 'Invalid JSON data'
             }), 400
+        except HTTPException:
+            raise
         except Exception as e:
             self.app.logger.error(f"Like operation error: {str(e)}")
             return jsonify({
@@ -299,19 +1645,100 @@ class WebApp:
                 'error_type': type(e).__name__
             }), 500
 
+    @staticmethod
+    def find_file_node(img_data: Dict, req_path: str):
+        # 在原始数据树中查找图片节点，返回 (节点, 绝对路径)，未找到返回 None
+        req_path_norm = os.path.normpath(req_path)
+        
+        # 遍历所有基准路径查找匹配项
+        for base in list(img_data.keys()):
+            base_abs = os.path.abspath(os.path.normpath(base))
+            
+            # 检查路径是否属于当前基准路径
+            try:
+                common_path = os.path.commonpath([base_abs, req_path_norm])
+            except ValueError:
+                continue
+            
+            if common_path != base_abs:
+                continue
+            
+            # 计算相对路径并分割层级
+            rel_path = os.path.relpath(req_path_norm, base_abs).replace('\\', '/')
+            parts = rel_path.split('/')
+            current_node = img_data[base]
+            
+            # 遍历目录结构；只查找不创建，未知路径的点赞不会在原始数据中留下空目录
+            for part in parts[:-1]:
+                current_node = current_node.get(part)
+                if not isinstance(current_node, dict):
+                    break
+            if not isinstance(current_node, dict):
+                continue
+            
+            # 获取文件节点
+            file_node = current_node.get(parts[-1])
+            if file_node:
+                return file_node, os.path.join(base_abs, rel_path)
+        return None
+
+    @staticmethod
+    def like_response(action: str, found_paths: List[str], not_found_paths: List[str]):
+        if not found_paths:
+            return jsonify({'success': False, 'message': 'None of the images were found', 'not_found': not_found_paths}), 404
+        response = {
+            'success': True,
+            'action': action,
+            'found': found_paths,
+            'not_found': not_found_paths
+        }
+        # 部分成功仍返回200，但包含未找到信息
+        return jsonify(response), 200
+
+    def queue_save(self, json_path: str, data: Dict):
+        # 调用方需持有 data_lock，待保存计数与缓存逐出判断保持一致
+        self.pending_saves[json_path] += 1
+        self.save_generation[json_path] += 1
+        self.save_queue.put((json_path, data, self.save_generation[json_path]))
+
     def save_consumer(self):
         while self.save_thread_running:
             try:
-                json_path, data = self.save_queue.get(timeout=1)
-                with self.data_lock:
-                    reversed_data = self.reverse_replace_rules(data)
-                    with open(json_path, 'w', encoding='utf-8') as f:
-                        json.dump(reversed_data, f, ensure_ascii=False, indent=4)
-                self.save_queue.task_done()
+                json_path, data, generation = self.save_queue.get(timeout=1)
             except Empty:
                 continue
+            try:
+                # 队列中还有同一文件更新的保存时跳过本次，由最后一次写入全部修改
+                if generation < self.save_generation[json_path]:
+                    self.saves_coalesced.inc()
+                else:
+                    self.write_json_file(json_path, data)
             except Exception as e:
+                self.save_failures.inc()
                 self.app.logger.error(f"Async save failed: {str(e)}")
+            finally:
+                with self.data_lock:
+                    self.pending_saves[json_path] -= 1
+                self.save_queue.task_done()
+
+    def write_json_file(self, json_path: str, data: Dict):
+        with self.save_seconds.time():
+            # 锁内只用C编码器做紧凑序列化得到一致快照（比带缩进的编码快约6倍），
+            # 替换规则还原、缩进格式化与写盘都在锁外进行，不阻塞点赞
+            with self.data_lock:
+                data_str = json.dumps(data)
+                # 与快照一致的爬虫状态，写盘成功后才落盘
+                crawl_state = self.pending_crawl_states.pop(json_path, None)
+            for old, new in reversed(self.replace_rules):
+                data_str = data_str.replace(new, old)
+            data_str = json.dumps(json.loads(data_str), ensure_ascii=False, indent=4)
+            # 先写临时文件再原子替换，保存过程中读取到的始终是完整文件
+            tmp_path = f"{json_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data_str)
+            os.replace(tmp_path, json_path)
+            if crawl_state is not None:
+                save_crawl_state(json_path, crawl_state)
 
     def shutdown(self) -> str:
         self.save_thread_running = False
@@ -337,6 +1764,11 @@ class WebApp:
         return result, total_pages
 
     def get_category_thumbnail(self, category: str) -> Dict:
+        if self.store is not None:
+            return self.store.first_image(self.get_store_file(self.get_current_json_path()), category)
         category_map, _ = self.load_image_data()
+        if isinstance(category_map, ShardedCategoryMap):
+            return category_map.first_image(category)
         images = category_map.get(category, [])
-        return images[0] if images else {}  # 检查空列表
\ No newline at end of file
+        # 优先使用文件存在的图片作为缩略图
+        return next((img for img in images if not img.get('missing')), images[0]) if images else {}  # 检查空列表
\ No newline at end of file